@@ -5,6 +5,13 @@ import os
 # Application version
 APP_VERSION = "v0.1.4"
 
+# Origins allowed to call /api/*
+API_ORIGINS = [
+    "http://localhost:5001", 
+    "https://habitual-api-rgv222zqha-uc.a.run.app",
+    "https://*.run.app"
+]
+
 
 def create_app():
     """Application factory function"""
@@ -18,12 +25,8 @@ def create_app():
     # Configure CORS for API endpoints
     CORS(app, resources={
         r"/api/*": {
-            "origins": [
-                "http://localhost:5001", 
-                "https://habitual-api-rgv222zqha-uc.a.run.app",
-                "https://*.run.app"
-            ],
-            "methods": ["GET", "POST", "PUT", "DELETE"],
+            "origins": API_ORIGINS,
+            "methods": ["GET", "POST", "PUT", "PATCH", "DELETE"],
             "allow_headers": ["Content-Type", "Authorization"]
         }
     })
@@ -31,6 +34,10 @@ def create_app():
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     
+    # Shared services (one Firestore client per process)
+    from app.services.registry import init_services
+    init_services(app)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -0,0 +1,150 @@
+"""ASGI entry point: delta syncs on the event loop, everything else on Flask
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+
+Delta-protocol POST /api/sync requests are served here with the asyncio
+Firestore client, so an instance holds as many syncs in flight as the event
+loop allows instead of one per gunicorn thread. All other requests, full
+document syncs included, run on the Flask app in a thread pool. run.py
+stays the WSGI entry point for gunicorn.
+"""
+import json
+import os
+from flask_cors.core import try_match_any
+from app import API_ORIGINS, create_app
+from app.middleware.auth import token_cache
+from app.services.async_firebase_service import AsyncFirebaseService
+from app.services.sync_protocol import SyncProtocolError, validate_ops
+
+SYNC_PATH = '/api/sync'
+
+# Threads running the Flask app, the WSGI equivalent of gunicorn's --threads
+WSGI_WORKERS = int(os.environ.get('ASGI_WSGI_WORKERS', 8))
+
+
+class AsyncSyncApp:
+    """ASGI app serving delta syncs itself and handing the rest to fallback
+
+    fallback is an ASGI app wrapping flask_app; see create_asgi_app.
+    """
+
+    def __init__(self, flask_app, fallback):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        self._service = None
+
+    def service(self) -> AsyncFirebaseService:
+        """Return the AsyncFirebaseService, creating it on the running loop"""
+        if self._service is None:
+            services = self.flask_app.extensions['services']
+            self._service = AsyncFirebaseService(timeout=self.flask_app.config['FIRESTORE_CALL_TIMEOUT'],
+                                                 document_cache=services.document_cache,
+                                                 write_buffer=services.write_buffer)
+        return self._service
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] != SYNC_PATH:
+            return await self.fallback(scope, receive, send)
+
+        body = await _read_body(receive)
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or 'baseVersion' not in data:
+            return await self.fallback(scope, _replay(body, receive), send)
+
+        payload, status = await self._sync(_headers(scope), data)
+        await self._respond(scope, send, payload, status)
+
+    async def _lifespan(self, receive, send):
+        # The Flask app has no startup or shutdown work of its own
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _sync(self, headers, data):
+        """Authenticate and run one delta sync; returns (payload, status) as _sync does"""
+        auth_header = headers.get('authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return {'error': 'Missing or invalid authorization header'}, 401
+
+        try:
+            service = self.service()
+        except Exception as firebase_error:
+            print(f"Firebase initialization error: {firebase_error}")
+            return {'error': f'Firebase initialization failed: {str(firebase_error)}'}, 500
+
+        id_token = auth_header.split('Bearer ')[1]
+        user_info = token_cache.get(id_token)
+        if user_info is None:
+            user_info = await service.verify_token(id_token)
+            if not user_info:
+                return {'error': 'Invalid or expired token'}, 401
+            token_cache.put(id_token, user_info)
+
+        try:
+            ops = validate_ops(data.get('ops'))
+        except SyncProtocolError as e:
+            return {'error': str(e)}, 400
+
+        sync_result = await service.sync_habit_ops(user_info['uid'], data.get('baseVersion'), ops,
+                                                   client_id=data.get('clientId'),
+                                                   habit_data=data.get('habitData'))
+        return sync_result, 200
+
+    async def _respond(self, scope, send, payload, status):
+        body = self.flask_app.json.dumps(payload).encode('utf-8')
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        # Same CORS answer Flask-CORS gives the WSGI route
+        origin = _headers(scope).get('origin')
+        if origin and try_match_any(origin, API_ORIGINS):
+            headers += [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def _headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def _replay(body, receive):
+    """receive that yields an already-read body, then defers to the server"""
+    pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def replay():
+        if pending:
+            return pending.pop()
+        return await receive()
+    return replay
+
+
+def create_asgi_app(flask_app=None, fallback=None):
+    """Build the ASGI app around a Flask app (a new one by default)
+
+    fallback serves every request not handled on the event loop; by default
+    it runs flask_app through a2wsgi in a pool of WSGI_WORKERS threads.
+    """
+    flask_app = flask_app or create_app()
+    if fallback is None:
+        from a2wsgi import WSGIMiddleware
+        fallback = WSGIMiddleware(flask_app, workers=WSGI_WORKERS)
+    return AsyncSyncApp(flask_app, fallback)
@@ -1,43 +1,169 @@
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, g
-from app.models.habit_tracker import HabitTracker
-from app.middleware.auth import optional_auth, require_auth, check_subscription_tier
-from app.services.firebase_service import FirebaseService
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, g, current_app, make_response
+from app.middleware.auth import optional_auth, optional_session_auth, require_auth, check_subscription_tier, prefetch_documents
+from app.services.registry import get_document_loader, get_firebase_service, get_services
+from app.services.sync_protocol import SyncProtocolError, mutation_ops, validate_ops
+from app.models.history import RECENT_HISTORY_DAYS
+from app.models.tracker_cache import TrackerView
 from app import APP_VERSION
+from datetime import date, timedelta
+from itertools import islice
 import json
 
 main_bp = Blueprint('main', __name__)
 
 
 @main_bp.route('/')
-@optional_auth
+@optional_session_auth
 def home():
     """Home page route - works for both authenticated and anonymous users"""
+    services = get_services()
+    bootstrap = None
     if hasattr(g, 'user_id') and g.user_id:
-        # Authenticated user - could load from Firestore
-        # For now, still use local tracker as fallback
-        tracker = HabitTracker()
+        # Authenticated user - embed their Firestore documents, so the client
+        # skips the sign-in round trip, and render the page from the habit
+        # they hold. The read runs on the batch pool to bound how long it may
+        # hold up the page
+        if current_app.config['HOME_BOOTSTRAP']:
+            future = services.batch_executor.submit(get_firebase_service().get_bootstrap, g.user_id)
+            try:
+                bootstrap = future.result(timeout=current_app.config['FIRESTORE_CALL_TIMEOUT'])
+            except Exception as e:
+                print(f"Error loading bootstrap data: {e}")
+        if bootstrap and bootstrap.get('habit'):
+            tracker = TrackerView.from_habit(bootstrap['habit'])
+        else:
+            tracker = services.user_trackers.view(g.user_id)
         is_authenticated = True
         user_email = g.user_email
     else:
-        # Anonymous user - use local tracker
-        tracker = HabitTracker()
+        # Anonymous user - use the shared local tracker, only re-parsed
+        # when the data file changes on disk
+        tracker = services.tracker_cache.view()
         is_authenticated = False
         user_email = None
     
-    return render_template('index.html',
-                         started_date=tracker.get_started_date(),
-                         frequency=tracker.get_frequency(),
-                         counter=tracker.get_counter(),
-                         habit_done=tracker.is_done_today(),
-                         not_done=tracker.is_not_done_today(),
-                         why_text=tracker.get_why_today(),
-                         success_percentage=tracker.get_success_percentage(),
-                         completed_dates=tracker.get_completed_dates(),
-                         not_done_dates=tracker.get_not_done_dates(),
-                         why_entries=tracker.get_why_entries(),
+    response = make_response(render_template('index.html',
+                         started_date=tracker.started_date,
+                         frequency=tracker.frequency,
+                         counter=tracker.counter,
+                         habit_done=tracker.habit_done,
+                         not_done=tracker.not_done,
+                         why_text=tracker.why_text,
+                         success_percentage=tracker.success_percentage,
+                         completed_dates=tracker.completed_dates,
+                         not_done_dates=tracker.not_done_dates,
+                         why_entries=tracker.why_entries,
                          is_authenticated=is_authenticated,
                          user_email=user_email,
-                         app_version=APP_VERSION)
+                         bootstrap=bootstrap,
+                         app_version=APP_VERSION))
+    if is_authenticated:
+        # Personalised page: never share it, and let the browser revalidate
+        # its copy against a content ETag instead of downloading it again
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.update(('Authorization', 'Cookie'))
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+def _sync(firebase_service, user_id, data):
+    """Run one sync request; returns (payload, status)"""
+    if not data:
+        return {'error': 'No data provided'}, 400
+    
+    # Delta protocol: the client sends the ops recorded since the last
+    # server version it saw and gets back only the ops it is missing
+    if 'baseVersion' in data:
+        try:
+            ops = validate_ops(data.get('ops'))
+        except SyncProtocolError as e:
+            return {'error': str(e)}, 400
+        
+        sync_result = firebase_service.sync_habit_ops(user_id, data.get('baseVersion'), ops,
+                                                      client_id=data.get('clientId'),
+                                                      habit_data=data.get('habitData'))
+        return sync_result, 200
+    
+    # Get the habit data and last sync timestamp from request
+    habit_data = data.get('habitData', {})
+    last_sync = data.get('lastSync')
+    
+    print(f"Syncing data for user: {user_id}")
+    print(f"Habit data keys: {list(habit_data.keys()) if habit_data else 'None'}")
+    
+    # Perform sync
+    sync_result = firebase_service.sync_habit_data(user_id, habit_data, last_sync)
+    
+    print(f"Sync result: {sync_result}")
+    return sync_result, 200
+
+
+def _save(firebase_service, user_id, data):
+    """Save a full habit payload; returns (payload, status)"""
+    if not data:
+        return {'error': 'No data provided'}, 400
+    
+    if firebase_service.save_habit_data(user_id, data):
+        return {'status': 'success'}, 200
+    return {'error': 'Failed to save data'}, 500
+
+
+def _profile(firebase_service, user_id, data=None):
+    """Load the user's profile; returns (payload, status)"""
+    profile = firebase_service.get_user_profile(user_id)
+    if profile:
+        return {'status': 'success', 'profile': profile}, 200
+    return {'error': 'Profile not found'}, 404
+
+
+def _dashboard(firebase_service, user_id, data=None):
+    """Load the user's dashboard summary; returns (payload, status)"""
+    dashboard = firebase_service.get_dashboard(user_id)
+    if dashboard is not None:
+        return {'status': 'success', 'dashboard': dashboard}, 200
+    return {'error': 'Failed to load dashboard'}, 500
+
+
+HABITS_PAGE_SIZE = 50
+MAX_HABITS_PAGE_SIZE = 100
+# Habits read before a streamed listing starts, so most query failures are a 500
+HABITS_FIRST_BATCH = 20
+
+
+def _page_params(params):
+    """Return (limit, cursor) from request params, or raise ValueError"""
+    limit = int(params.get('limit', HABITS_PAGE_SIZE))
+    if not 1 <= limit <= MAX_HABITS_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_HABITS_PAGE_SIZE}')
+    return limit, params.get('cursor') or None
+
+
+def _habit_page(habits, limit, page):
+    """Yield up to limit habits; page['next_cursor'] is set once exhausted
+    
+    habits is read one past the page, so a further page is only advertised
+    when it exists.
+    """
+    page['next_cursor'] = None
+    last_id = None
+    for count, habit in enumerate(habits):
+        if count == limit:
+            page['next_cursor'] = last_id
+            break
+        last_id = habit['id']
+        yield habit
+
+
+def _habits(firebase_service, user_id, data=None):
+    """List a page of the user's habit summaries; returns (payload, status)"""
+    try:
+        limit, cursor = _page_params(data or {})
+    except (TypeError, ValueError) as e:
+        return {'error': f'Invalid page: {e}'}, 400
+    page = {}
+    habits = list(_habit_page(firebase_service.get_user_habits(user_id, limit + 1, cursor), limit, page))
+    return {'status': 'success', 'habits': habits, 'next_cursor': page['next_cursor']}, 200
 
 
 @main_bp.route('/api/sync', methods=['POST'])
@@ -51,23 +177,13 @@ def sync_habits():
         
         # Initialize Firebase service with error handling
         try:
-            firebase_service = FirebaseService()
+            firebase_service = get_firebase_service()
         except Exception as firebase_error:
             print(f"Firebase initialization error: {firebase_error}")
             return jsonify({'error': f'Firebase initialization failed: {str(firebase_error)}'}), 500
         
-        # Get the habit data and last sync timestamp from request
-        habit_data = data.get('habitData', {})
-        last_sync = data.get('lastSync')
-        
-        print(f"Syncing data for user: {g.user_id}")
-        print(f"Habit data keys: {list(habit_data.keys()) if habit_data else 'None'}")
-        
-        # Perform sync
-        sync_result = firebase_service.sync_habit_data(g.user_id, habit_data, last_sync)
-        
-        print(f"Sync result: {sync_result}")
-        return jsonify(sync_result)
+        payload, status = _sync(firebase_service, g.user_id, data)
+        return jsonify(payload), status
         
     except Exception as e:
         print(f"Sync error: {str(e)}")
@@ -76,18 +192,227 @@ def sync_habits():
         return jsonify({'error': f'Sync failed: {str(e)}'}), 500
 
 
+# Batchable operations: name -> (handler, document it touches, whether it writes)
+BATCH_OPERATIONS = {
+    'profile': (_profile, 'profile', False),
+    'habits': (_habits, 'habits', False),
+    # The summary document changes with every habit write
+    'dashboard': (_dashboard, 'habits', False),
+    'sync': (_sync, 'habits', True),
+    'save': (_save, 'habits', True)
+}
+MAX_BATCH_OPERATIONS = 10
+
+
+def _run_operation(firebase_service, user_id, operation):
+    handler = BATCH_OPERATIONS[operation['op']][0]
+    try:
+        return handler(firebase_service, user_id, operation.get('body'))
+    except Exception as e:
+        print(f"Batch operation {operation['op']} failed: {e}")
+        return {'error': str(e)}, 500
+
+
+@main_bp.route('/api/batch', methods=['POST'])
+@require_auth
+def batch():
+    """Run several API operations with one request and one token check
+    
+    Takes {"operations": [{"id", "op", "body"}]} where op is profile, habits,
+    dashboard, sync or save, and returns {"results": [{"id", "status",
+    "body"}]} in the same order. Operations on different documents run
+    concurrently; when a document is written in the batch, all operations
+    on it run in order.
+    """
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}), 400
+    
+    try:
+        firebase_service = get_firebase_service()
+    except Exception as firebase_error:
+        print(f"Firebase initialization error: {firebase_error}")
+        return jsonify({'error': f'Firebase initialization failed: {str(firebase_error)}'}), 500
+    
+    specs = [BATCH_OPERATIONS.get(op.get('op')) if isinstance(op, dict) else None for op in operations]
+    written = {spec[1] for spec in specs if spec and spec[2]}
+    
+    results = [None] * len(operations)
+    chains = []
+    ordered = {}
+    for index, spec in enumerate(specs):
+        if spec is None:
+            results[index] = ({'error': 'Unknown operation'}, 400)
+        elif spec[1] in written:
+            if spec[1] not in ordered:
+                ordered[spec[1]] = []
+                chains.append(ordered[spec[1]])
+            ordered[spec[1]].append(index)
+        else:
+            chains.append([index])
+    
+    user_id = g.user_id
+    
+    def run_chain(indexes):
+        for index in indexes:
+            results[index] = _run_operation(firebase_service, user_id, operations[index])
+    
+    if len(chains) <= 1:
+        for chain in chains:
+            run_chain(chain)
+    else:
+        executor = get_services().batch_executor
+        for future in [executor.submit(run_chain, chain) for chain in chains]:
+            future.result()
+    
+    return jsonify({'results': [
+        {
+            'id': operation.get('id', index) if isinstance(operation, dict) else index,
+            'status': status,
+            'body': payload
+        }
+        for index, (operation, (payload, status)) in enumerate(zip(operations, results))
+    ]})
+
+
+def _tag(response, etag):
+    """Set the validator and per-user caching headers on a response"""
+    if etag:
+        response.set_etag(etag)
+    # Responses differ per user, and clients must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
+
+
+def _conditional_json(cache_key, validator, load):
+    """Answer with 304 if the client holds the current validator, else a JSON body
+    
+    validator() returns the ETag of the documents load() reads. It is read
+    again after a load, and only a body loaded while it held still is tagged
+    and cached; bodies are cached per validator, so an unchanged document is
+    served without reading or serialising it again. load() returns the
+    payload, or None when there is nothing to return.
+    """
+    etag = validator()
+    if etag and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        cache = get_services().response_cache
+        body = cache.get(cache_key, etag) if etag else None
+        if body is None:
+            payload = load()
+            if payload is None:
+                return None
+            body = jsonify(payload).get_data()
+            if etag and validator() != etag:
+                # A write landed while loading; the body may not match etag
+                etag = None
+            if etag:
+                cache.put(cache_key, etag, body)
+        response = current_app.response_class(body, mimetype='application/json')
+    return _tag(response, etag)
+
+
+def _conditional_stream(cache_key, validator, chunks, failed):
+    """Like _conditional_json, but send a new body as chunks() produces it
+    
+    The first chunk is produced before the response starts, so a query that
+    fails early is still a 500. Once the body has started, a failure ends it
+    with failed(error), which must close the JSON with an error marker the
+    client can check. The body is cached once it has been sent in full, if
+    the validator has not moved meanwhile. chunks() and validator() are
+    called again after the request context is gone, so they must not touch
+    request or g.
+    """
+    etag = validator()
+    if etag and request.if_none_match.contains(etag):
+        return _tag(current_app.response_class(status=304), etag)
+    cache = get_services().response_cache
+    body = cache.get(cache_key, etag) if etag else None
+    if body is not None:
+        return _tag(current_app.response_class(body, mimetype='application/json'), etag)
+    
+    parts = chunks()
+    first = next(parts)
+    
+    def generate():
+        sent = [first]
+        yield first
+        try:
+            for part in parts:
+                sent.append(part)
+                yield part
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            yield failed(e)
+            return
+        if etag and validator() == etag:
+            cache.put(cache_key, etag, b''.join(sent))
+    
+    return _tag(current_app.response_class(generate(), mimetype='application/json'), etag)
+
+
 @main_bp.route('/api/habits', methods=['GET'])
 @require_auth
 def get_habits():
-    """Get user's habits from Firestore"""
+    """Get a page of the user's habit summaries from Firestore"""
     try:
-        firebase_service = FirebaseService()
-        habits = firebase_service.get_user_habits(g.user_id)
+        try:
+            limit, cursor = _page_params(request.args)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid page: {e}'}), 400
         
-        return jsonify({
-            'status': 'success',
-            'habits': habits
-        })
+        firebase_service = get_firebase_service()
+        user_id = g.user_id
+        
+        # One extra habit is read to tell whether there is a next page
+        def validator():
+            return firebase_service.get_habits_etag(user_id, limit + 1, cursor)
+        
+        # The status comes last, so a listing cut short ends with "error"
+        def chunks():
+            page = {}
+            habits = _habit_page(firebase_service.get_user_habits(user_id, limit + 1, cursor), limit, page)
+            first_batch = islice(habits, HABITS_FIRST_BATCH)
+            yield b'{"habits": [' + b', '.join(json.dumps(habit).encode() for habit in first_batch)
+            for habit in habits:
+                yield b', ' + json.dumps(habit).encode()
+            yield (b'], "next_cursor": ' + json.dumps(page['next_cursor']).encode()
+                   + b', "status": "success"}')
+        
+        def failed(error):
+            return b'], "status": "error", "error": ' + json.dumps(str(error)).encode() + b'}'
+        
+        return _conditional_stream(('habits', user_id, limit, cursor), validator, chunks, failed)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@main_bp.route('/api/habits/<habit_id>', methods=['GET'])
+@require_auth
+def get_habit(habit_id):
+    """Get one habit with its full history"""
+    try:
+        firebase_service = get_firebase_service()
+        
+        def validator():
+            return firebase_service.get_habit_etag(g.user_id, habit_id)
+        
+        def load():
+            habit = firebase_service.get_user_habit(g.user_id, habit_id)
+            if habit:
+                return {'status': 'success', 'habit': habit}
+            return None
+        
+        response = _conditional_json(('habit', g.user_id, habit_id), validator, load)
+        if response is None:
+            return jsonify({'error': 'Habit not found'}), 404
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -102,47 +427,152 @@ def save_habits():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        firebase_service = FirebaseService()
-        success = firebase_service.save_habit_data(g.user_id, data)
-        
-        if success:
-            return jsonify({'status': 'success'})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+        firebase_service = get_firebase_service()
+        payload, status = _save(firebase_service, g.user_id, data)
+        return jsonify(payload), status
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@main_bp.route('/api/habits/<habit_id>', methods=['PATCH'])
+@require_auth
+def patch_habit(habit_id):
+    """Apply small mutations to one habit without sending it back
+    
+    Takes {"mutations": [...], "clientId"} (see app.services.sync_protocol)
+    and returns the habit's new version.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'No data provided'}), 400
+        try:
+            ops = mutation_ops(data.get('mutations'))
+        except SyncProtocolError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        firebase_service = get_firebase_service()
+        result = firebase_service.patch_habit(g.user_id, habit_id, ops, client_id=data.get('clientId'))
+        if result is None:
+            return jsonify({'error': 'Habit not found'}), 404
+        if result['status'] != 'success':
+            return jsonify({'error': result['message']}), 500
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+MAX_HISTORY_WINDOW_DAYS = 366
+
+
+@main_bp.route('/api/habits/<habit_id>/history', methods=['GET'])
+@require_auth
+def get_habit_history(habit_id):
+    """Get one date window of a habit's history
+    
+    from and to are inclusive ISO dates; by default the window is the last
+    RECENT_HISTORY_DAYS days, the same history the page is rendered with.
+    """
+    try:
+        try:
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+            start = date.fromisoformat(request.args['from']) if request.args.get('from') \
+                else end - timedelta(days=RECENT_HISTORY_DAYS - 1)
+        except ValueError:
+            return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+        if start > end or (end - start).days >= MAX_HISTORY_WINDOW_DAYS:
+            return jsonify({'error': f'The window must be 1 to {MAX_HISTORY_WINDOW_DAYS} days'}), 400
+        
+        firebase_service = get_firebase_service()
+        
+        def validator():
+            etag = firebase_service.get_habit_etag(g.user_id, habit_id)
+            # The default window moves with the date under the same URL
+            return f'{etag}.{start:%Y%m%d}.{end:%Y%m%d}' if etag else None
+        
+        def load():
+            history = firebase_service.get_habit_history(g.user_id, habit_id, start, end)
+            if history is not None:
+                return {'status': 'success', 'history': history}
+            return None
+        
+        response = _conditional_json(('history', g.user_id, habit_id, start, end), validator, load)
+        if response is None:
+            return jsonify({'error': 'Habit not found'}), 404
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @main_bp.route('/api/profile', methods=['GET'])
 @require_auth
 def get_profile():
     """Get user profile and subscription info"""
     try:
-        firebase_service = FirebaseService()
-        profile = firebase_service.get_user_profile(g.user_id)
-        
-        if profile:
-            return jsonify({
-                'status': 'success',  
-                'profile': profile
-            })
-        else:
+        firebase_service = get_firebase_service()
+        
+        def validator():
+            return firebase_service.get_profile_etag(g.user_id)
+        
+        def load():
+            profile = firebase_service.get_user_profile(g.user_id, loader=get_document_loader())
+            if profile:
+                return {
+                    'status': 'success',  
+                    'profile': profile
+                }
+            return None
+        
+        response = _conditional_json(('profile', g.user_id), validator, load)
+        if response is None:
             return jsonify({'error': 'Profile not found'}), 404
+        return response
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@main_bp.route('/api/dashboard', methods=['GET'])
+@require_auth
+def get_dashboard():
+    """Get the user's tier and every habit's state and stats from one document"""
+    try:
+        firebase_service = get_firebase_service()
+        
+        def validator():
+            return firebase_service.get_dashboard_etag(g.user_id)
+        
+        def load():
+            payload, status = _dashboard(firebase_service, g.user_id)
+            return payload if status == 200 else None
+        
+        response = _conditional_json(('dashboard', g.user_id), validator, load)
+        if response is None:
+            return jsonify({'error': 'Failed to load dashboard'}), 500
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @main_bp.route('/api/premium-feature', methods=['GET'])
 @require_auth
+@prefetch_documents('habit')
 @check_subscription_tier('premium')
 def premium_feature():
-    """Example premium feature - requires premium subscription"""
+    """Premium feature - advanced analytics, requires premium subscription"""
+    firebase_service = get_firebase_service()
+    # The habit document was read in the same batch as the tier check's profile
+    analytics = firebase_service.get_habit_analytics(g.user_id, loader=get_document_loader())
+    
     return jsonify({
         'message': 'Welcome to premium features!',
         'tier': g.subscription_tier,
-        'features': ['Advanced analytics', 'Multiple habits', 'Export data']
+        'features': ['Advanced analytics', 'Multiple habits', 'Export data'],
+        'analytics': analytics
     })
 
 
@@ -151,15 +581,22 @@ def premium_feature():
 def debug_firebase():
     """Debug Firebase connectivity"""
     try:
-        firebase_service = FirebaseService()
+        firebase_service = get_firebase_service()
         
         # Try to access Firestore
         db = firebase_service.db
         
+        services = get_services()
         return jsonify({
             'status': 'success',
             'message': 'Firebase initialized successfully',
-            'firestore_available': True
+            'firestore_available': True,
+            'caches': {
+                'documents': services.document_cache.stats(),
+                'responses': services.response_cache.stats()
+            },
+            'singleflight': services.flights.stats(),
+            'write_buffer': services.write_buffer.stats() if services.write_buffer is not None else None
         })
     except Exception as e:
         return jsonify({
@@ -170,9 +607,15 @@ def debug_firebase():
 
 # Legacy route for backward compatibility
 @main_bp.route('/toggle-habit', methods=['POST'])
+@optional_auth
 def toggle_habit():
     """Toggle habit completion for today - legacy route"""
-    tracker = HabitTracker()
-    tracker.toggle_today()
+    services = get_services()
+    if g.user_id:
+        services.user_trackers.get(g.user_id).toggle_today()
+        services.user_trackers.note_write(g.user_id)
+    else:
+        services.tracker_cache.get().toggle_today()
+        services.tracker_cache.note_write()
     
     return redirect(url_for('main.home'))
\ No newline at end of file
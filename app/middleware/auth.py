@@ -1,6 +1,29 @@
 from functools import wraps
 from flask import request, jsonify, g
-from app.services.firebase_service import FirebaseService
+from app.services.registry import get_document_loader, get_firebase_service
+from app.middleware.token_cache import TokenCache
+import os
+
+
+# Firebase Hosting forwards only this cookie to the backend
+SESSION_COOKIE = '__session'
+
+# Verified ID tokens are reused by the client for up to an hour, so cache them
+# per process instead of re-checking the RS256 signature on every request
+token_cache = TokenCache(max_size=int(os.environ.get('TOKEN_CACHE_SIZE', 1024)))
+
+
+def verify_id_token(id_token):
+    """Verify an ID token, serving repeat tokens from the verified-token cache"""
+    user_info = token_cache.get(id_token)
+    if user_info is not None:
+        return user_info
+    
+    firebase_service = get_firebase_service()
+    user_info = firebase_service.verify_token(id_token)
+    if user_info:
+        token_cache.put(id_token, user_info)
+    return user_info
 
 
 def require_auth(f):
@@ -13,9 +36,7 @@ def require_auth(f):
             return jsonify({'error': 'Missing or invalid authorization header'}), 401
         
         id_token = auth_header.split('Bearer ')[1]
-        firebase_service = FirebaseService()
-        
-        user_info = firebase_service.verify_token(id_token)
+        user_info = verify_id_token(id_token)
         if not user_info:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
@@ -29,6 +50,17 @@ def require_auth(f):
     return decorated_function
 
 
+def _optional_user(id_token):
+    """Set g.user_* from an ID token, or g.user_id = None if there is none or it is invalid"""
+    user_info = verify_id_token(id_token) if id_token else None
+    if user_info:
+        g.user_id = user_info['uid']
+        g.user_email = user_info.get('email')
+        g.user_info = user_info
+    else:
+        g.user_id = None
+
+
 def optional_auth(f):
     """Decorator for optional authentication (allows both authenticated and anonymous access)"""
     @wraps(f)
@@ -36,16 +68,7 @@ def optional_auth(f):
         auth_header = request.headers.get('Authorization')
         
         if auth_header and auth_header.startswith('Bearer '):
-            id_token = auth_header.split('Bearer ')[1]
-            firebase_service = FirebaseService()
-            
-            user_info = firebase_service.verify_token(id_token)
-            if user_info:
-                g.user_id = user_info['uid']
-                g.user_email = user_info.get('email')
-                g.user_info = user_info
-            else:
-                g.user_id = None
+            _optional_user(auth_header.split('Bearer ')[1])
         else:
             g.user_id = None
         
@@ -54,6 +77,27 @@ def optional_auth(f):
     return decorated_function
 
 
+def optional_session_auth(f):
+    """Decorator like optional_auth that also accepts the ID token from the session cookie
+    
+    Page navigations cannot carry an Authorization header, so the client
+    mirrors its ID token into the __session cookie. Only use this on
+    read-only routes; cookie credentials must never authorise a write.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        auth_header = request.headers.get('Authorization')
+        
+        if auth_header and auth_header.startswith('Bearer '):
+            _optional_user(auth_header.split('Bearer ')[1])
+        else:
+            _optional_user(request.cookies.get(SESSION_COOKIE))
+        
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
+
 def check_subscription_tier(required_tier='premium'):
     """Decorator to check if user has required subscription tier"""
     def decorator(f):
@@ -62,8 +106,8 @@ def check_subscription_tier(required_tier='premium'):
             if not hasattr(g, 'user_id') or not g.user_id:
                 return jsonify({'error': 'Authentication required'}), 401
             
-            firebase_service = FirebaseService()
-            profile = firebase_service.get_user_profile(g.user_id)
+            firebase_service = get_firebase_service()
+            profile = firebase_service.get_user_profile(g.user_id, loader=get_document_loader())
             
             if not profile:
                 return jsonify({'error': 'User profile not found'}), 404
@@ -85,5 +129,28 @@ def check_subscription_tier(required_tier='premium'):
             g.subscription_tier = user_tier
             return f(*args, **kwargs)
         
+        return decorated_function
+    return decorator
+
+
+def prefetch_documents(*kinds):
+    """Decorator to queue the user's 'profile' and/or 'habit' documents
+    
+    Place it after require_auth; the queued documents are read in one batch
+    with the first document the request actually loads.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if getattr(g, 'user_id', None):
+                firebase_service = get_firebase_service()
+                loader = get_document_loader()
+                for kind in kinds:
+                    if kind == 'profile':
+                        loader.prime(firebase_service.profile_ref(g.user_id))
+                    elif kind == 'habit':
+                        loader.prime(firebase_service.habit_ref(g.user_id))
+            return f(*args, **kwargs)
+        
         return decorated_function
     return decorator
\ No newline at end of file
@@ -0,0 +1,86 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class TokenCache:
+    """Bounded, thread-safe LRU cache of verified Firebase ID tokens.
+
+    Entries are keyed by a SHA-256 digest of the raw token (the token itself is
+    never stored) and expire at the token's own ``exp`` claim.
+    """
+
+    def __init__(self, max_size: int = 1024, expiry_margin: int = 5):
+        self.max_size = max_size
+        # Drop entries slightly before ``exp`` to absorb clock skew
+        self.expiry_margin = expiry_margin
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(id_token: str) -> str:
+        return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+    def get(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached decoded token, or None on a miss or expiry"""
+        key = self._key(id_token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, decoded_token = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decoded_token
+
+    def put(self, id_token: str, decoded_token: Dict[str, Any]) -> None:
+        """Cache a verified token until its ``exp`` claim"""
+        exp = decoded_token.get('exp')
+        if not exp:
+            return
+
+        expires_at = float(exp) - self.expiry_margin
+        if expires_at <= time.time():
+            return
+
+        key = self._key(id_token)
+        with self._lock:
+            self._entries[key] = (expires_at, decoded_token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all cached tokens"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,286 @@
+"""Dashboard aggregates kept with a habit and updated on every write
+
+A small block stored alongside the history::
+
+    {'done': 41, 'notDone': 3, 'weeksDone': 9, 'lastTracked': '2025-03-02',
+     'streakStart': '2025-02-25', 'streakEnd': '2025-03-02',
+     'priorLongest': 12, 'longestStreak': 12,
+     'weekStreakStart': '2025-02-09', 'weekStreakEnd': '2025-03-02',
+     'weekPriorLongest': 2, 'weekLongestStreak': 4}
+
+so dashboards read totals, rates and streaks without touching the history.
+``streakStart``/``streakEnd`` are the latest run of done days and
+``priorLongest`` the longest run before it. The ``week`` fields are the
+same for runs of weeks with a done day, which are the streaks of Weekly
+habits, keyed by the weeks' Sundays; weeks run Sunday to Saturday, as in
+the analytics.
+
+A change to one day updates the block in O(1) with update_aggregates, which
+looks at no history more than NEIGHBOURHOOD_REACH_DAYS away from the day. The few
+changes whose effect reaches further, such as splitting the run that held
+the longest streak, return None and the caller rebuilds the block with
+build_aggregates, as whole-document writes do. aggregates_drift compares a
+stored block with a rebuild.
+"""
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from app.models.analytics import day_strings, longest_run, rate, week_strings, week_start
+from app.models.history import DONE, NOT_DONE, UNTRACKED, HistoryBitmap, parse_date
+
+AGGREGATES_FIELD = 'aggregates'
+# Share of analytics reads that also check the stored block against the
+# history; a block missing fields is rebuilt on every read
+AGGREGATES_CHECK_RATE = 0.02
+
+# Runs are followed at most this many days, or weeks, back from a change
+NEIGHBOURHOOD_DAYS = 7
+NEIGHBOURHOOD_WEEKS = 4
+# update_aggregates reads the history at most this many days either side
+NEIGHBOURHOOD_REACH_DAYS = 7 * NEIGHBOURHOOD_WEEKS + 6
+
+
+def _week_done(history: HistoryBitmap, sunday: date) -> bool:
+    return any(history.get(sunday + timedelta(days=i)) == DONE for i in range(7))
+
+
+class _Runs(NamedTuple):
+    """Where the block keeps one kind of run, and how its units are read"""
+    start: str
+    end: str
+    prior: str
+    longest: str
+    step: timedelta
+    neighbourhood: int
+    done: Callable[[HistoryBitmap, date], bool]
+
+
+DAY_RUNS = _Runs('streakStart', 'streakEnd', 'priorLongest', 'longestStreak', timedelta(days=1),
+                 NEIGHBOURHOOD_DAYS, lambda history, day: history.get(day) == DONE)
+WEEK_RUNS = _Runs('weekStreakStart', 'weekStreakEnd', 'weekPriorLongest', 'weekLongestStreak', timedelta(weeks=1),
+                  NEIGHBOURHOOD_WEEKS, _week_done)
+
+
+def empty_aggregates() -> Dict[str, Any]:
+    return {
+        'done': 0,
+        'notDone': 0,
+        'weeksDone': 0,
+        'lastTracked': None,
+        'streakStart': None,
+        'streakEnd': None,
+        'priorLongest': 0,
+        'longestStreak': 0,
+        'weekStreakStart': None,
+        'weekStreakEnd': None,
+        'weekPriorLongest': 0,
+        'weekLongestStreak': 0
+    }
+
+
+def needs_rebuild(aggregates: Optional[Dict[str, Any]]) -> bool:
+    """Whether a stored block is missing, or older than some of its fields"""
+    return aggregates is None or any(field not in aggregates for field in empty_aggregates())
+
+
+def build_aggregates(history: HistoryBitmap) -> Dict[str, Any]:
+    """Compute the block from the whole history"""
+    aggregates = empty_aggregates()
+    done, not_done = day_strings(bytes(history.bits))
+    last = max(done.rfind('1'), not_done.rfind('1'))
+    if last < 0:
+        return aggregates
+
+    base = history.base
+    aggregates['done'] = done.count('1')
+    aggregates['notDone'] = not_done.count('1')
+    aggregates['lastTracked'] = (base + timedelta(days=last)).isoformat()
+
+    if done.rfind('1') >= 0:
+        _build_runs(aggregates, DAY_RUNS, done, base)
+        weeks, _ = week_strings(base, done, not_done)
+        _build_runs(aggregates, WEEK_RUNS, weeks, week_start(base))
+        aggregates['weeksDone'] = weeks.count('1')
+    return aggregates
+
+
+def _build_runs(aggregates, runs, units, first):
+    """Fill in the latest run and the longest before it; units[i] is first + i steps"""
+    end = units.rfind('1')
+    start = units.rfind('0', 0, end) + 1
+    aggregates[runs.start] = (first + start * runs.step).isoformat()
+    aggregates[runs.end] = (first + end * runs.step).isoformat()
+    aggregates[runs.prior] = longest_run(units[:start])
+    aggregates[runs.longest] = max(aggregates[runs.prior], end - start + 1)
+
+
+def update_aggregates(aggregates: Dict[str, Any], history: HistoryBitmap, day,
+                      previous: int, state: int) -> Optional[Dict[str, Any]]:
+    """Apply one day's change from previous to state in O(1)
+
+    history must already hold the change. Returns the new block, or None
+    when it cannot be worked out without scanning the history.
+    """
+    if previous == state:
+        return aggregates
+    if needs_rebuild(aggregates):
+        return None
+    day = parse_date(day)
+    aggregates = dict(aggregates)
+
+    for old_or_new, sign in ((previous, -1), (state, 1)):
+        if old_or_new == DONE:
+            aggregates['done'] += sign
+        elif old_or_new == NOT_DONE:
+            aggregates['notDone'] += sign
+
+    last_tracked = parse_date(aggregates['lastTracked']) if aggregates['lastTracked'] else None
+    if state != UNTRACKED:
+        if last_tracked is None or day > last_tracked:
+            aggregates['lastTracked'] = day.isoformat()
+    elif day == last_tracked:
+        last_tracked = _scan_back(history, day, (DONE, NOT_DONE))
+        if last_tracked is None and aggregates['done'] + aggregates['notDone']:
+            return None
+        aggregates['lastTracked'] = last_tracked and last_tracked.isoformat()
+
+    if (previous == DONE) != (state == DONE):
+        week = week_start(day)
+        week_flipped = not any(history.get(week + timedelta(days=i)) == DONE for i in range(7)
+                               if week + timedelta(days=i) != day)
+        if week_flipped:
+            aggregates['weeksDone'] += 1 if state == DONE else -1
+
+        # Days, then the day's week if that changed too
+        changes = [(DAY_RUNS, day)] + ([(WEEK_RUNS, week)] if week_flipped else [])
+        for runs, unit in changes:
+            if state == DONE:
+                aggregates = _streak_added(aggregates, history, unit, runs)
+            else:
+                aggregates = _streak_removed(aggregates, history, unit, runs)
+            if aggregates is None:
+                return None
+            aggregates[runs.longest] = max(aggregates[runs.prior], _streak_length(aggregates, runs))
+    return aggregates
+
+
+def _streak_length(aggregates: Dict[str, Any], runs: _Runs = DAY_RUNS) -> int:
+    if not aggregates[runs.end]:
+        return 0
+    return (date.fromisoformat(aggregates[runs.end]) - date.fromisoformat(aggregates[runs.start])) // runs.step + 1
+
+
+def _streak_added(aggregates, history, unit, runs):
+    one = runs.step
+    before, after = runs.done(history, unit - one), runs.done(history, unit + one)
+    if not aggregates[runs.end]:
+        aggregates[runs.start] = aggregates[runs.end] = unit.isoformat()
+        return aggregates
+
+    start, end = date.fromisoformat(aggregates[runs.start]), date.fromisoformat(aggregates[runs.end])
+    if unit == end + one:
+        aggregates[runs.end] = unit.isoformat()
+    elif unit > end:
+        aggregates[runs.prior] = max(aggregates[runs.prior], _streak_length(aggregates, runs))
+        aggregates[runs.start] = aggregates[runs.end] = unit.isoformat()
+    elif unit == start - one and not before:
+        aggregates[runs.start] = unit.isoformat()
+    elif not before and not after:
+        # A new one-unit run among the older ones
+        aggregates[runs.prior] = max(aggregates[runs.prior], 1)
+    else:
+        # Joins older runs whose lengths the block does not hold
+        return None
+    return aggregates
+
+
+def _streak_removed(aggregates, history, unit, runs):
+    one = runs.step
+    start, end = date.fromisoformat(aggregates[runs.start]), date.fromisoformat(aggregates[runs.end])
+    if start <= unit <= end:
+        if start == end:
+            return _previous_streak(aggregates, history, unit, runs)
+        if unit == end:
+            aggregates[runs.end] = (unit - one).isoformat()
+        else:
+            # Units before the removed one become an older run
+            aggregates[runs.prior] = max(aggregates[runs.prior], (unit - start) // one)
+            aggregates[runs.start] = (unit + one).isoformat()
+        return aggregates
+
+    isolated = not runs.done(history, unit - one) and not runs.done(history, unit + one)
+    if isolated and aggregates[runs.prior] > 1:
+        return aggregates
+    # Shortens or splits an older run, which may have been the longest
+    return None
+
+
+def _previous_streak(aggregates, history, unit, runs):
+    """Make the run before unit the latest, if it lies close enough to find"""
+    if not aggregates['done']:
+        aggregates.update({runs.start: None, runs.end: None, runs.prior: 0})
+        return aggregates
+
+    one = runs.step
+    end = next((unit - offset * one for offset in range(1, runs.neighbourhood)
+                if runs.done(history, unit - offset * one)), None)
+    if end is None:
+        return None
+    start = end
+    while (unit - start) // one < runs.neighbourhood - 1 and runs.done(history, start - one):
+        start -= one
+    length = (end - start) // one + 1
+    # The prior longest may have been this run itself, or the run may go on
+    if length >= aggregates[runs.prior] or runs.done(history, start - one):
+        return None
+    aggregates.update({runs.start: start.isoformat(), runs.end: end.isoformat()})
+    return aggregates
+
+
+def _scan_back(history, day, states) -> Optional[date]:
+    """Latest day before day, within NEIGHBOURHOOD_DAYS - 1, in one of states"""
+    for offset in range(1, NEIGHBOURHOOD_DAYS):
+        earlier = day - timedelta(days=offset)
+        if history.get(earlier) in states:
+            return earlier
+    return None
+
+
+def aggregates_drift(aggregates: Optional[Dict[str, Any]], history: HistoryBitmap) -> List[str]:
+    """Fields of a stored block that disagree with a rebuild from history"""
+    expected = build_aggregates(history)
+    aggregates = aggregates or {}
+    return sorted(field for field, value in expected.items() if aggregates.get(field) != value)
+
+
+def summarize_aggregates(aggregates: Dict[str, Any], started_date: Optional[str] = None,
+                         frequency: str = 'Daily', today: Optional[date] = None) -> Dict[str, Any]:
+    """Dashboard figures from the block alone, in compute_analytics' terms"""
+    today = today or date.today()
+    # Weekly habits keep streaks of weeks, each keyed by its Sunday
+    runs, period = (WEEK_RUNS, week_start(today)) if frequency == 'Weekly' else (DAY_RUNS, today)
+    streak_end = parse_date(aggregates[runs.end]) if aggregates.get(runs.end) else None
+    # The current streak ends this period, or the last one while this one is still open
+    last_tracked = parse_date(aggregates['lastTracked']) if aggregates['lastTracked'] else None
+    period_open = last_tracked is None or not period <= last_tracked < period + runs.step
+    current_streak = 0
+    if streak_end == period or (streak_end == period - runs.step and period_open):
+        current_streak = _streak_length(aggregates, runs)
+
+    start = (parse_date(started_date) if started_date else None) or today
+    if frequency == 'Weekly':
+        total = max(0, (today - week_start(start)).days // 7 + 1)
+        completed = aggregates['weeksDone']
+    else:
+        total = max(0, (today - start).days + 1)
+        completed = aggregates['done']
+
+    tracked = aggregates['done'] + aggregates['notDone']
+    return {
+        'current_streak': current_streak,
+        'longest_streak': aggregates[runs.longest],
+        'total_done': aggregates['done'],
+        'total_tracked': tracked,
+        'success_rate': rate(aggregates['done'], tracked),
+        'last_tracked': aggregates['lastTracked'],
+        'periods': {'frequency': frequency, 'total': total, 'completed': completed, 'rate': rate(completed, total)}
+    }
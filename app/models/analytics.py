@@ -0,0 +1,176 @@
+"""Streak and rolling-window analytics over a HistoryBitmap
+
+All computations work on whole-history bit strings rather than walking dates
+one by one: the two-bit-per-day bitmap is expanded once into per-day '0'/'1'
+strings (a single C-level ``bin()`` and two slices), after which streaks,
+windows and histograms are ``split``/``count``/slice operations. Results are
+memoised on the bitmap contents, so each document version is analysed once.
+"""
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+from app.models.history import HistoryBitmap
+
+ROLLING_WINDOWS = (7, 30, 90)
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def day_strings(bits: bytes) -> Tuple[str, str]:
+    """Expand the bitmap into done / not-done strings, one char per day from base"""
+    if not bits:
+        return '', ''
+    value = int.from_bytes(bits, 'little')
+    width = len(bits) * 8
+    # Set a sentinel bit so leading zero days survive bin(), then read LSB-first
+    slots = bin(value | (1 << width))[3:][::-1]
+    return slots[0::2], slots[1::2]
+
+
+def week_start(day: date) -> date:
+    """The Sunday a day's week starts on; weeks run Sunday to Saturday, as the client's period keys do"""
+    return day - timedelta(days=(day.weekday() + 1) % 7)
+
+
+def week_strings(base: date, done: str, not_done: str) -> Tuple[str, str]:
+    """Collapse per-day strings from base into per-week ones from week_start(base)
+
+    A week is '1' in the first if any of its days is done, and in the second
+    if any is tracked as not done.
+    """
+    lead = '0' * (base - week_start(base)).days
+    done, not_done = lead + done, lead + not_done
+    return (''.join('1' if '1' in done[i:i + 7] else '0' for i in range(0, len(done), 7)),
+            ''.join('1' if '1' in not_done[i:i + 7] else '0' for i in range(0, len(not_done), 7)))
+
+
+def longest_run(units: str) -> int:
+    """Length of the longest run of '1's"""
+    return max(map(len, units.split('0'))) if units else 0
+
+
+def _streaks(done: str, not_done: str) -> Tuple[int, int]:
+    """Current and longest runs of done units; the last unit is the current period
+
+    The current streak ends with the current period, or the one before while
+    the current period is still open.
+    """
+    end = len(done)
+    if end and done[-1] == '0' and not_done[-1] == '0':
+        end -= 1
+    return end - (done.rfind('0', 0, end) + 1), longest_run(done)
+
+
+def rate(done: int, tracked: int) -> Optional[int]:
+    """done / tracked as a rounded percentage, or None when nothing is tracked"""
+    if tracked == 0:
+        return None
+    return round((done / tracked) * 100)
+
+
+@lru_cache(maxsize=1024)
+def _compute(base: Optional[date], bits: bytes, start: Optional[date],
+             frequency: str, today: date) -> Dict[str, Any]:
+    done, not_done = day_strings(bits)
+
+    # Index everything relative to today: position i is base + i
+    today_index = (today - base).days if base else -1
+    if today_index >= len(done):
+        pad = today_index + 1 - len(done)
+        done += '0' * pad
+        not_done += '0' * pad
+    history_done = done[:today_index + 1] if today_index >= 0 else ''
+    history_not_done = not_done[:today_index + 1] if today_index >= 0 else ''
+
+    # Weekly habits have streaks of weeks with a done day
+    if frequency == 'Weekly' and base:
+        current_streak, longest_streak = _streaks(*week_strings(base, history_done, history_not_done))
+    else:
+        current_streak, longest_streak = _streaks(history_done, history_not_done)
+
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        lo = max(0, len(history_done) - window)
+        window_done = history_done[lo:].count('1')
+        window_tracked = window_done + history_not_done[lo:].count('1')
+        rolling[f'{window}d'] = {
+            'done': window_done,
+            'tracked': window_tracked,
+            'rate': rate(window_done, window_tracked)
+        }
+
+    weekday_histogram = {}
+    if base:
+        first = base.weekday()
+        for weekday in range(7):
+            offset = (weekday - first) % 7
+            weekday_histogram[WEEKDAYS[weekday]] = history_done[offset::7].count('1')
+    else:
+        weekday_histogram = {name: 0 for name in WEEKDAYS}
+
+    periods = _periods(base, history_done, start, frequency, today)
+
+    total_done = history_done.count('1')
+    total_tracked = total_done + history_not_done.count('1')
+    return {
+        'current_streak': current_streak,
+        'longest_streak': longest_streak,
+        'total_done': total_done,
+        'total_tracked': total_tracked,
+        'success_rate': rate(total_done, total_tracked),
+        'rolling': rolling,
+        'weekday_histogram': weekday_histogram,
+        'periods': periods
+    }
+
+
+def _periods(base: Optional[date], history_done: str, start: Optional[date],
+             frequency: str, today: date) -> Dict[str, Any]:
+    """Bucket the history into Daily or Weekly periods since the start date"""
+    if start is None:
+        start = base or today
+    if start > today:
+        return {'frequency': frequency, 'total': 0, 'completed': 0, 'rate': None}
+
+    # Align the start with the bitmap; days before base were never tracked
+    offset = (start - base).days if base else 0
+    if offset < 0:
+        history_done = '0' * -offset + history_done
+        offset = 0
+    days = history_done[offset:]
+
+    if frequency == 'Weekly':
+        weeks, _ = week_strings(start, days, '')
+        total = ((today - week_start(start)).days // 7) + 1
+        completed = weeks.count('1')
+    else:
+        total = (today - start).days + 1
+        completed = days.count('1')
+
+    return {
+        'frequency': frequency,
+        'total': total,
+        'completed': completed,
+        'rate': rate(completed, total)
+    }
+
+
+def compute_analytics(history: HistoryBitmap, start_date: Optional[str] = None,
+                      frequency: str = 'Daily', today: Optional[date] = None) -> Dict[str, Any]:
+    """Return streaks, rolling rates, weekday histogram and period buckets
+
+    The result is memoised on the history contents, start date, frequency and
+    day, and returned as a fresh top-level dict.
+    """
+    start = None
+    if start_date:
+        try:
+            start = date.fromisoformat(str(start_date)[:10])
+        except ValueError:
+            start = None
+    result = _compute(history.base, bytes(history.bits), start,
+                      frequency or 'Daily', today or date.today())
+    return dict(result)
+
+
+def clear_cache() -> None:
+    _compute.cache_clear()
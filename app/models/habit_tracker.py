@@ -1,97 +1,154 @@
 from datetime import datetime, date
-import json
-import os
+from app.models.aggregates import (
+    AGGREGATES_FIELD, aggregates_drift, build_aggregates, summarize_aggregates, update_aggregates
+)
+from app.models.history import HistoryBitmap, DONE, NOT_DONE, UNTRACKED
+from app.models.journal import JournalStore, SEQ_FIELD
 
 
 class HabitTracker:
     def __init__(self, data_file='habit_data.json'):
         self.data_file = data_file
-        self.data = self._load_data()
-    
-    def _load_data(self):
-        """Load habit data from JSON file"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r') as f:
-                    return json.load(f)
-            except:
-                pass
+        self.store = JournalStore.for_path(data_file)
+        self._load()
+
+    def _load(self):
+        """Load the snapshot and replay the journal records written after it"""
+        with self.store.lock:
+            snapshot, records = self.store.read()
+            self.data = self._load_data(snapshot)
+            self.history = self._load_history(self.data)
+            if AGGREGATES_FIELD not in self.data:
+                self.data[AGGREGATES_FIELD] = build_aggregates(self.history)
+            for record in records:
+                self._apply(record)
+            self.seq = self.store.seq
+
+    def _load_data(self, snapshot):
+        """Return the snapshot contents, or defaults for a new data file"""
+        if snapshot is not None:
+            snapshot.pop(SEQ_FIELD, None)
+            return snapshot
         return {
-            'completed_dates': [], 
-            'not_done_dates': [],
+            'history': HistoryBitmap().to_dict(),
             'why_entries': {},
             'start_date': str(date.today()),
             'frequency': 'Daily',
             'counter': 0
         }
-    
+
+    def _load_history(self, data):
+        """Decode the history bitmap, upgrading legacy date lists in place"""
+        if 'history' in data:
+            return HistoryBitmap.from_dict(data['history'])
+        history = HistoryBitmap.from_lists(data.pop('completed_dates', []),
+                                           data.pop('not_done_dates', []))
+        data['history'] = history.to_dict()
+        return history
+
+    def _apply(self, record):
+        """Apply one journal record to the in-memory state"""
+        op = record.get('op')
+        if op == 'set_day':
+            previous = self.history.set(record['date'], record['state'])
+            aggregates = update_aggregates(self.data[AGGREGATES_FIELD], self.history, record['date'],
+                                           previous, record['state'])
+            self.data[AGGREGATES_FIELD] = aggregates if aggregates is not None else build_aggregates(self.history)
+        elif op == 'set_why':
+            self.data.setdefault('why_entries', {})[record['date']] = record['text']
+        elif op == 'set':
+            self.data[record['key']] = record['value']
+
+    def _refresh(self):
+        """Reload if another tracker has written since this one was loaded"""
+        if self.store.seq != self.seq:
+            self._load()
+
+    def _record(self, record):
+        """Apply a mutation and append it to the journal (caller holds the lock)"""
+        self._apply(record)
+        self.seq = self.store.append(record)
+        if self.store.needs_compaction():
+            self._save_data()
+
+    def flush(self):
+        """Compact any journaled changes into the snapshot and make it durable"""
+        with self.store.lock:
+            self._refresh()
+            if self.store.records_since_compaction:
+                self._save_data()
+            self.store.sync()
+
     def _save_data(self):
-        """Save habit data to JSON file"""
-        with open(self.data_file, 'w') as f:
-            json.dump(self.data, f)
-    
+        """Compact the journal into an atomically replaced snapshot
+
+        Compaction is also when the aggregates are checked against the
+        history they summarise.
+        """
+        self.data['history'] = self.history.to_dict()
+        drift = aggregates_drift(self.data.get(AGGREGATES_FIELD), self.history)
+        if drift:
+            print(f"Aggregates of {self.data_file} drifted in: {', '.join(drift)}")
+            self.data[AGGREGATES_FIELD] = build_aggregates(self.history)
+        with self.store.lock:
+            self.store.compact(self.data)
+            self.seq = self.store.seq
+
     def get_started_date(self):
         """Get the started date"""
         return self.data.get('start_date', str(date.today()))
-    
+
     def get_frequency(self):
         """Get the frequency (Daily/Weekly)"""
         return self.data.get('frequency', 'Daily')
-    
+
     def get_counter(self):
         """Get the counter value"""
         return self.data.get('counter', 0)
-    
-    def get_completed_dates(self):
-        """Get list of completed dates"""
-        return self.data.get('completed_dates', [])
-    
-    def get_not_done_dates(self):
-        """Get list of not done dates"""
-        return self.data.get('not_done_dates', [])
-    
+
+    def get_completed_dates(self, since=None):
+        """Get list of completed dates, optionally only those from since on"""
+        return self.history.dates(DONE, since)
+
+    def get_not_done_dates(self, since=None):
+        """Get list of not done dates, optionally only those from since on"""
+        return self.history.dates(NOT_DONE, since)
+
     def get_why_entries(self):
         """Get why entries dictionary"""
         return self.data.get('why_entries', {})
-    
+
     def is_done_today(self):
         """Check if habit is marked done for today"""
-        today = str(date.today())
-        return today in self.data.get('completed_dates', [])
-    
+        return self.history.get(date.today()) == DONE
+
     def is_not_done_today(self):
         """Check if habit is marked not done for today"""
-        today = str(date.today())
-        return today in self.data.get('not_done_dates', [])
-    
+        return self.history.get(date.today()) == NOT_DONE
+
     def get_why_today(self):
         """Get why entry for today if exists"""
         today = str(date.today())
         return self.data.get('why_entries', {}).get(today, '')
-    
+
     def toggle_today(self):
         """Toggle habit completion for today"""
-        today = str(date.today())
-        completed_dates = self.data.get('completed_dates', [])
-        
-        if today in completed_dates:
-            completed_dates.remove(today)
-        else:
-            completed_dates.append(today)
-        
-        self.data['completed_dates'] = completed_dates
-        self._save_data()
-    
+        today = date.today()
+
+        with self.store.lock:
+            self._refresh()
+            state = UNTRACKED if self.history.get(today) == DONE else DONE
+            self._record({'op': 'set_day', 'date': str(today), 'state': state})
+
+    def get_aggregates(self):
+        """Get the dashboard aggregates (see app.models.aggregates)"""
+        return dict(self.data[AGGREGATES_FIELD])
+
+    def get_summary(self):
+        """Get streaks, totals and period rates without scanning the history"""
+        return summarize_aggregates(self.data[AGGREGATES_FIELD], self.get_started_date(), self.get_frequency())
+
     def get_success_percentage(self):
         """Calculate success percentage since start date"""
-        completed_dates = self.data.get('completed_dates', [])
-        not_done_dates = self.data.get('not_done_dates', [])
-        
-        total_tracked = len(completed_dates) + len(not_done_dates)
-        
-        if total_tracked == 0:
-            return 0
-        
         # Calculate percentage: completed / (completed + not_done) * 100
-        percentage = round((len(completed_dates) / total_tracked) * 100)
-        return percentage
\ No newline at end of file
+        return self.get_summary()['success_rate'] or 0
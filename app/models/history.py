@@ -0,0 +1,214 @@
+import base64
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+UNTRACKED = 0
+DONE = 1
+NOT_DONE = 2
+
+ENCODING_VERSION = 1
+
+# Days of history sent with a page; older days are fetched when needed
+RECENT_HISTORY_DAYS = 90
+
+# Days outside this window are rejected, so one stray date cannot make a
+# bitmap (and every rebuild of it) centuries long
+EARLIEST_DATE = date(2000, 1, 1)
+LATEST_DAYS_AHEAD = 366
+
+# Two bits per day, four days per byte, little-endian within the byte
+_DONE_MASK_BYTE = 0x55
+_NOT_DONE_MASK_BYTE = 0xAA
+
+
+def parse_date(value) -> Optional[date]:
+    """A date from a date or an ISO string, or None if it is neither"""
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def latest_date(today: Optional[date] = None) -> date:
+    """The last day a history may hold"""
+    return (today or date.today()) + timedelta(days=LATEST_DAYS_AHEAD)
+
+
+def in_window(day: date, today: Optional[date] = None) -> bool:
+    """Whether a day lies between EARLIEST_DATE and latest_date()"""
+    return EARLIEST_DATE <= day <= latest_date(today)
+
+
+class HistoryBitmap:
+    """Completion history stored as a two-bit-per-day state bitmap
+
+    Day ``base + i`` lives in bits ``2*(i % 4)`` of byte ``i // 4``. Lookups and
+    updates are O(1); done/not-done totals are kept up to date on every change,
+    so success percentages never scan the history.
+    """
+
+    def __init__(self, base: Optional[date] = None, bits: bytes = b''):
+        self.base = base if bits else None
+        self.bits = bytearray(bits) if base else bytearray()
+        self.done_count, self.not_done_count = self._popcounts()
+
+    # Construction / encoding
+
+    @classmethod
+    def from_lists(cls, completed_dates: Iterable = (), not_done_dates: Iterable = ()) -> 'HistoryBitmap':
+        """Build a bitmap from legacy lists of ISO date strings
+
+        Unparseable dates and dates outside the window are dropped.
+        """
+        history = cls()
+        for value in not_done_dates or ():
+            day = parse_date(value)
+            if day and in_window(day):
+                history.set(day, NOT_DONE)
+        for value in completed_dates or ():
+            day = parse_date(value)
+            if day and in_window(day):
+                history.set(day, DONE)
+        return history
+
+    @classmethod
+    def from_dict(cls, encoded: Optional[Dict[str, Any]]) -> 'HistoryBitmap':
+        """Decode the versioned ``{'v', 'base', 'bits'}`` representation"""
+        if not encoded or not encoded.get('bits'):
+            return cls()
+        if encoded.get('v') != ENCODING_VERSION:
+            raise ValueError(f"Unsupported history encoding version: {encoded.get('v')}")
+        return cls(date.fromisoformat(encoded['base']), base64.b64decode(encoded['bits']))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Encode as a compact, JSON/Firestore-safe dict"""
+        self._trim()
+        if not self.bits:
+            return {'v': ENCODING_VERSION, 'base': None, 'bits': ''}
+        return {
+            'v': ENCODING_VERSION,
+            'base': self.base.isoformat(),
+            'bits': base64.b64encode(bytes(self.bits)).decode('ascii')
+        }
+
+    def copy(self) -> 'HistoryBitmap':
+        return HistoryBitmap(self.base, bytes(self.bits))
+
+    # Day access
+
+    def get(self, day) -> int:
+        """Return the state of a day (UNTRACKED, DONE or NOT_DONE)"""
+        day = parse_date(day)
+        if day is None or self.base is None:
+            return UNTRACKED
+        offset = (day - self.base).days
+        if offset < 0 or offset >= len(self.bits) * 4:
+            return UNTRACKED
+        return (self.bits[offset >> 2] >> ((offset & 3) * 2)) & 3
+
+    def set(self, day, state: int) -> int:
+        """Set the state of a day and return its previous state"""
+        parsed = parse_date(day)
+        if parsed is None:
+            raise ValueError(f"Invalid date: {day!r}")
+        day = parsed
+        if state not in (UNTRACKED, DONE, NOT_DONE):
+            raise ValueError(f"Invalid state: {state!r}")
+
+        previous = self.get(day)
+        if previous == state:
+            return previous
+        if state != UNTRACKED:
+            if not in_window(day):
+                raise ValueError(f"Date outside the history window: {day.isoformat()}")
+            self._ensure_covers(day)
+        elif previous == UNTRACKED:
+            return previous
+
+        offset = (day - self.base).days
+        shift = (offset & 3) * 2
+        byte = self.bits[offset >> 2]
+        self.bits[offset >> 2] = (byte & ~(3 << shift) & 0xFF) | (state << shift)
+
+        if previous == DONE:
+            self.done_count -= 1
+        elif previous == NOT_DONE:
+            self.not_done_count -= 1
+        if state == DONE:
+            self.done_count += 1
+        elif state == NOT_DONE:
+            self.not_done_count += 1
+        return previous
+
+    def dates(self, state: int, start=None, end=None) -> List[str]:
+        """Return the sorted ISO dates that are in the given state
+
+        start and end (inclusive) limit the result to a window; only the
+        bytes covering it are scanned.
+        """
+        result = []
+        if self.base is None:
+            return result
+        first = 0 if start is None else max((parse_date(start) - self.base).days, 0)
+        last = len(self.bits) * 4 - 1
+        if end is not None:
+            last = min((parse_date(end) - self.base).days, last)
+        for index in range(first >> 2, (last >> 2) + 1 if last >= first else 0):
+            byte = self.bits[index]
+            if not byte:
+                continue
+            for slot in range(4):
+                offset = index * 4 + slot
+                if first <= offset <= last and (byte >> (slot * 2)) & 3 == state:
+                    result.append((self.base + timedelta(days=offset)).isoformat())
+        return result
+
+    def success_percentage(self) -> int:
+        """Completed / (completed + not done) as a rounded percentage"""
+        total_tracked = self.done_count + self.not_done_count
+        if total_tracked == 0:
+            return 0
+        return round((self.done_count / total_tracked) * 100)
+
+    # Internals
+
+    def _popcounts(self):
+        if not self.bits:
+            return 0, 0
+        value = int.from_bytes(self.bits, 'little')
+        done_mask = int.from_bytes(bytes([_DONE_MASK_BYTE]) * len(self.bits), 'little')
+        not_done_mask = int.from_bytes(bytes([_NOT_DONE_MASK_BYTE]) * len(self.bits), 'little')
+        # A slot holds exactly one state, so one set bit per tracked day
+        return (value & done_mask).bit_count(), (value & not_done_mask).bit_count()
+
+    def _ensure_covers(self, day: date):
+        if self.base is None:
+            self.base = day
+            self.bits = bytearray(1)
+            return
+        offset = (day - self.base).days
+        if offset < 0:
+            # Prepend whole bytes so existing slots keep their alignment
+            extra = (-offset + 3) // 4
+            self.base -= timedelta(days=extra * 4)
+            self.bits[0:0] = bytes(extra)
+        elif offset >= len(self.bits) * 4:
+            self.bits.extend(bytes((offset >> 2) + 1 - len(self.bits)))
+
+    def _trim(self):
+        """Drop leading and trailing empty bytes"""
+        end = len(self.bits)
+        while end and not self.bits[end - 1]:
+            end -= 1
+        start = 0
+        while start < end and not self.bits[start]:
+            start += 1
+        if start == end:
+            self.base = None
+            self.bits = bytearray()
+            return
+        if start or end != len(self.bits):
+            self.base += timedelta(days=start * 4)
+            self.bits = self.bits[start:end]
@@ -0,0 +1,211 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+SEQ_FIELD = 'journal_seq'
+
+
+class JournalStore:
+    """Snapshot plus append-only journal for one local data file
+
+    Mutations are appended to ``<data_file>.journal`` as JSON lines and fsynced
+    in batches (group commit): at most every ``fsync_interval`` seconds or
+    ``fsync_batch`` records, whichever comes first. The journal is periodically
+    compacted into the snapshot at ``<data_file>``, which is written to a temp
+    file and atomically renamed into place, so a crash never leaves a
+    half-written snapshot behind.
+
+    One store is shared by every reader and writer of the same file (see
+    for_path); its ``lock`` serialises mutations across threads. The registry
+    holds stores weakly, so a store lives exactly as long as some tracker
+    still uses it.
+    """
+
+    _stores = weakref.WeakValueDictionary()
+    _stores_lock = threading.Lock()
+
+    def __init__(self, snapshot_path: str, fsync_interval: float = 0.05,
+                 fsync_batch: int = 32, compact_every: int = 256):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + '.journal'
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self.seq = 0
+        self.records_since_compaction = 0
+        self._journal = None
+        self._journal_end = None
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+        self._fsync_timer = None
+
+    @classmethod
+    def for_path(cls, snapshot_path: str, **options) -> 'JournalStore':
+        """Return the process-wide store for a data file"""
+        key = os.path.abspath(snapshot_path)
+        with cls._stores_lock:
+            store = cls._stores.get(key)
+            if store is None:
+                store = cls(snapshot_path, **options)
+                cls._stores[key] = store
+            return store
+
+    # Reading
+
+    def read(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return the snapshot (None if missing) and the journal records after it"""
+        with self.lock:
+            snapshot = self._read_snapshot()
+            snapshot_seq = snapshot.get(SEQ_FIELD, 0) if snapshot else 0
+            # Records up to the snapshot's seq survive only if we crashed
+            # between renaming the snapshot and truncating the journal
+            records = [r for r in self._read_journal() if r['seq'] > snapshot_seq]
+            self.seq = max([snapshot_seq] + [r['seq'] for r in records] + [self.seq])
+            self.records_since_compaction = len(records)
+            return snapshot, records
+
+    def _read_snapshot(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading snapshot {self.snapshot_path}: {e}")
+            return None
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        records = []
+        end = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    # A torn final line from a crash mid-append is dropped
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+                    end += len(line)
+        self._journal_end = end
+        return records
+
+    # Writing
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Append a mutation record and return its sequence number"""
+        with self.lock:
+            journal = self._open_journal()
+            self.seq += 1
+            line = json.dumps(dict(record, seq=self.seq), separators=(',', ':')) + '\n'
+            journal.write(line.encode('utf-8'))
+            journal.flush()
+            self._unsynced += 1
+            self.records_since_compaction += 1
+
+            if (self._unsynced >= self.fsync_batch or
+                    time.monotonic() - self._last_fsync >= self.fsync_interval):
+                self._fsync()
+            elif self._fsync_timer is None:
+                self._fsync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self._fsync_timer.daemon = True
+                self._fsync_timer.start()
+            return self.seq
+
+    def needs_compaction(self) -> bool:
+        return self.records_since_compaction >= self.compact_every
+
+    def compact(self, state: Dict[str, Any]) -> None:
+        """Atomically write state as the new snapshot and truncate the journal
+
+        state must reflect every record appended so far.
+        """
+        with self.lock:
+            snapshot = dict(state)
+            snapshot[SEQ_FIELD] = self.seq
+
+            directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(snapshot, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            _fsync_directory(directory)
+
+            journal = self._open_journal()
+            journal.truncate(0)
+            journal.seek(0)
+            self._journal_end = 0
+            self._fsync()
+            self.records_since_compaction = 0
+
+    def sync(self) -> None:
+        """fsync any journal records that are not yet durable"""
+        with self.lock:
+            if self._unsynced:
+                self._fsync()
+
+    def close(self) -> None:
+        with self.lock:
+            self.sync()
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _open_journal(self):
+        if self._journal is None:
+            if self._journal_end is None:
+                self._read_journal()
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            self._journal = open(self.journal_path, 'ab')
+            # Cut off a torn record so the next append starts on a clean line
+            if self._journal.tell() > self._journal_end:
+                self._journal.truncate(self._journal_end)
+                self._journal.seek(self._journal_end)
+        return self._journal
+
+    def _fsync(self):
+        if self._fsync_timer is not None:
+            self._fsync_timer.cancel()
+            self._fsync_timer = None
+        if self._journal is not None:
+            os.fsync(self._journal.fileno())
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+
+def _fsync_directory(directory: str) -> None:
+    """Make a rename durable; not supported on every platform"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@atexit.register
+def _sync_all_stores():
+    for store in list(JournalStore._stores.values()):
+        try:
+            store.close()
+        except Exception as e:
+            print(f"Error syncing journal {store.journal_path}: {e}")
@@ -0,0 +1,210 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from app.models.aggregates import AGGREGATES_FIELD, needs_rebuild, summarize_aggregates
+from app.models.habit_tracker import HabitTracker
+from app.models.history import RECENT_HISTORY_DAYS, HistoryBitmap
+from app.models.journal import JournalStore
+
+DEFAULT_DATA_FILE = 'habit_data.json'
+# Stripes of per-file load locks; concurrent misses of a file share one load
+LOAD_LOCK_STRIPES = 64
+
+
+class TrackerView(NamedTuple):
+    """Read-only, pre-computed values for rendering a tracker
+
+    Built once per file version and day and shared by all concurrent readers;
+    the date sequences are tuples and why_entries is a private copy. They
+    cover only the last RECENT_HISTORY_DAYS days, so a page does not grow
+    with the age of the habit.
+    """
+    started_date: str
+    frequency: str
+    counter: int
+    habit_done: bool
+    not_done: bool
+    why_text: str
+    success_percentage: int
+    completed_dates: Tuple[str, ...]
+    not_done_dates: Tuple[str, ...]
+    why_entries: Dict[str, str]
+
+    @classmethod
+    def from_tracker(cls, tracker: HabitTracker) -> 'TrackerView':
+        since = (date.today() - timedelta(days=RECENT_HISTORY_DAYS - 1)).isoformat()
+        return cls(
+            started_date=tracker.get_started_date(),
+            frequency=tracker.get_frequency(),
+            counter=tracker.get_counter(),
+            habit_done=tracker.is_done_today(),
+            not_done=tracker.is_not_done_today(),
+            why_text=tracker.get_why_today(),
+            success_percentage=tracker.get_success_percentage(),
+            completed_dates=tuple(tracker.get_completed_dates(since)),
+            not_done_dates=tuple(tracker.get_not_done_dates(since)),
+            why_entries={day: text for day, text in tracker.get_why_entries().items() if day >= since}
+        )
+
+    @classmethod
+    def from_habit(cls, habit: Dict[str, Any]) -> 'TrackerView':
+        """View of a client-shape habit, such as the one a page's bootstrap carries
+
+        The success rate comes from the habit's aggregates; without a current
+        block it is taken over the days the habit holds.
+        """
+        today = date.today().isoformat()
+        since = (date.today() - timedelta(days=RECENT_HISTORY_DAYS - 1)).isoformat()
+        started_date = habit.get('startedDate') or today
+        frequency = habit.get('frequency') or 'Daily'
+        completed_dates = habit.get('completedDates') or []
+        not_done_dates = habit.get('notDoneDates') or []
+        why_entries = habit.get('whyEntries') or {}
+        aggregates = habit.get(AGGREGATES_FIELD)
+        if needs_rebuild(aggregates):
+            success_percentage = HistoryBitmap.from_lists(completed_dates, not_done_dates).success_percentage()
+        else:
+            success_percentage = summarize_aggregates(aggregates, started_date, frequency)['success_rate'] or 0
+        return cls(
+            started_date=started_date,
+            frequency=frequency,
+            counter=habit.get('counter') or 0,
+            habit_done=today in completed_dates,
+            not_done=today in not_done_dates,
+            why_text=why_entries.get(today, ''),
+            success_percentage=success_percentage,
+            completed_dates=tuple(day for day in completed_dates if day >= since),
+            not_done_dates=tuple(day for day in not_done_dates if day >= since),
+            why_entries={day: text for day, text in why_entries.items() if day >= since}
+        )
+
+
+def _stat_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def file_signature(data_file: str) -> Tuple[Any, Any]:
+    """Inode, size and mtime of a data file's snapshot and journal"""
+    return (_stat_signature(data_file), _stat_signature(data_file + '.journal'))
+
+
+class _Entry:
+    __slots__ = ('tracker', 'signature', 'view', 'view_key')
+
+    def __init__(self, tracker, signature):
+        self.tracker = tracker
+        self.signature = signature
+        self.view = None
+        self.view_key = None
+
+
+class TrackerCache:
+    """Process-wide cache of parsed HabitTrackers keyed by data file
+
+    A cached tracker is reused for as long as the inode, size and mtime of its
+    snapshot and journal are unchanged, so a hit costs two stat() calls instead
+    of opening and parsing the file. Writes made through the cached tracker
+    update the entry in place via note_write().
+
+    With max_entries set the cache is an LRU; evicted trackers are flushed so
+    their journaled changes are compacted into the snapshot. A miss loads the
+    file outside the cache lock, so a slow load never holds up other files.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = [threading.Lock() for _ in range(LOAD_LOCK_STRIPES)]
+        self.hits = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def get(self, data_file: str = DEFAULT_DATA_FILE) -> HabitTracker:
+        """Return the shared tracker for data_file, reloading it if the file changed"""
+        return self._entry(data_file).tracker
+
+    def view(self, data_file: str = DEFAULT_DATA_FILE) -> TrackerView:
+        """Return the shared read-only view of the tracker for today"""
+        entry = self._entry(data_file)
+        tracker = entry.tracker
+        view, view_key = entry.view, entry.view_key
+        if view is None or view_key != (date.today(), tracker.seq):
+            with tracker.store.lock:
+                view_key = (date.today(), tracker.seq)
+                view = TrackerView.from_tracker(tracker)
+            entry.view, entry.view_key = view, view_key
+        return view
+
+    def note_write(self, data_file: str = DEFAULT_DATA_FILE) -> None:
+        """Record that the cached tracker itself wrote to data_file"""
+        key = os.path.abspath(data_file)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.signature = file_signature(data_file)
+                entry.view = None
+
+    def invalidate(self, data_file: str = DEFAULT_DATA_FILE) -> None:
+        with self._lock:
+            self._entries.pop(os.path.abspath(data_file), None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'reloads': self.reloads,
+            'evictions': self.evictions
+        }
+
+    def _entry(self, data_file: str) -> _Entry:
+        key = os.path.abspath(data_file)
+        entry = self._hit(key, file_signature(data_file))
+        if entry is not None:
+            return entry
+
+        evicted = []
+        with self._load_locks[hash(key) % LOAD_LOCK_STRIPES]:
+            # Another reader may have loaded the file while this one waited
+            entry = self._hit(key, file_signature(data_file))
+            if entry is not None:
+                return entry
+
+            store = JournalStore.for_path(data_file)
+            # Stamp the signature under the store lock so it matches
+            # exactly what the tracker loaded
+            with store.lock:
+                tracker = HabitTracker(data_file)
+                entry = _Entry(tracker, file_signature(data_file))
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self.reloads += 1
+
+                while self.max_entries and len(self._entries) > self.max_entries:
+                    _, old_entry = self._entries.popitem(last=False)
+                    evicted.append(old_entry.tracker)
+                    self.evictions += 1
+
+        # Flush outside the cache lock so slow disks do not stall lookups
+        for old_tracker in evicted:
+            try:
+                old_tracker.flush()
+            except OSError as e:
+                print(f"Error flushing evicted tracker {old_tracker.data_file}: {e}")
+        return entry
+
+    def _hit(self, key: str, signature) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.signature != signature:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
@@ -0,0 +1,36 @@
+import hashlib
+import os
+from app.models.habit_tracker import HabitTracker
+from app.models.tracker_cache import TrackerCache, TrackerView
+
+
+class ShardedTrackerStore:
+    """Per-user local HabitTrackers fanned out over a directory tree
+
+    Each user gets their own data file at ``<root>/ab/cd/<sha256(user_id)>.json``
+    so users never contend on one file or one lock, and no directory grows past
+    a few entries however many users an instance serves. Open trackers are kept
+    in a bounded LRU; evicted trackers are flushed to their snapshot.
+    """
+
+    def __init__(self, root: str = 'habit_data', max_open: int = 256):
+        self.root = root
+        self.trackers = TrackerCache(max_entries=max_open)
+
+    def path_for(self, user_id: str) -> str:
+        """Return the data file path for a user"""
+        digest = hashlib.sha256(user_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + '.json')
+
+    def get(self, user_id: str) -> HabitTracker:
+        """Return the shared tracker for a user"""
+        return self.trackers.get(self.path_for(user_id))
+
+    def view(self, user_id: str) -> TrackerView:
+        """Return the shared read-only view of a user's tracker"""
+        return self.trackers.view(self.path_for(user_id))
+
+    def note_write(self, user_id: str) -> None:
+        """Record that a user's cached tracker wrote to its data file"""
+        self.trackers.note_write(self.path_for(user_id))
+
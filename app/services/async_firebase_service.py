@@ -0,0 +1,114 @@
+import asyncio
+from typing import Dict, List, Optional, Any
+from app.services.firebase_service import _default_app, delta_sync_steps
+from app.services.sync_protocol import idle_response
+from app.services.user_summary import summary_ref_of
+
+
+def _async_firestore():
+    """Import and return google.cloud.firestore, home of the asyncio client"""
+    from google.cloud import firestore
+    return firestore
+
+
+class AsyncFirebaseService:
+    """Firestore access on the asyncio client, for the ASGI entry point
+
+    Covers the request paths app.asgi serves on the event loop; everything
+    else stays on the blocking FirebaseService. Delta sync drives the same
+    delta_sync_steps transaction as FirebaseService.sync_habit_ops, so the
+    two clients always read and write the same documents.
+    """
+
+    write_buffer = None
+
+    def __init__(self, timeout: Optional[float] = None, document_cache=None, write_buffer=None):
+        """Create the asyncio Firestore client
+
+        Must be called on the event loop that will use it. timeout is the
+        per-call deadline in seconds, and document_cache the blocking
+        service's DocumentCache, so writes made here invalidate its entries.
+        write_buffer is its WriteBuffer, whose pending saves go out first.
+        """
+        firebase_app = _default_app()
+        self.timeout = timeout
+        self.document_cache = document_cache
+        self.write_buffer = write_buffer
+        self.db = _async_firestore().AsyncClient(
+            credentials=firebase_app.credential.get_credential(),
+            project=firebase_app.project_id
+        )
+
+    def habit_ref(self, user_id: str, habit_id: str = 'main'):
+        return self.db.collection('users').document(user_id).collection('habits').document(habit_id)
+
+    def _invalidate(self, ref) -> None:
+        if self.document_cache is not None:
+            self.document_cache.invalidate(ref.path)
+
+    async def verify_token(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """Verify Firebase ID token and return user info"""
+        from firebase_admin import auth
+
+        try:
+            # Verification can fetch Google's public keys over blocking HTTP
+            return await asyncio.to_thread(auth.verify_id_token, id_token)
+        except Exception as e:
+            print(f"Token verification failed: {e}")
+            return None
+
+    async def sync_habit_ops(self, user_id: str, base_version: Optional[int], ops: List[Dict[str, Any]],
+                             client_id: Optional[str] = None,
+                             habit_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Apply a client's ops and return the ops it is missing (delta sync)
+
+        See FirebaseService.sync_habit_ops. An idle autosync is answered
+        from a fresh entry of the document cache, if there is one.
+        """
+        try:
+            habit_ref = self.habit_ref(user_id)
+            timeout = self.timeout
+            if self.write_buffer is not None:
+                await asyncio.to_thread(self.write_buffer.flush, habit_ref.path)
+            if not ops and habit_data is None and self.document_cache is not None:
+                cached = self.document_cache.get(habit_ref.path)
+                idle = idle_response(base_version, cached.data) if cached is not None and cached.fresh else None
+                if idle is not None:
+                    self.document_cache.record('hit')
+                    return idle
+
+            @_async_firestore().async_transactional
+            async def run(transaction):
+                steps = delta_sync_steps(habit_ref, user_id, base_version, ops, client_id, habit_data)
+                try:
+                    kind, target = next(steps)
+                    while True:
+                        if kind == 'get_all':
+                            # AsyncTransaction.get_all awaits the client's async
+                            # generator, so ask the client directly
+                            result = [snapshot async for snapshot in
+                                      self.db.get_all(target, transaction=transaction, timeout=timeout)]
+                        else:
+                            # A document get returns its snapshot, a query get a list
+                            result = await target.get(transaction=transaction, timeout=timeout)
+                        kind, target = steps.send(result)
+                except StopIteration as done:
+                    response, writes = done.value
+
+                for ref, data, merge in writes:
+                    if data is None:
+                        transaction.delete(ref)
+                    else:
+                        transaction.set(ref, data, merge=merge)
+                return response
+
+            result = await run(self.db.transaction())
+            self._invalidate(habit_ref)
+            self._invalidate(summary_ref_of(habit_ref))
+            return result
+        except Exception as e:
+            print(f"Error syncing habit ops: {e}")
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
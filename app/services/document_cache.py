@@ -0,0 +1,98 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+
+class CachedDocument(NamedTuple):
+    data: Dict[str, Any]
+    update_time: Any
+    fresh: bool
+
+
+class DocumentCache:
+    """Per-instance read-through cache of Firestore documents keyed by path
+
+    Entries are served straight from memory for ``ttl`` seconds. After that
+    they are stale: the caller revalidates them with a field-less read of the
+    document's ``update_time`` and, if it is unchanged, renews the entry via
+    revalidate() instead of transferring the document again. Writers call
+    invalidate() so this instance never serves its own overwritten data.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: str) -> Optional[CachedDocument]:
+        """Return a private copy of the cached document, or None"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            data, update_time, cached_at = entry
+            self._entries.move_to_end(path)
+            fresh = time.monotonic() - cached_at < self.ttl
+        return CachedDocument(copy.deepcopy(data), update_time, fresh)
+
+    def put(self, path: str, data: Dict[str, Any], update_time: Any) -> None:
+        with self._lock:
+            self._entries[path] = (copy.deepcopy(data), update_time, time.monotonic())
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revalidate(self, path: str, update_time: Any) -> bool:
+        """Renew a stale entry whose document still has update_time"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[1] != update_time:
+                self._entries.pop(path, None)
+                return False
+            self._entries[path] = (entry[0], update_time, time.monotonic())
+            return True
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def record(self, outcome: str) -> None:
+        """Count a lookup as a 'hit', 'revalidation' or 'miss'"""
+        with self._lock:
+            if outcome == 'hit':
+                self.hits += 1
+            elif outcome == 'revalidation':
+                self.revalidations += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for monitoring
+
+        hit_rate counts lookups answered from memory, including those that
+        only needed an update_time revalidation.
+        """
+        with self._lock:
+            lookups = self.hits + self.revalidations + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'revalidations': self.revalidations,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.revalidations) / lookups, 4) if lookups else 0.0
+            }
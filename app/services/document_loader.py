@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class DocumentLoader:
+    """Request-scoped, DataLoader-style reader for Firestore documents
+
+    Every document is read at most once per request, keyed by path. Documents
+    queued with prime() are fetched together with the next load() in one
+    batched ``get_all()`` call, so a handler that needs the profile and the
+    habit document pays for a single round trip.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._results = {}
+        self._pending = OrderedDict()
+        self.batches = 0
+
+    def prime(self, ref) -> None:
+        """Queue a document for the next batch"""
+        if ref.path not in self._results:
+            self._pending[ref.path] = ref
+
+    def load(self, ref) -> Tuple[Optional[Dict[str, Any]], Any]:
+        """Return (data, update_time) of a document, dispatching queued reads"""
+        if ref.path not in self._results:
+            self.prime(ref)
+            self.dispatch()
+        return self._results[ref.path]
+
+    def dispatch(self) -> None:
+        """Read every queued document in one batch"""
+        if not self._pending:
+            return
+        refs = list(self._pending.values())
+        self._pending.clear()
+        self._results.update(self.service.read_documents(refs))
+        self.batches += 1
+
+    def forget(self, ref) -> None:
+        """Drop a document the request has since written"""
+        self._results.pop(ref.path, None)
@@ -1,29 +1,479 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
 import os
+import copy
 import json
-from typing import Dict, List, Optional, Any
-from datetime import datetime, date
+import random
+import hashlib
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from datetime import datetime, date, timedelta
+from app.services.habit_document import (
+    CONTENT_HASH_FIELD, HABIT_SUMMARY_FIELDS, HISTORY_FIELD, LEGACY_HISTORY_FIELDS, content_hash, decode_habit_document,
+    encode_habit_document, history_from_document, history_window
+)
+from app.services.document_loader import DocumentLoader
+from app.services.habit_shards import (
+    SHARDED_FIELDS, SHARDS_COLLECTION, SHARDS_FIELD, assemble_document, changed_shards, is_legacy, is_sharded,
+    shard_counts, shard_ids, shards_between, split_document, years_of_ops
+)
+from app.services.sync_protocol import (
+    MERGE_ATTEMPTS, OPS_COLLECTION, OPS_RETENTION, VERSION_FIELD, apply_ops, can_send_delta, changed_fields,
+    idle_response, is_complete, merge_habit_documents, merge_habit_saves, op_document_id
+)
+from app.services.user_summary import (
+    SUMMARY_COLLECTION, SUMMARY_HABIT_FIELDS, build_summary, dashboard_from_summary, habit_summary_writes,
+    is_current, summary_ref_of, tier_writes
+)
+from app.models.aggregates import AGGREGATES_CHECK_RATE, AGGREGATES_FIELD, aggregates_drift, build_aggregates, needs_rebuild
+from app.models.analytics import compute_analytics
+from app.models.history import RECENT_HISTORY_DAYS
 
 
-class FirebaseService:
+# The Firebase Admin SDK pulls in google-cloud-firestore and gRPC, which
+# dominate cold-start time. Import it on first use so /health and anonymous
+# pages never pay for it.
+def _firebase_admin():
+    """Import and return the firebase_admin package"""
+    import firebase_admin
+    return firebase_admin
+
+
+def _firestore():
+    """Import and return firebase_admin.firestore"""
+    from firebase_admin import firestore
+    return firestore
+
+
+def _default_app():
+    """Return the default Firebase app, initializing it on first use"""
+    firebase_admin = _firebase_admin()
+    from firebase_admin import credentials
+    
+    if not firebase_admin._apps:
+        # In production, this will use service account from environment
+        # For local development, you'll need to set GOOGLE_APPLICATION_CREDENTIALS
+        if os.getenv('GOOGLE_APPLICATION_CREDENTIALS'):
+            cred = credentials.Certificate(os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))
+        else:
+            # For Cloud Run, this will use default credentials
+            cred = credentials.ApplicationDefault()
+        
+        firebase_admin.initialize_app(cred)
+    return firebase_admin.get_app()
+
+
+@lru_cache(maxsize=None)
+def _tuned_client_class():
+    """Build the TunedFirestoreClient class on first use"""
+    from google.cloud import firestore as gcloud_firestore
+
+    class TunedFirestoreClient(gcloud_firestore.Client):
+        """Firestore client whose gRPC channel is built with configurable options"""
+
+        def __init__(self, channel_options: Optional[Dict[str, Any]] = None, **kwargs):
+            super().__init__(**kwargs)
+            self._channel_options = channel_options or {}
+
+        def _firestore_api_helper(self, transport, client_class, client_module) -> Any:
+            # The stock helper hard-codes the channel options, so build the channel
+            # ourselves and let the base class handle the emulator case
+            if self._firestore_api_internal is None and self._emulator_host is None:
+                channel = transport.create_channel(
+                    self._target,
+                    credentials=self._credentials,
+                    options=list(self._channel_options.items()),
+                )
+                self._transport = transport(host=self._target, channel=channel)
+                self._firestore_api_internal = client_class(
+                    transport=self._transport, client_options=self._client_options
+                )
+                client_module._client_info = self._client_info
+
+            return super()._firestore_api_helper(transport, client_class, client_module)
+
+    return TunedFirestoreClient
+
+
+def _etag(user_id: str, versions: List[Any]) -> str:
+    """Strong ETag from (document id, update_time) pairs"""
+    digest = hashlib.sha256(user_id.encode('utf-8'))
+    for doc_id, update_time in versions:
+        stamp = update_time.rfc3339() if hasattr(update_time, 'rfc3339') else str(update_time)
+        digest.update(f'\0{doc_id}@{stamp}'.encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def _history_ref(habit_ref, year: str):
+    return habit_ref.collection(SHARDS_COLLECTION).document(year)
+
+
+def _split_writes(writer, habit_ref, head, shards, doc, writes, years=None, full=False) -> Dict[str, Any]:
+    """Queue the shard writes for a changed document and return the head's
+    
+    writes are the changed document fields; the history and why entries
+    among them go to the shards of their years, and the head gets the
+    per-year totals instead (all of them if full, else only the changed
+    years, for a merge write). A legacy head is split in full and loses
+    the fields that moved. years are the shards doc was assembled from.
+    """
+    head_writes = {field: value for field, value in writes.items() if field not in SHARDED_FIELDS}
+    legacy = is_legacy(head)
+    changes = changed_shards({} if legacy else shards, doc, None if legacy or not is_sharded(head) else years)
+    
+    for year, shard in changes.items():
+        ref = _history_ref(habit_ref, year)
+        if shard is None:
+            writer.delete(ref)
+        else:
+            writer.set(ref, shard)
+    
+    if full:
+        head_writes[SHARDS_FIELD] = {year: shard_counts(shard) for year, shard in split_document(doc).items()}
+    elif changes or head is None:
+        head_writes[SHARDS_FIELD] = {
+            year: shard_counts(shard) if shard is not None else _firestore().DELETE_FIELD
+            for year, shard in changes.items()
+        }
+    if legacy:
+        for field in SHARDED_FIELDS + LEGACY_HISTORY_FIELDS:
+            head_writes[field] = _firestore().DELETE_FIELD
+    return head_writes
+
+
+def _write_summary(writer, habit_ref, writes) -> None:
+    """Queue the user summary's share of a habit head's writes"""
+    summary = habit_summary_writes(habit_ref.id, writes)
+    if summary:
+        writer.set(summary_ref_of(habit_ref), summary, merge=True)
+
+
+class _QueuedWrites:
+    """Transaction writes recorded for whichever client commits them"""
+    
     def __init__(self):
-        """Initialize Firebase Admin SDK"""
-        if not firebase_admin._apps:
-            # In production, this will use service account from environment
-            # For local development, you'll need to set GOOGLE_APPLICATION_CREDENTIALS
-            if os.getenv('GOOGLE_APPLICATION_CREDENTIALS'):
-                cred = credentials.Certificate(os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))
+        self.writes = []
+    
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref, data, merge))
+    
+    def delete(self, ref):
+        self.writes.append((ref, None, False))
+
+
+def delta_sync_steps(habit_ref, user_id: str, base_version: Optional[int], ops: List[Dict[str, Any]],
+                     client_id: Optional[str] = None, habit_data: Optional[Dict[str, Any]] = None,
+                     patch: bool = False):
+    """The delta-sync transaction, written once for the blocking and the asyncio client
+    
+    A generator that yields the reads it needs, ('get', ref), ('query',
+    query) and ('get_all', refs), and is sent back the snapshot or list of
+    snapshots. It returns the response and the (ref, data, merge) writes to
+    make, data None meaning a delete. See FirebaseService.sync_habit_ops.
+    A patch only applies the ops to an existing habit: the response is the
+    new version alone, or None if there is no such habit.
+    """
+    ops_ref = habit_ref.collection(OPS_COLLECTION)
+    queued = _QueuedWrites()
+    
+    snapshot = yield ('get', habit_ref)
+    head = snapshot.to_dict() if snapshot.exists else None
+    head_version = head.get(VERSION_FIELD, 0) if head else 0
+    
+    # All reads come before any write in a transaction
+    missing = None
+    if patch:
+        if head is None:
+            return None, []
+        missing = []
+    elif head is not None and can_send_delta(base_version, head_version):
+        missing = []
+        if head_version > base_version:
+            records = yield ('query', ops_ref.where(VERSION_FIELD, '>', base_version).order_by(VERSION_FIELD))
+            missing = [record.to_dict() for record in records]
+            if not is_complete(missing, base_version, head_version):
+                missing = None
+    
+    # A full response needs every year; otherwise only the years
+    # the ops touch are read and rewritten
+    stored_head = head
+    years = None if missing is None else years_of_ops(ops)
+    shards = {}
+    if is_sharded(head):
+        refs = [_history_ref(habit_ref, year) for year in shard_ids(head) if years is None or year in years]
+        if refs:
+            for shard in (yield ('get_all', refs)):
+                if shard.exists:
+                    shards[shard.reference.id] = shard.to_dict()
+        head = assemble_document(head, shards)
+    
+    version = head_version
+    writes = {}
+    if head is None:
+        # Seed the document; the seed itself is not an op, so it
+        # takes a version of its own that no client can delta past
+        head = encode_habit_document(habit_data or {})
+        head.pop(VERSION_FIELD, None)
+        head.pop(AGGREGATES_FIELD, None)
+        head.pop(CONTENT_HASH_FIELD, None)
+        writes = dict(head)
+        version += 1
+    elif habit_data is not None and missing is None:
+        # A client without a version merges its local data in
+        merged = merge_habit_documents(head, habit_data)
+        writes = changed_fields(head, merged)
+        head = merged
+        if writes:
+            version += 1
+            head.pop(CONTENT_HASH_FIELD, None)
+        if HISTORY_FIELD in writes:
+            head.pop(AGGREGATES_FIELD, None)
+    
+    doc, updates = apply_ops(head, ops)
+    if (HISTORY_FIELD in writes or HISTORY_FIELD in updates) and AGGREGATES_FIELD not in doc:
+        # The aggregates could not follow the ops, so rebuild them from
+        # the whole history, reading the years not loaded yet
+        if years is not None and is_sharded(stored_head):
+            refs = [_history_ref(habit_ref, year) for year in shard_ids(stored_head) if year not in years]
+            if refs:
+                for shard in (yield ('get_all', refs)):
+                    if shard.exists:
+                        shards[shard.reference.id] = shard.to_dict()
+            years = None
+            doc, updates = apply_ops(assemble_document(stored_head, shards), ops)
+        updates[AGGREGATES_FIELD] = doc[AGGREGATES_FIELD] = build_aggregates(history_from_document(doc))
+    if (writes or updates) and CONTENT_HASH_FIELD not in doc and years is None:
+        # A content hash that could not follow the changes is only rebuilt
+        # when the whole document is loaded anyway
+        updates[CONTENT_HASH_FIELD] = doc[CONTENT_HASH_FIELD] = content_hash(doc)
+    writes.update(updates)
+    for op in ops:
+        version += 1
+        queued.set(ops_ref.document(op_document_id(version)), {
+            VERSION_FIELD: version,
+            'op': op,
+            'client_id': client_id
+        })
+        if version > OPS_RETENTION:
+            queued.delete(ops_ref.document(op_document_id(version - OPS_RETENTION)))
+    
+    if version != head_version:
+        writes[VERSION_FIELD] = version
+        writes['last_updated'] = _firestore().SERVER_TIMESTAMP
+        writes['updated_by'] = user_id
+        writes = _split_writes(queued, habit_ref, stored_head, shards, doc, writes, years)
+        queued.set(habit_ref, writes, merge=True)
+        _write_summary(queued, habit_ref, writes)
+    
+    if missing is None:
+        doc[VERSION_FIELD] = version
+        doc.pop('last_updated', None)
+        return {
+            'status': 'success',
+            'action': 'full',
+            'version': version,
+            'data': decode_habit_document(doc)
+        }, queued.writes
+    if patch:
+        return {'status': 'success', 'version': version}, queued.writes
+    return {
+        'status': 'success',
+        'action': 'delta',
+        'version': version,
+        'ops': [record['op'] for record in missing]
+    }, queued.writes
+
+
+class FirebaseService:
+    write_buffer = None
+    
+    def __init__(self, channel_options: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                 document_cache=None, flights=None, write_buffer=None):
+        """Initialize Firebase Admin SDK
+        
+        channel_options are gRPC channel arguments for a dedicated Firestore
+        client; without them the Admin SDK's shared client is used. timeout is
+        the per-call deadline in seconds applied to every Firestore RPC.
+        document_cache is an optional DocumentCache for profile and habit reads,
+        and flights an optional SingleFlight that coalesces identical
+        concurrent document reads. write_buffer is an optional WriteBuffer
+        that coalesces bursts of full saves; syncs and patches of a document
+        first write its pending save.
+        """
+        firebase_app = _default_app()
+        
+        self.timeout = timeout
+        self.document_cache = document_cache
+        self.flights = flights
+        self.write_buffer = write_buffer
+        if channel_options:
+            self.db = _tuned_client_class()(
+                channel_options=channel_options,
+                credentials=firebase_app.credential.get_credential(),
+                project=firebase_app.project_id
+            )
+        else:
+            self.db = _firestore().client()
+    
+    def profile_ref(self, user_id: str):
+        return self.db.collection('profiles').document(user_id)
+    
+    def habit_ref(self, user_id: str, habit_id: str = 'main'):
+        return self.db.collection('users').document(user_id).collection('habits').document(habit_id)
+    
+    def summary_ref(self, user_id: str):
+        return self.db.collection(SUMMARY_COLLECTION).document(user_id)
+    
+    def _settle(self, ref) -> None:
+        """Make a buffered save of ref before it is written another way"""
+        if self.write_buffer is not None:
+            self.write_buffer.flush(ref.path)
+    
+    def _read_document(self, ref, loader=None) -> Tuple[Optional[Dict[str, Any]], Any]:
+        """Read a document through the request loader or the document cache
+        
+        Returns the data (None if the document does not exist) and its
+        update_time. A stale cache entry is revalidated with a field-less read
+        before falling back to a full one.
+        """
+        if loader is not None:
+            return loader.load(ref)
+        
+        cache = self.document_cache
+        if cache is not None:
+            cached = cache.get(ref.path)
+            if cached is not None and cached.fresh:
+                cache.record('hit')
+                return cached.data, cached.update_time
+            if cached is not None:
+                update_time = self._fetch_update_time(ref)
+                if update_time is not None and cache.revalidate(ref.path, update_time):
+                    cache.record('revalidation')
+                    return cached.data, cached.update_time
+        
+        def fetch():
+            snapshot = ref.get(timeout=self.timeout)
+            data = snapshot.to_dict() if snapshot.exists else None
+            if cache is not None:
+                cache.record('miss')
+                if data is not None:
+                    cache.put(ref.path, data, snapshot.update_time)
+                else:
+                    cache.invalidate(ref.path)
+            return data, snapshot.update_time
+        
+        (data, update_time), _ = self._single_flight(('get', ref.path), fetch)
+        # The read may be shared, so every caller, the one that made it
+        # included, gets its own copy to mutate; the shared one stays intact
+        # while followers copy it
+        return (copy.deepcopy(data) if self.flights is not None else data), update_time
+    
+    def _fetch_update_time(self, ref) -> Any:
+        """Read a document's update_time (None if missing) without its fields"""
+        def fetch():
+            validator = ref.get(field_paths=[], timeout=self.timeout)
+            return validator.update_time if validator.exists else None
+        
+        update_time, _ = self._single_flight(('update_time', ref.path), fetch)
+        return update_time
+    
+    def _single_flight(self, key, fn):
+        """Run fn, sharing one execution among concurrent callers of key"""
+        if self.flights is None:
+            return fn(), False
+        return self.flights.do(key, fn)
+    
+    def read_documents(self, refs: List[Any]) -> Dict[str, Tuple[Optional[Dict[str, Any]], Any]]:
+        """Read several documents with one get_all() call, keyed by path
+        
+        Fresh cache entries are served from memory; everything else goes into
+        the batch.
+        """
+        results = {}
+        pending = []
+        cache = self.document_cache
+        for ref in refs:
+            cached = cache.get(ref.path) if cache is not None else None
+            if cached is not None and cached.fresh:
+                cache.record('hit')
+                results[ref.path] = (cached.data, cached.update_time)
             else:
-                # For Cloud Run, this will use default credentials
-                cred = credentials.ApplicationDefault()
-            
-            firebase_admin.initialize_app(cred)
+                pending.append(ref)
         
-        self.db = firestore.client()
+        if len(pending) == 1:
+            # A lone read can still take the cheap revalidation path
+            results[pending[0].path] = self._read_document(pending[0])
+        elif pending:
+            for snapshot in self.db.get_all(pending, timeout=self.timeout):
+                path = snapshot.reference.path
+                data = snapshot.to_dict() if snapshot.exists else None
+                if cache is not None:
+                    cache.record('miss')
+                    if data is not None:
+                        cache.put(path, data, snapshot.update_time)
+                results[path] = (data, snapshot.update_time)
+        return results
+    
+    def _read_update_time(self, ref) -> Any:
+        """Return a document's update_time (None if missing) without its fields"""
+        cache = self.document_cache
+        cached = cache.get(ref.path) if cache is not None else None
+        if cached is not None and cached.fresh:
+            cache.record('hit')
+            return cached.update_time
+        
+        update_time = self._fetch_update_time(ref)
+        if cached is not None:
+            if cache.revalidate(ref.path, update_time):
+                cache.record('revalidation')
+            else:
+                cache.record('miss')
+        return update_time
+    
+    def _read_habit(self, habit_ref, loader=None, years=None) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], Any]:
+        """Read a habit head and its history shards
+        
+        Returns the head, the stored shards by year and the head's
+        update_time; years limits which shards are read. Shards are only
+        ever written in the same commit as their head, so a cached shard
+        tagged with the head's current update_time is still current.
+        """
+        head, update_time = self._read_document(habit_ref, loader)
+        if not is_sharded(head):
+            return head, {}, update_time
+        
+        cache = self.document_cache
+        shards = {}
+        pending = []
+        for year in shard_ids(head):
+            if years is not None and year not in years:
+                continue
+            ref = _history_ref(habit_ref, year)
+            cached = cache.get(ref.path) if cache is not None else None
+            if cached is not None and cached.update_time == update_time:
+                cache.record('hit')
+                shards[year] = cached.data
+            else:
+                pending.append(ref)
+        
+        if pending:
+            for snapshot in self.db.get_all(pending, timeout=self.timeout):
+                if not snapshot.exists:
+                    continue
+                data = snapshot.to_dict()
+                shards[snapshot.reference.id] = data
+                if cache is not None:
+                    cache.record('miss')
+                    cache.put(snapshot.reference.path, data, update_time)
+        return head, shards, update_time
+    
+    def _invalidate(self, ref) -> None:
+        """Drop a document this instance is about to change from the cache"""
+        if self.document_cache is not None:
+            self.document_cache.invalidate(ref.path)
     
     def verify_token(self, id_token: str) -> Optional[Dict[str, Any]]:
         """Verify Firebase ID token and return user info"""
+        from firebase_admin import auth
+        
         try:
             decoded_token = auth.verify_id_token(id_token)
             return decoded_token
@@ -31,30 +481,308 @@ class FirebaseService:
             print(f"Token verification failed: {e}")
             return None
     
-    def get_user_habits(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all habits for a user"""
-        try:
-            habits_ref = self.db.collection('users').document(user_id).collection('habits')
-            habits = habits_ref.stream()
+    def _habits_query(self, user_id: str, limit: Optional[int] = None, start_after: Optional[str] = None):
+        """Query the user's habits in document id order, one page at a time"""
+        query = self.db.collection('users').document(user_id).collection('habits').order_by('__name__')
+        if start_after:
+            query = query.start_after({'__name__': start_after})
+        if limit:
+            query = query.limit(limit)
+        return query
+    
+    def get_user_habits(self, user_id: str, limit: Optional[int] = None,
+                        start_after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield habit summaries in id order as the query streams
+        
+        Only HABIT_SUMMARY_FIELDS are read; use get_user_habit for a habit's
+        history. start_after is the id of the last habit of the previous page.
+        Errors are raised, since a partial listing would look complete.
+        """
+        query = self._habits_query(user_id, limit, start_after).select(list(HABIT_SUMMARY_FIELDS))
+        for habit in query.stream(timeout=self.timeout):
+            habit_data = habit.to_dict()
+            habit_data['id'] = habit.id
             
-            result = []
-            for habit in habits:
-                habit_data = habit.to_dict()
-                habit_data['id'] = habit.id
-                
-                # Convert timestamps to serializable format
-                if 'last_updated' in habit_data and hasattr(habit_data['last_updated'], 'isoformat'):
-                    habit_data['last_updated'] = habit_data['last_updated'].isoformat()
-                
-                result.append(habit_data)
+            # Convert timestamps to serializable format
+            if 'last_updated' in habit_data and hasattr(habit_data['last_updated'], 'isoformat'):
+                habit_data['last_updated'] = habit_data['last_updated'].isoformat()
             
-            return result
+            yield habit_data
+    
+    def get_habits_etag(self, user_id: str, limit: Optional[int] = None,
+                        start_after: Optional[str] = None) -> Optional[str]:
+        """Validator for a page of get_user_habits, read without any document fields"""
+        try:
+            query = self._habits_query(user_id, limit, start_after).select(['__name__'])
+            habits = query.stream(timeout=self.timeout)
+            return _etag(user_id, [(habit.id, habit.update_time) for habit in habits])
+        except Exception as e:
+            print(f"Error getting habits validator: {e}")
+            return None
+    
+    def get_user_habit(self, user_id: str, habit_id: str) -> Optional[Dict[str, Any]]:
+        """Get one habit with its full history (client shape), or None
+        
+        A buffered save of the habit is applied to what is read rather than
+        written first.
+        """
+        try:
+            habit_ref = self.habit_ref(user_id, habit_id)
+            pending = self.write_buffer.peek(habit_ref.path) if self.write_buffer is not None else None
+            head, shards, _ = self._read_habit(habit_ref)
+            habit = assemble_document(head, shards)
+            if habit is None and pending is None:
+                return None
+            habit = decode_habit_document(habit or {})
+            if pending is not None:
+                pending.pop(VERSION_FIELD, None)
+                pending.pop(AGGREGATES_FIELD, None)
+                habit = merge_habit_saves(habit, pending)
+                habit[AGGREGATES_FIELD] = build_aggregates(history_from_document(habit))
+                habit[CONTENT_HASH_FIELD] = content_hash(habit)
+            habit['id'] = habit_id
+            if 'last_updated' in habit and hasattr(habit['last_updated'], 'isoformat'):
+                habit['last_updated'] = habit['last_updated'].isoformat()
+            return habit
+        except Exception as e:
+            print(f"Error getting habit: {e}")
+            return None
+    
+    def get_habit_etag(self, user_id: str, habit_id: str) -> Optional[str]:
+        """Validator for get_user_habit, or None if the habit does not exist
+        
+        There is none either while a save of the habit is buffered.
+        """
+        try:
+            habit_ref = self.habit_ref(user_id, habit_id)
+            if self.write_buffer is not None and self.write_buffer.peek(habit_ref.path) is not None:
+                return None
+            update_time = self._read_update_time(habit_ref)
+            if update_time is None:
+                return None
+            return _etag(user_id, [(habit_id, update_time)])
+        except Exception as e:
+            print(f"Error getting habit validator: {e}")
+            return None
+    
+    def get_habit_document(self, user_id: str, habit_id: str = 'main', loader=None,
+                          years=None) -> Optional[Dict[str, Any]]:
+        """Get a stored habit document (history still encoded), or None
+        
+        The history shards are assembled into the single-document shape;
+        years limits which of them are read.
+        """
+        try:
+            head, shards, _ = self._read_habit(self.habit_ref(user_id, habit_id), loader, years)
+            return assemble_document(head, shards)
+        except Exception as e:
+            print(f"Error getting habit document: {e}")
+            return None
+    
+    def get_bootstrap(self, user_id: str) -> Dict[str, Any]:
+        """Profile and main habit (client shape) for rendering a signed-in page
+        
+        Both documents are read in one batch, then the habit's recent history
+        shards in another. The habit carries the last RECENT_HISTORY_DAYS days
+        of history, and window gives its bounds; older days come from
+        get_habit_history. Nothing is created for a new user; profile and
+        habit are None until the first API call or sync.
+        """
+        profile_ref, habit_ref = self.profile_ref(user_id), self.habit_ref(user_id)
+        end = date.today()
+        start = end - timedelta(days=RECENT_HISTORY_DAYS - 1)
+        loader = DocumentLoader(self)
+        loader.prime(habit_ref)
+        profile, _ = loader.load(profile_ref)
+        head, shards, _ = self._read_habit(habit_ref, loader, shards_between(start, end))
+        habit = assemble_document(head, shards)
+        if habit is not None:
+            window = history_window(habit, start, end)
+            habit = decode_habit_document(habit)
+            habit.pop('last_updated', None)
+            habit.update(completedDates=window['completedDates'], notDoneDates=window['notDoneDates'],
+                         whyEntries=window['whyEntries'])
+        return {
+            'uid': user_id,
+            'profile': profile,
+            'habit': habit,
+            'version': (habit or {}).get(VERSION_FIELD, 0),
+            'window': {'from': start.isoformat(), 'to': end.isoformat()}
+        }
+    
+    def get_dashboard(self, user_id: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+        """Tier and each habit's state and stats, from the user's summary document
+        
+        One document read however many habits there are. A summary that is
+        missing, was started before every habit wrote to it, or holds
+        aggregates older than the current block, is first rebuilt from the
+        profile and the habit heads.
+        """
+        try:
+            summary, _ = self._read_document(self.summary_ref(user_id))
+            if not is_current(summary):
+                summary = self._backfill_summary(user_id)
+            return dashboard_from_summary(user_id, summary, today)
+        except Exception as e:
+            print(f"Error getting dashboard: {e}")
+            return None
+    
+    def get_dashboard_etag(self, user_id: str) -> Optional[str]:
+        """Validator for get_dashboard, or None if there is no summary yet"""
+        try:
+            update_time = self._read_update_time(self.summary_ref(user_id))
+            if update_time is None:
+                return None
+            # Today's state changes at midnight without a write
+            return _etag(user_id, [(user_id, update_time), ('today', date.today().isoformat())])
+        except Exception as e:
+            print(f"Error getting dashboard validator: {e}")
+            return None
+    
+    def _backfill_summary(self, user_id: str) -> Dict[str, Any]:
+        """Build the summary from the profile and every habit head, and store it
+        
+        Heads written before aggregates existed get theirs built from the
+        history, and written back, in the same transaction.
+        """
+        summary_ref = self.summary_ref(user_id)
+        profile_ref = self.profile_ref(user_id)
+        habits_query = self._habits_query(user_id).select(list(SUMMARY_HABIT_FIELDS))
+        timeout = self.timeout
+        
+        # Habit writes made meanwhile wait on the transaction's reads, so
+        # none is overwritten with the value read here
+        @_firestore().transactional
+        def run(transaction):
+            snapshot = summary_ref.get(transaction=transaction, timeout=timeout)
+            if snapshot.exists and is_current(snapshot.to_dict()):
+                return snapshot.to_dict(), {}
+            profile = profile_ref.get(transaction=transaction, timeout=timeout)
+            habits = {habit.id: habit.to_dict() for habit in habits_query.get(transaction=transaction, timeout=timeout)}
+            rebuilt = self._build_missing_aggregates(transaction, user_id, habits)
+            summary = build_summary(profile.to_dict() if profile.exists else None, habits)
+            for habit_id, aggregates in rebuilt.items():
+                transaction.set(self.habit_ref(user_id, habit_id), {AGGREGATES_FIELD: aggregates}, merge=True)
+            transaction.set(summary_ref, summary, merge=True)
+            return summary, rebuilt
+        
+        summary, rebuilt = run(self.db.transaction())
+        self._invalidate(summary_ref)
+        for habit_id in rebuilt:
+            self._invalidate(self.habit_ref(user_id, habit_id))
+        return summary
+    
+    def _build_missing_aggregates(self, transaction, user_id: str, habits: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the aggregates of the habits without a current block, from their whole history
+        
+        Adds them to habits and returns them by habit id; reads in transaction.
+        """
+        refs = [self.habit_ref(user_id, habit_id) for habit_id, habit in habits.items()
+                if needs_rebuild(habit.get(AGGREGATES_FIELD))]
+        if not refs:
+            return {}
+        heads = {}
+        for snapshot in transaction.get_all(refs, timeout=self.timeout):
+            if snapshot.exists:
+                heads[snapshot.reference.path] = (snapshot.reference, snapshot.to_dict())
+        
+        owners = {}
+        for path, (habit_ref, head) in heads.items():
+            for year in shard_ids(head):
+                owners[_history_ref(habit_ref, year).path] = path
+        shards = {path: {} for path in heads}
+        if owners:
+            refs = [_history_ref(habit_ref, year) for habit_ref, head in heads.values() for year in shard_ids(head)]
+            for snapshot in transaction.get_all(refs, timeout=self.timeout):
+                if snapshot.exists:
+                    shards[owners[snapshot.reference.path]][snapshot.reference.id] = snapshot.to_dict()
+        
+        rebuilt = {}
+        for path, (habit_ref, head) in heads.items():
+            history = history_from_document(assemble_document(head, shards[path]))
+            rebuilt[habit_ref.id] = habits[habit_ref.id][AGGREGATES_FIELD] = build_aggregates(history)
+        return rebuilt
+    
+    def get_habit_history(self, user_id: str, habit_id: str, start: date, end: date) -> Optional[Dict[str, Any]]:
+        """History of one date window (inclusive), or None if there is no such habit
+        
+        Only the shards of the window's years are read.
+        """
+        habit = self.get_habit_document(user_id, habit_id, years=shards_between(start, end))
+        if habit is None:
+            return None
+        return history_window(habit, start, end)
+    
+    def get_habit_analytics(self, user_id: str, habit_id: str = 'main', loader=None) -> Optional[Dict[str, Any]]:
+        """Get streak, rolling-window and period analytics for a habit
+        
+        These read the whole history, so a sample of them check the stored
+        aggregates against it on the way; verify_habit_aggregates checks one
+        habit outright.
+        """
+        habit_ref = self.habit_ref(user_id, habit_id)
+        try:
+            head, shards, update_time = self._read_habit(habit_ref, loader)
         except Exception as e:
-            print(f"Error getting user habits: {e}")
-            return []
+            print(f"Error getting habit document: {e}")
+            return None
+        habit = assemble_document(head, shards)
+        if habit is None:
+            return None
+        history = history_from_document(habit)
+        if needs_rebuild(habit.get(AGGREGATES_FIELD)) or random.random() < AGGREGATES_CHECK_RATE:
+            self._verify_aggregates(habit_ref, habit, history, update_time)
+        return compute_analytics(history,
+                                 habit.get('startedDate'),
+                                 habit.get('frequency', 'Daily'))
+    
+    def verify_habit_aggregates(self, user_id: str, habit_id: str = 'main') -> Optional[List[str]]:
+        """Recompute a habit's aggregates from its history, repairing any drift
+        
+        Returns the fields that had drifted, or None if there is no such habit.
+        """
+        habit_ref = self.habit_ref(user_id, habit_id)
+        try:
+            head, shards, update_time = self._read_habit(habit_ref)
+        except Exception as e:
+            print(f"Error verifying habit aggregates: {e}")
+            return None
+        habit = assemble_document(head, shards)
+        if habit is None:
+            return None
+        return self._verify_aggregates(habit_ref, habit, history_from_document(habit), update_time)
+    
+    def _verify_aggregates(self, habit_ref, habit, history, update_time) -> List[str]:
+        drift = aggregates_drift(habit.get(AGGREGATES_FIELD), history)
+        if drift:
+            print(f"Aggregates of {habit_ref.path} drifted in: {', '.join(drift)}")
+            try:
+                # Only if the habit is unchanged since it was read; the
+                # dashboard summary is repaired with it
+                writes = {AGGREGATES_FIELD: build_aggregates(history)}
+                batch = self.db.batch()
+                batch.update(habit_ref, writes, option=self.db.write_option(last_update_time=update_time))
+                _write_summary(batch, habit_ref, writes)
+                batch.commit(timeout=self.timeout)
+                self._invalidate(habit_ref)
+                self._invalidate(summary_ref_of(habit_ref))
+            except Exception as e:
+                print(f"Error repairing habit aggregates: {e}")
+        return drift
     
     def save_habit_data(self, user_id: str, habit_data: Dict[str, Any]) -> bool:
-        """Save or update habit data for a user"""
+        """Save or update habit data for a user
+        
+        With a write buffer the save is queued, and the user's saves in the
+        next few seconds go out as one write.
+        """
+        if self.write_buffer is not None:
+            self.write_buffer.add(self.habit_ref(user_id).path, dict(habit_data),
+                                  lambda payload: self._save_habit_data(user_id, payload))
+            return True
+        return self._save_habit_data(user_id, habit_data)
+    
+    def _save_habit_data(self, user_id: str, habit_data: Dict[str, Any]) -> bool:
         try:
             # Create a main habit document
             habit_ref = self.db.collection('users').document(user_id).collection('habits').document('main')
@@ -63,42 +791,99 @@ class FirebaseService:
             data_to_save = habit_data.copy()
             
             # Add timestamp for sync tracking
-            data_to_save['last_updated'] = firestore.SERVER_TIMESTAMP
+            data_to_save['last_updated'] = _firestore().SERVER_TIMESTAMP
             data_to_save['updated_by'] = user_id
             
+            # A full save is not in the ops log, so bumping the version makes
+            # delta clients fall back to a full transfer
+            data_to_save.pop(VERSION_FIELD, None)
+            data_to_save[VERSION_FIELD] = _firestore().Increment(1)
+            # Aggregates and the content hash are the server's to compute
+            data_to_save.pop(AGGREGATES_FIELD, None)
+            data_to_save.pop(CONTENT_HASH_FIELD, None)
+            
             # Ensure dates are properly formatted
             if 'completedDates' in data_to_save:
                 data_to_save['completedDates'] = [str(d) for d in data_to_save['completedDates']]
             if 'notDoneDates' in data_to_save:
                 data_to_save['notDoneDates'] = [str(d) for d in data_to_save['notDoneDates']]
             
-            habit_ref.set(data_to_save, merge=True)
+            # History and why entries live in per-year shards, so work out the
+            # resulting document and write only the years that changed
+            if any(field in data_to_save for field in SHARDED_FIELDS + LEGACY_HISTORY_FIELDS):
+                head, shards, _ = self._read_habit(habit_ref)
+                current = encode_habit_document(assemble_document(head, shards) or {})
+                
+                # Both lists share one history bitmap, so a partial update
+                # keeps the list it did not send
+                if ('completedDates' in data_to_save) != ('notDoneDates' in data_to_save):
+                    stored = decode_habit_document(current)
+                    data_to_save.setdefault('completedDates', stored.get('completedDates', []))
+                    data_to_save.setdefault('notDoneDates', stored.get('notDoneDates', []))
+                # Why entries merge per day, as they did in a single document
+                if 'whyEntries' in data_to_save:
+                    data_to_save['whyEntries'] = dict(current.get('whyEntries') or {}, **(data_to_save['whyEntries'] or {}))
+                
+                data_to_save = encode_habit_document(data_to_save)
+                doc = dict(current, **{field: data_to_save[field] for field in SHARDED_FIELDS if field in data_to_save})
+                # A whole-document save may change any day, so rebuild
+                data_to_save[AGGREGATES_FIELD] = build_aggregates(history_from_document(doc))
+                data_to_save[CONTENT_HASH_FIELD] = content_hash(dict(doc, **data_to_save))
+                batch = self.db.batch()
+                data_to_save = _split_writes(batch, habit_ref, head, shards, doc, data_to_save)
+            else:
+                # Only settings changed; the next full write hashes it again
+                data_to_save[CONTENT_HASH_FIELD] = _firestore().DELETE_FIELD
+                batch = self.db.batch()
+            batch.set(habit_ref, data_to_save, merge=True)
+            _write_summary(batch, habit_ref, data_to_save)
+            batch.commit(timeout=self.timeout)
+            
+            self._invalidate(habit_ref)
+            self._invalidate(summary_ref_of(habit_ref))
             return True
         except Exception as e:
             print(f"Error saving habit data: {e}")
             return False
     
-    def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+    def get_user_profile(self, user_id: str, loader=None) -> Optional[Dict[str, Any]]:
         """Get user profile information"""
         try:
-            profile_ref = self.db.collection('profiles').document(user_id)
-            profile = profile_ref.get()
+            profile_ref = self.profile_ref(user_id)
+            profile, _ = self._read_document(profile_ref, loader)
             
-            if profile.exists:
-                return profile.to_dict()
+            if profile is not None:
+                return profile
             else:
                 # Create default profile
                 default_profile = {
-                    'created_at': firestore.SERVER_TIMESTAMP,
+                    'created_at': _firestore().SERVER_TIMESTAMP,
                     'subscription_tier': 'free',
                     'subscription_status': 'active'
                 }
-                profile_ref.set(default_profile)
+                batch = self.db.batch()
+                batch.set(profile_ref, default_profile)
+                batch.set(self.summary_ref(user_id), tier_writes(default_profile['subscription_tier']), merge=True)
+                batch.commit(timeout=self.timeout)
+                self._invalidate(self.summary_ref(user_id))
+                if loader is not None:
+                    loader.forget(profile_ref)
                 return default_profile
         except Exception as e:
             print(f"Error getting user profile: {e}")
             return None
     
+    def get_profile_etag(self, user_id: str) -> Optional[str]:
+        """Validator for get_user_profile, or None if there is no profile yet"""
+        try:
+            update_time = self._read_update_time(self.db.collection('profiles').document(user_id))
+            if update_time is None:
+                return None
+            return _etag(user_id, [(user_id, update_time)])
+        except Exception as e:
+            print(f"Error getting profile validator: {e}")
+            return None
+    
     def update_subscription(self, user_id: str, subscription_data: Dict[str, Any]) -> bool:
         """Update user subscription information"""
         try:
@@ -107,60 +892,103 @@ class FirebaseService:
                 'subscription_tier': subscription_data.get('tier', 'free'),
                 'subscription_status': subscription_data.get('status', 'active'),
                 'stripe_customer_id': subscription_data.get('stripe_customer_id'),
-                'subscription_updated_at': firestore.SERVER_TIMESTAMP
+                'subscription_updated_at': _firestore().SERVER_TIMESTAMP
             }
             
-            profile_ref.update(subscription_update)
+            # The dashboard summary carries the tier too
+            batch = self.db.batch()
+            batch.update(profile_ref, subscription_update)
+            batch.set(self.summary_ref(user_id), tier_writes(subscription_update['subscription_tier']), merge=True)
+            batch.commit(timeout=self.timeout)
+            self._invalidate(profile_ref)
+            self._invalidate(self.summary_ref(user_id))
             return True
         except Exception as e:
             print(f"Error updating subscription: {e}")
             return False
     
     def sync_habit_data(self, user_id: str, local_data: Dict[str, Any], last_sync: Optional[str] = None) -> Dict[str, Any]:
-        """Sync local habit data with Firestore, handling conflicts"""
+        """Merge local habit data into Firestore, handling conflicts
+        
+        Dates are merged as a set union and why entries per day, so edits made
+        on two devices both survive. Each attempt is one read and one batch
+        of the head and changed history shards, conditioned on the head's
+        update_time; a concurrent write fails the precondition and the merge
+        is redone. last_sync is still accepted
+        from older clients but no longer needed.
+        
+        A payload whose content hash matches the stored one changes nothing:
+        it is answered 'unchanged', without its data, from the head alone
+        (usually the cached head) and nothing is written.
+        """
+        from google.api_core import exceptions
+        
         try:
             habit_ref = self.db.collection('users').document(user_id).collection('habits').document('main')
-            server_data = habit_ref.get()
+            # A buffered save must not land on top of this merge later
+            self._settle(habit_ref)
             
-            if not server_data.exists:
-                # No server data, save local data
-                self.save_habit_data(user_id, local_data)
+            # The first attempt merges into the head read for the hash check
+            loader = DocumentLoader(self)
+            head, _ = self._read_document(habit_ref, loader)
+            if head is not None and head.get(CONTENT_HASH_FIELD) == content_hash(local_data):
                 return {
                     'status': 'success',
-                    'action': 'local_to_server',
-                    'data': local_data
+                    'action': 'unchanged',
+                    'version': head.get(VERSION_FIELD, 0)
                 }
             
-            server_habit = server_data.to_dict()
-            server_timestamp = server_habit.get('last_updated')
-            
-            # Convert SERVER_TIMESTAMP to serializable format
-            if server_timestamp and hasattr(server_timestamp, 'timestamp'):
-                server_habit['last_updated'] = server_timestamp.isoformat()
-            
-            # Simple conflict resolution: most recent wins
-            # In a production app, you might want more sophisticated merging
-            if last_sync and server_timestamp:
-                server_time = server_timestamp.timestamp() if hasattr(server_timestamp, 'timestamp') else 0
-                try:
-                    local_time = datetime.fromisoformat(last_sync.replace('Z', '+00:00')).timestamp()
-                except:
-                    local_time = 0
+            for _ in range(MERGE_ATTEMPTS):
+                # A cached copy is safe here: if it is out of date, the
+                # update_time precondition fails and we retry from the server
+                head, shards, update_time = self._read_habit(habit_ref, loader)
+                loader = None
+                server_doc = assemble_document(head, shards)
+                merged = merge_habit_documents(server_doc, local_data)
+                version = (server_doc or {}).get(VERSION_FIELD, 0)
+                
+                writes = changed_fields(server_doc, merged)
+                if HISTORY_FIELD in writes:
+                    # A merge may change any day, so rebuild
+                    writes[AGGREGATES_FIELD] = merged[AGGREGATES_FIELD] = \
+                        build_aggregates(history_from_document(merged))
+                if writes:
+                    version += 1
+                    writes[VERSION_FIELD] = version
+                    writes[CONTENT_HASH_FIELD] = merged[CONTENT_HASH_FIELD] = content_hash(merged)
+                    writes['last_updated'] = _firestore().SERVER_TIMESTAMP
+                    writes['updated_by'] = user_id
+                    batch = self.db.batch()
+                    # update() replaces the totals map, so send all of it
+                    writes = _split_writes(batch, habit_ref, head, shards, merged, writes, full=True)
+                    try:
+                        if head is not None:
+                            option = self.db.write_option(last_update_time=update_time)
+                            batch.update(habit_ref, writes, option=option)
+                        else:
+                            batch.create(habit_ref, writes)
+                        _write_summary(batch, habit_ref, writes)
+                        batch.commit(timeout=self.timeout)
+                    except (exceptions.FailedPrecondition, exceptions.AlreadyExists):
+                        # Someone wrote in between; merge against their version
+                        self._invalidate(habit_ref)
+                        continue
+                    self._invalidate(habit_ref)
+                    self._invalidate(summary_ref_of(habit_ref))
                 
-                if server_time > local_time:
-                    # Server data is newer, return cleaned server data
-                    return {
-                        'status': 'success',
-                        'action': 'server_to_local',
-                        'data': server_habit
-                    }
+                data = decode_habit_document(merged)
+                data.pop('last_updated', None)
+                data[VERSION_FIELD] = version
+                return {
+                    'status': 'success',
+                    'action': 'merged',
+                    'version': version,
+                    'data': data
+                }
             
-            # Save local data to server
-            self.save_habit_data(user_id, local_data)
             return {
-                'status': 'success',
-                'action': 'local_to_server',
-                'data': local_data
+                'status': 'error',
+                'message': 'Too many concurrent updates, please retry'
             }
             
         except Exception as e:
@@ -168,4 +996,87 @@ class FirebaseService:
             return {
                 'status': 'error',
                 'message': str(e)
-            }
\ No newline at end of file
+            }
+    
+    def sync_habit_ops(self, user_id: str, base_version: Optional[int], ops: List[Dict[str, Any]],
+                       client_id: Optional[str] = None, habit_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Apply a client's ops and return the ops it is missing (delta sync)
+        
+        ops must already be validated. Falls back to returning the full
+        document when the client has no version yet or its missing range is
+        no longer in the ops log. habit_data seeds a document that does not
+        exist yet. An idle autosync, with no ops from a client already at the
+        head version, is answered from the (usually cached) head without a
+        transaction.
+        """
+        try:
+            habit_ref = self.habit_ref(user_id)
+            if not ops and habit_data is None:
+                head, _ = self._read_document(habit_ref)
+                idle = idle_response(base_version, head)
+                if idle is not None:
+                    return idle
+            return self._run_steps(habit_ref, lambda: delta_sync_steps(habit_ref, user_id, base_version, ops,
+                                                                       client_id, habit_data))
+        except Exception as e:
+            print(f"Error syncing habit ops: {e}")
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+    
+    def patch_habit(self, user_id: str, habit_id: str, ops: List[Dict[str, Any]],
+                    client_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Apply a few validated ops to one habit and return its new version
+        
+        Unlike a sync nothing is sent back, so only the head and the history
+        shards of the ops' years are read and rewritten, however long the
+        history. The ops are logged like synced ones, so delta clients pick
+        them up. Returns None if the habit does not exist.
+        """
+        try:
+            habit_ref = self.habit_ref(user_id, habit_id)
+            return self._run_steps(habit_ref, lambda: delta_sync_steps(habit_ref, user_id, None, ops,
+                                                                       client_id, patch=True))
+        except Exception as e:
+            print(f"Error patching habit: {e}")
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+    
+    def _run_steps(self, habit_ref, start_steps) -> Any:
+        """Run a delta_sync_steps generator in a transaction; returns its response
+        
+        start_steps creates the generator, anew on every attempt.
+        """
+        self._settle(habit_ref)
+        timeout = self.timeout
+        
+        @_firestore().transactional
+        def run(transaction):
+            steps = start_steps()
+            try:
+                kind, target = next(steps)
+                while True:
+                    if kind == 'get':
+                        result = target.get(transaction=transaction, timeout=timeout)
+                    elif kind == 'query':
+                        result = list(target.get(transaction=transaction, timeout=timeout))
+                    else:
+                        result = list(transaction.get_all(target, timeout=timeout))
+                    kind, target = steps.send(result)
+            except StopIteration as done:
+                response, writes = done.value
+            
+            for ref, data, merge in writes:
+                if data is None:
+                    transaction.delete(ref)
+                else:
+                    transaction.set(ref, data, merge=merge)
+            return response
+        
+        result = run(self.db.transaction())
+        self._invalidate(habit_ref)
+        self._invalidate(summary_ref_of(habit_ref))
+        return result
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""Conversion between the client habit payload and the stored Firestore document
+
+Clients send and receive ``completedDates`` / ``notDoneDates`` as lists of ISO
+date strings. In Firestore those lists are stored as a single compact
+``history`` bitmap (see app.models.history). Documents written before the
+bitmap existed still carry the lists; they are decoded transparently and
+upgraded on their next write.
+"""
+import hashlib
+import json
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, Tuple
+from app.models.aggregates import AGGREGATES_FIELD
+from app.models.history import HistoryBitmap, DONE, NOT_DONE
+
+HISTORY_FIELD = 'history'
+LEGACY_HISTORY_FIELDS = ('completedDates', 'notDoneDates')
+# Fields returned when listing habits; histories are fetched per habit, and
+# the aggregates stand in for them on a dashboard
+HABIT_SUMMARY_FIELDS = ('startedDate', 'frequency', 'counter', 'version', 'last_updated', AGGREGATES_FIELD)
+CONTENT_HASH_FIELD = 'contentHash'
+# Settings covered by the content hash, with the history and why entries
+HASHED_FIELDS = ('startedDate', 'frequency', 'counter')
+
+
+def history_from_document(doc: Dict[str, Any]) -> HistoryBitmap:
+    """Return the history bitmap of a stored or client document"""
+    if doc.get(HISTORY_FIELD):
+        return HistoryBitmap.from_dict(doc[HISTORY_FIELD])
+    return HistoryBitmap.from_lists(doc.get('completedDates', []), doc.get('notDoneDates', []))
+
+
+def encode_habit_document(habit_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace client date lists with the compact history bitmap"""
+    encoded = dict(habit_data)
+    if any(field in encoded for field in LEGACY_HISTORY_FIELDS):
+        history = HistoryBitmap.from_lists(encoded.pop('completedDates', []),
+                                           encoded.pop('notDoneDates', []))
+        encoded[HISTORY_FIELD] = history.to_dict()
+    return encoded
+
+
+def decode_habit_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Expand a stored document into the client shape with date lists"""
+    decoded = dict(doc)
+    if HISTORY_FIELD in decoded:
+        history = HistoryBitmap.from_dict(decoded.pop(HISTORY_FIELD))
+        decoded['completedDates'] = history.dates(DONE)
+        decoded['notDoneDates'] = history.dates(NOT_DONE)
+    return decoded
+
+
+def history_window(doc: Dict[str, Any], start: date, end: date) -> Dict[str, Any]:
+    """The client-shape history of one date window (inclusive) of a document"""
+    history = history_from_document(doc)
+    first, last = start.isoformat(), end.isoformat()
+    return {
+        'from': first,
+        'to': last,
+        'completedDates': history.dates(DONE, start, end),
+        'notDoneDates': history.dates(NOT_DONE, start, end),
+        'whyEntries': {day: text for day, text in (doc.get('whyEntries') or {}).items() if first <= day <= last}
+    }
+
+
+def content_items(doc: Dict[str, Any]) -> Iterator[Tuple]:
+    """The (kind, ...) items a habit's content hash is made of"""
+    history = history_from_document(doc)
+    for state in (DONE, NOT_DONE):
+        for day in history.dates(state):
+            yield ('day', day, state)
+    for day, text in (doc.get('whyEntries') or {}).items():
+        yield ('why', day, text)
+    for field in HASHED_FIELDS:
+        if doc.get(field) is not None:
+            yield (field, doc[field])
+
+
+def _item_hash(item: Tuple) -> int:
+    digest = hashlib.blake2b(json.dumps(item).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def content_hash(doc: Dict[str, Any]) -> str:
+    """Canonical hash of the content of a stored or client habit document
+
+    Equal for documents with the same days, why entries and settings,
+    whatever their shape. It is the sum of a hash per item, so rehash can
+    follow a change from the changed items alone.
+    """
+    return f'{sum(map(_item_hash, content_items(doc))) % 2 ** 64:016x}'
+
+
+def rehash(value: str, removed: Iterable[Tuple] = (), added: Iterable[Tuple] = ()) -> str:
+    """A content hash with some items taken out and others put in"""
+    total = int(value, 16) - sum(map(_item_hash, removed)) + sum(map(_item_hash, added))
+    return f'{total % 2 ** 64:016x}'
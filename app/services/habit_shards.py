@@ -0,0 +1,162 @@
+"""Per-year history shards of a stored habit
+
+A habit's history and why entries are split by year into documents of the
+habit's ``history`` subcollection::
+
+    users/{uid}/habits/{habit_id}               head: settings, version and
+                                                per-year done/not-done totals
+    users/{uid}/habits/{habit_id}/history/2025  {'history': ..., 'whyEntries': ...}
+
+so a change rewrites only the year it falls in and the small head, however
+old the habit is. The head's ``shards`` map doubles as the index of which
+years exist.
+
+Heads written before sharding still carry ``history`` and ``whyEntries``
+themselves; they are read as they are and split on their next change.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional
+from app.models.aggregates import NEIGHBOURHOOD_REACH_DAYS
+from app.models.history import DONE, EARLIEST_DATE, NOT_DONE, HistoryBitmap, latest_date
+from app.services.habit_document import HISTORY_FIELD, LEGACY_HISTORY_FIELDS, history_from_document
+
+SHARDS_COLLECTION = 'history'
+SHARDS_FIELD = 'shards'
+
+# Fields that live in the shards once a head is sharded
+SHARDED_FIELDS = (HISTORY_FIELD, 'whyEntries')
+
+
+def shard_id(day) -> str:
+    """Shard (year) holding an ISO date"""
+    return str(day)[:4]
+
+
+def is_sharded(head: Optional[Dict[str, Any]]) -> bool:
+    return bool(head) and SHARDS_FIELD in head
+
+
+def is_legacy(head: Optional[Dict[str, Any]]) -> bool:
+    """Whether a head still holds its own history"""
+    return bool(head) and not is_sharded(head) and any(
+        field in head for field in SHARDED_FIELDS + LEGACY_HISTORY_FIELDS
+    )
+
+
+def shard_ids(head: Optional[Dict[str, Any]]) -> list:
+    """Years that have a shard, oldest first"""
+    return sorted((head or {}).get(SHARDS_FIELD) or {})
+
+
+def split_document(doc: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Split a document's history and why entries into per-year shards"""
+    histories = {}
+    history = history_from_document(doc)
+    latest = latest_date()
+    for state in (NOT_DONE, DONE):
+        for day in history.dates(state, EARLIEST_DATE, latest):
+            histories.setdefault(shard_id(day), HistoryBitmap()).set(day, state)
+
+    why_entries = {}
+    for day, text in (doc.get('whyEntries') or {}).items():
+        # Entries are keyed by ISO date; anything else has no year to go in
+        if _is_date(day):
+            why_entries.setdefault(shard_id(day), {})[day] = text
+
+    return {
+        year: {
+            HISTORY_FIELD: histories.get(year, HistoryBitmap()).to_dict(),
+            'whyEntries': why_entries.get(year, {})
+        }
+        for year in set(histories) | set(why_entries)
+    }
+
+
+def assemble_document(head: Optional[Dict[str, Any]], shards: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Rebuild the single-document shape from a head and its loaded shards
+
+    Only the given shards are included, so a partial load yields a document
+    holding just those years. Legacy heads are returned unchanged.
+    """
+    if head is None or not is_sharded(head):
+        return head
+    doc = {field: value for field, value in head.items() if field != SHARDS_FIELD}
+    history = HistoryBitmap()
+    why_entries = {}
+    latest = latest_date()
+    for year in sorted(shards):
+        shard = shards[year] or {}
+        part = HistoryBitmap.from_dict(shard.get(HISTORY_FIELD))
+        for state in (NOT_DONE, DONE):
+            for day in part.dates(state, EARLIEST_DATE, latest):
+                history.set(day, state)
+        why_entries.update(shard.get('whyEntries') or {})
+    doc[HISTORY_FIELD] = history.to_dict()
+    doc['whyEntries'] = why_entries
+    return doc
+
+
+def shard_counts(shard: Dict[str, Any]) -> Dict[str, int]:
+    """Done / not-done totals of a shard, as kept on the head"""
+    history = HistoryBitmap.from_dict(shard.get(HISTORY_FIELD))
+    return {'done': history.done_count, 'notDone': history.not_done_count}
+
+
+def changed_shards(stored: Dict[str, Dict[str, Any]], doc: Dict[str, Any],
+                   years: Optional[Iterable[str]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Shards of doc that differ from the stored ones; None means delete
+
+    years limits the comparison to the shards that were loaded, for a
+    document assembled from only some of them.
+    """
+    shards = split_document(doc)
+    if years is not None:
+        years = set(years)
+        shards = {year: shard for year, shard in shards.items() if year in years}
+        stored = {year: shard for year, shard in stored.items() if year in years}
+
+    changes = {}
+    for year in set(stored) | set(shards):
+        shard = shards.get(year)
+        if shard is None:
+            changes[year] = None
+        elif _normalised(stored.get(year)) != shard:
+            changes[year] = shard
+    return changes
+
+
+def shards_between(start: date, end: date) -> set:
+    """Shards covering a date window"""
+    return {str(year) for year in range(start.year, end.year + 1)}
+
+
+def years_of_ops(ops) -> set:
+    """Shards a list of validated ops can change or needs to look at
+
+    Updating the aggregates reads up to NEIGHBOURHOOD_REACH_DAYS either side
+    of each day, which may fall in the next or previous year.
+    """
+    reach = timedelta(days=NEIGHBOURHOOD_REACH_DAYS)
+    years = set()
+    for op in ops:
+        if 'date' in op:
+            day = date.fromisoformat(op['date'])
+            years.update((shard_id(day - reach), shard_id(day), shard_id(day + reach)))
+    return years
+
+
+def _is_date(value) -> bool:
+    try:
+        date.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _normalised(shard: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if shard is None:
+        return None
+    return {
+        HISTORY_FIELD: HistoryBitmap.from_dict(shard.get(HISTORY_FIELD)).to_dict(),
+        'whyEntries': shard.get('whyEntries') or {}
+    }
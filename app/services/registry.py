@@ -0,0 +1,110 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+from flask import current_app, g
+from app.services.firebase_service import FirebaseService
+from app.services.document_cache import DocumentCache
+from app.services.document_loader import DocumentLoader
+from app.services.response_cache import ResponseCache
+from app.services.singleflight import SingleFlight
+from app.services.sync_protocol import merge_habit_saves
+from app.services.write_buffer import WriteBuffer, flush_on_sigterm
+from app.models.tracker_cache import TrackerCache
+from app.models.tracker_store import ShardedTrackerStore
+
+
+class ServiceRegistry:
+    """App-scoped holder for process-wide services
+
+    create_app() builds one registry per application. The FirebaseService (and
+    with it the Firestore client and its gRPC channel) is created lazily on
+    first use and re-created when the process id changes, since gRPC channels
+    must not be shared across a fork.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self._lock = threading.Lock()
+        self._firebase_service = None
+        self._pid = None
+        self.tracker_cache = TrackerCache()
+        self.user_trackers = ShardedTrackerStore(config['LOCAL_DATA_DIR'],
+                                                 max_open=config['LOCAL_TRACKERS_MAX_OPEN'])
+        self.response_cache = ResponseCache(max_size=config['RESPONSE_CACHE_SIZE'])
+        self.document_cache = DocumentCache(max_entries=config['DOCUMENT_CACHE_SIZE'],
+                                            ttl=config['DOCUMENT_CACHE_TTL'])
+        self.flights = SingleFlight()
+        # Coalesces bursts of full saves; off unless WRITE_BUFFER_INTERVAL is set
+        self.write_buffer = None
+        if config['WRITE_BUFFER_INTERVAL'] > 0:
+            self.write_buffer = WriteBuffer(merge_habit_saves, interval=config['WRITE_BUFFER_INTERVAL'],
+                                            max_pending=config['WRITE_BUFFER_MAX_PENDING'])
+            flush_on_sigterm()
+        # Runs independent /api/batch operations; threads start on first use
+        self.batch_executor = ThreadPoolExecutor(max_workers=config['BATCH_MAX_WORKERS'],
+                                                 thread_name_prefix='batch')
+
+    def channel_options(self) -> Dict[str, Any]:
+        """gRPC channel arguments for the shared Firestore client"""
+        return {
+            'grpc.keepalive_time_ms': self.config['FIRESTORE_KEEPALIVE_TIME_MS'],
+            'grpc.keepalive_timeout_ms': self.config['FIRESTORE_KEEPALIVE_TIMEOUT_MS'],
+            'grpc.keepalive_permit_without_calls': 1,
+            'grpc.http2.max_pings_without_data': 0,
+        }
+
+    def firebase_service(self) -> FirebaseService:
+        """Return the shared FirebaseService, creating it on first use"""
+        pid = os.getpid()
+        if self._firebase_service is None or self._pid != pid:
+            with self._lock:
+                if self._firebase_service is None or self._pid != pid:
+                    self._firebase_service = FirebaseService(
+                        channel_options=self.channel_options(),
+                        timeout=self.config['FIRESTORE_CALL_TIMEOUT'],
+                        document_cache=self.document_cache,
+                        flights=self.flights,
+                        write_buffer=self.write_buffer
+                    )
+                    self._pid = pid
+        return self._firebase_service
+
+
+def init_services(app) -> ServiceRegistry:
+    """Create the service registry for an application"""
+    app.config.setdefault('FIRESTORE_KEEPALIVE_TIME_MS', int(os.environ.get('FIRESTORE_KEEPALIVE_TIME_MS', 30000)))
+    app.config.setdefault('FIRESTORE_KEEPALIVE_TIMEOUT_MS', int(os.environ.get('FIRESTORE_KEEPALIVE_TIMEOUT_MS', 10000)))
+    app.config.setdefault('FIRESTORE_CALL_TIMEOUT', float(os.environ.get('FIRESTORE_CALL_TIMEOUT', 10)))
+    app.config.setdefault('LOCAL_DATA_DIR', os.environ.get('LOCAL_DATA_DIR', 'habit_data'))
+    app.config.setdefault('LOCAL_TRACKERS_MAX_OPEN', int(os.environ.get('LOCAL_TRACKERS_MAX_OPEN', 256)))
+    app.config.setdefault('RESPONSE_CACHE_SIZE', int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)))
+    app.config.setdefault('DOCUMENT_CACHE_SIZE', int(os.environ.get('DOCUMENT_CACHE_SIZE', 2048)))
+    app.config.setdefault('DOCUMENT_CACHE_TTL', float(os.environ.get('DOCUMENT_CACHE_TTL', 30)))
+    app.config.setdefault('BATCH_MAX_WORKERS', int(os.environ.get('BATCH_MAX_WORKERS', 8)))
+    app.config.setdefault('WRITE_BUFFER_INTERVAL', float(os.environ.get('WRITE_BUFFER_INTERVAL', 0)))
+    app.config.setdefault('WRITE_BUFFER_MAX_PENDING', int(os.environ.get('WRITE_BUFFER_MAX_PENDING', 1024)))
+    app.config.setdefault('HOME_BOOTSTRAP', os.environ.get('HOME_BOOTSTRAP', 'true').lower() == 'true')
+
+    registry = ServiceRegistry(app.config)
+    app.extensions['services'] = registry
+    return registry
+
+
+def get_services() -> ServiceRegistry:
+    """Return the registry of the current application"""
+    return current_app.extensions['services']
+
+
+def get_firebase_service() -> FirebaseService:
+    """Return the shared FirebaseService, cached on g for the current request"""
+    if 'firebase_service' not in g:
+        g.firebase_service = get_services().firebase_service()
+    return g.firebase_service
+
+
+def get_document_loader() -> DocumentLoader:
+    """Return the request's DocumentLoader, creating it on first use"""
+    if 'document_loader' not in g:
+        g.document_loader = DocumentLoader(get_firebase_service())
+    return g.document_loader
@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution
+
+    The first caller for a key runs the function; callers that arrive while it
+    is in flight wait for it and receive the same result or exception. Nothing
+    is remembered once the call finishes, so this never serves stale data; it
+    only flattens bursts of identical concurrent reads.
+
+    Per-key counters are kept for the ``max_tracked_keys`` most recent keys.
+    """
+
+    def __init__(self, max_tracked_keys: int = 1024):
+        self.max_tracked_keys = max_tracked_keys
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._key_stats = OrderedDict()
+        self.executions = 0
+        self.shared = 0
+        self.errors = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn once for all concurrent callers of key
+
+        Returns the result and whether it was shared from another caller's
+        execution, in which case it is the very same object.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                self.shared += 1
+            self._count(key, leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _count(self, key, leader):
+        counts = self._key_stats.get(key)
+        if counts is None:
+            counts = self._key_stats[key] = {'executions': 0, 'shared': 0}
+            while len(self._key_stats) > self.max_tracked_keys:
+                self._key_stats.popitem(last=False)
+        self._key_stats.move_to_end(key)
+        counts['executions' if leader else 'shared'] += 1
+
+    def key_stats(self, key: Hashable) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._key_stats.get(key, {'executions': 0, 'shared': 0}))
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        """Return totals and the keys that shared the most calls"""
+        with self._lock:
+            calls = self.executions + self.shared
+            busiest = sorted(self._key_stats.items(), key=lambda item: item[1]['shared'], reverse=True)[:top]
+            return {
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'shared': self.shared,
+                'errors': self.errors,
+                'share_rate': round(self.shared / calls, 4) if calls else 0.0,
+                'busiest_keys': [dict(counts, key=str(key)) for key, counts in busiest]
+            }
@@ -0,0 +1,262 @@
+"""Operation-based (delta) sync between clients and the stored habit document
+
+Instead of uploading the whole habit on every sync, a client sends the
+operations it recorded since the last server version it saw. Every applied
+operation bumps the document's integer ``version`` by one and is kept in the
+habit's ``ops`` subcollection under that version, so the server can answer
+with exactly the operations the client is missing.
+
+Writes that do not go through operations (full saves, legacy syncs) also
+bump ``version`` but leave no op behind; a client whose missing range
+contains such a version, or whose range has been pruned, receives the full
+document instead.
+
+Operations::
+
+    {'op': 'add_date', 'list': 'completedDates' | 'notDoneDates', 'date': 'YYYY-MM-DD'}
+    {'op': 'remove_date', 'list': 'completedDates' | 'notDoneDates', 'date': 'YYYY-MM-DD'}
+    {'op': 'set_why', 'date': 'YYYY-MM-DD', 'text': str}
+    {'op': 'set_counter', 'value': int}
+    {'op': 'set_field', 'field': 'startedDate' | 'frequency', 'value': str}
+
+PATCH requests send mutations, which mutation_ops turns into the same ops::
+
+    {'action': 'done' | 'not_done' | 'clear', 'date': 'YYYY-MM-DD'}
+    {'action': 'why', 'date': 'YYYY-MM-DD', 'text': str}
+    {'action': 'counter', 'value': int}
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.aggregates import AGGREGATES_FIELD, update_aggregates
+from app.models.history import DONE, NOT_DONE, UNTRACKED, EARLIEST_DATE, in_window, latest_date
+from app.services.habit_document import (
+    CONTENT_HASH_FIELD, HISTORY_FIELD, LEGACY_HISTORY_FIELDS, history_from_document, rehash
+)
+
+VERSION_FIELD = 'version'
+OPS_COLLECTION = 'ops'
+
+# One sync commits up to 2 * MAX_OPS_PER_SYNC + 1 writes (ops, pruned ops
+# and the head document) plus one per history year touched, which must stay
+# under Firestore's 500-write limit
+MAX_OPS_PER_SYNC = 200
+MAX_YEARS_PER_SYNC = 50
+OPS_RETENTION = 500
+MAX_WHY_LENGTH = 2000
+
+DATE_LISTS = {'completedDates': DONE, 'notDoneDates': NOT_DONE}
+SETTABLE_FIELDS = ('startedDate', 'frequency')
+SCALAR_FIELDS = SETTABLE_FIELDS + ('counter',)
+
+# Attempts at a conditional full-document merge before giving up
+MERGE_ATTEMPTS = 5
+
+
+class SyncProtocolError(ValueError):
+    """Raised for a malformed delta sync request"""
+
+
+def _valid_date(value) -> bool:
+    try:
+        return in_window(date.fromisoformat(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def validate_ops(ops) -> List[Dict[str, Any]]:
+    """Check and normalise client operations, dropping unknown keys"""
+    if ops is None:
+        return []
+    if not isinstance(ops, list):
+        raise SyncProtocolError('ops must be a list')
+    if len(ops) > MAX_OPS_PER_SYNC:
+        raise SyncProtocolError(f'At most {MAX_OPS_PER_SYNC} ops per sync')
+
+    result = []
+    for op in ops:
+        if not isinstance(op, dict):
+            raise SyncProtocolError(f'Invalid op: {op!r}')
+        kind = op.get('op')
+        if kind in ('add_date', 'remove_date'):
+            if op.get('list') not in DATE_LISTS or not _valid_date(op.get('date')):
+                raise SyncProtocolError(f'Invalid {kind} op: {op!r}')
+            result.append({'op': kind, 'list': op['list'], 'date': op['date']})
+        elif kind == 'set_why':
+            text = op.get('text')
+            if not _valid_date(op.get('date')) or not isinstance(text, str) or len(text) > MAX_WHY_LENGTH:
+                raise SyncProtocolError(f'Invalid set_why op: {op!r}')
+            result.append({'op': kind, 'date': op['date'], 'text': text})
+        elif kind == 'set_counter':
+            value = op.get('value')
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise SyncProtocolError(f'Invalid set_counter op: {op!r}')
+            result.append({'op': kind, 'value': value})
+        elif kind == 'set_field':
+            if op.get('field') not in SETTABLE_FIELDS or not isinstance(op.get('value'), str):
+                raise SyncProtocolError(f'Invalid set_field op: {op!r}')
+            result.append({'op': kind, 'field': op['field'], 'value': op['value']})
+        else:
+            raise SyncProtocolError(f'Unknown op: {kind!r}')
+    if len({op['date'][:4] for op in result if 'date' in op}) > MAX_YEARS_PER_SYNC:
+        raise SyncProtocolError(f'Ops may touch at most {MAX_YEARS_PER_SYNC} years per sync')
+    return result
+
+
+def mutation_ops(mutations) -> List[Dict[str, Any]]:
+    """Translate and validate PATCH mutations into ops"""
+    if not isinstance(mutations, list) or not mutations:
+        raise SyncProtocolError('mutations must be a non-empty list')
+
+    ops = []
+    for mutation in mutations:
+        action = mutation.get('action') if isinstance(mutation, dict) else None
+        if action in ('done', 'not_done'):
+            ops.append({'op': 'add_date', 'list': 'completedDates' if action == 'done' else 'notDoneDates',
+                        'date': mutation.get('date')})
+        elif action == 'clear':
+            # remove_date only clears a day in the state its list names
+            ops.extend({'op': 'remove_date', 'list': name, 'date': mutation.get('date')} for name in DATE_LISTS)
+        elif action == 'why':
+            ops.append({'op': 'set_why', 'date': mutation.get('date'), 'text': mutation.get('text')})
+        elif action == 'counter':
+            ops.append({'op': 'set_counter', 'value': mutation.get('value')})
+        else:
+            raise SyncProtocolError(f'Unknown mutation: {action!r}')
+    return validate_ops(ops)
+
+
+def apply_ops(doc: Optional[Dict[str, Any]], ops: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Apply validated ops to a stored document
+
+    Returns the resulting document and the changed fields only, ready for a
+    merge write; why entries are returned as a partial map so the merge
+    touches just the edited days. A document's aggregates are updated day
+    by day; where that is not possible they are dropped from the result,
+    and the caller rebuilds them from the whole history. The content hash
+    follows each op the same way, from the old and new value it touched.
+    """
+    doc = dict(doc or {})
+    updates = {}
+    history = None
+    aggregates = doc.get(AGGREGATES_FIELD)
+    content = doc.get(CONTENT_HASH_FIELD)
+
+    for op in ops:
+        kind = op['op']
+        if kind in ('add_date', 'remove_date'):
+            if history is None:
+                history = history_from_document(doc)
+            state = DATE_LISTS[op['list']]
+            if kind == 'remove_date':
+                state = UNTRACKED if history.get(op['date']) == state else history.get(op['date'])
+            previous = history.set(op['date'], state)
+            if aggregates is not None:
+                aggregates = update_aggregates(aggregates, history, op['date'], previous, state)
+            if content is not None:
+                day = date.fromisoformat(op['date']).isoformat()
+                content = rehash(content, [('day', day, previous)] if previous != UNTRACKED else [],
+                                 [('day', day, state)] if state != UNTRACKED else [])
+        elif kind == 'set_why':
+            why_entries = updates.setdefault('whyEntries', {})
+            if content is not None:
+                old = why_entries.get(op['date'], (doc.get('whyEntries') or {}).get(op['date']))
+                content = rehash(content, [('why', op['date'], old)] if old is not None else [],
+                                 [('why', op['date'], op['text'])])
+            why_entries[op['date']] = op['text']
+        else:
+            field = 'counter' if kind == 'set_counter' else op['field']
+            if content is not None:
+                old = updates.get(field, doc.get(field))
+                content = rehash(content, [(field, old)] if old is not None else [],
+                                 [(field, op['value'])])
+            updates[field] = op['value']
+
+    if history is not None:
+        updates[HISTORY_FIELD] = history.to_dict()
+        if aggregates is not None:
+            updates[AGGREGATES_FIELD] = aggregates
+        else:
+            doc.pop(AGGREGATES_FIELD, None)
+    if updates and content is not None:
+        updates[CONTENT_HASH_FIELD] = content
+
+    for field, value in updates.items():
+        if field == 'whyEntries':
+            doc['whyEntries'] = dict(doc.get('whyEntries') or {}, **value)
+        else:
+            doc[field] = value
+    return doc, updates
+
+
+def merge_habit_documents(server_doc: Optional[Dict[str, Any]], local_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge a client's full habit payload into a stored document
+
+    Dates are a set union of both sides and why entries merge per day; where
+    the two sides disagree about a day or a setting, the client wins. Client
+    days outside the history window are dropped.
+    """
+    merged = dict(server_doc or {})
+    history = history_from_document(merged)
+    local_history = history_from_document(local_data)
+    latest = latest_date()
+    for day in local_history.dates(NOT_DONE, EARLIEST_DATE, latest):
+        history.set(day, NOT_DONE)
+    for day in local_history.dates(DONE, EARLIEST_DATE, latest):
+        history.set(day, DONE)
+
+    for field in LEGACY_HISTORY_FIELDS:
+        merged.pop(field, None)
+    merged[HISTORY_FIELD] = history.to_dict()
+    merged['whyEntries'] = dict(merged.get('whyEntries') or {}, **(local_data.get('whyEntries') or {}))
+    for field in SCALAR_FIELDS:
+        if local_data.get(field) is not None:
+            merged[field] = local_data[field]
+    return merged
+
+
+def merge_habit_saves(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two full-save payloads into one with the same effect
+
+    Fields of the newer save win, except why entries, which merge per day
+    as save_habit_data merges them into the stored document. A date list
+    the newer save left out keeps the older save's, as the stored one would.
+    """
+    merged = dict(older, **newer)
+    if 'whyEntries' in older and 'whyEntries' in newer:
+        merged['whyEntries'] = dict(older['whyEntries'] or {}, **(newer['whyEntries'] or {}))
+    return merged
+
+
+def changed_fields(server_doc: Optional[Dict[str, Any]], merged: Dict[str, Any]) -> Dict[str, Any]:
+    """The merged habit fields that differ from the stored document"""
+    server_doc = server_doc or {}
+    return {
+        field: merged[field] for field in (HISTORY_FIELD, 'whyEntries') + SCALAR_FIELDS
+        if field in merged and merged[field] != server_doc.get(field)
+    }
+
+
+def op_document_id(version: int) -> str:
+    """Ops are keyed by zero-padded version so they sort by id"""
+    return f'{version:012d}'
+
+
+def can_send_delta(base_version: Optional[int], head_version: int) -> bool:
+    """Whether the client's missing range could still be in the ops log"""
+    return (isinstance(base_version, int) and not isinstance(base_version, bool) and
+            0 <= base_version <= head_version and
+            head_version - base_version <= OPS_RETENTION)
+
+
+def idle_response(base_version: Optional[int], head: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The response to a sync without ops from a client already at head, or None"""
+    if head is None or not can_send_delta(base_version, head.get(VERSION_FIELD, 0)) \
+            or head.get(VERSION_FIELD, 0) != base_version:
+        return None
+    return {'status': 'success', 'action': 'delta', 'version': base_version, 'ops': []}
+
+
+def is_complete(records: List[Dict[str, Any]], base_version: int, head_version: int) -> bool:
+    """Whether the stored op records cover every version after base_version"""
+    versions = [record.get(VERSION_FIELD) for record in records]
+    return versions == list(range(base_version + 1, head_version + 1))
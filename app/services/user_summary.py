@@ -0,0 +1,92 @@
+"""The per-user dashboard summary, one document at ``users/{uid}``::
+
+    {'subscription_tier': 'premium',
+     'habits': {'main': {'name': 'main', 'startedDate': '2025-01-01', 'frequency': 'Daily',
+                         'counter': 12, 'last_updated': <timestamp>, 'aggregates': {...}}},
+     'complete': True}
+
+Every habit and subscription write merges its part of the summary in the
+same batch or transaction, so the dashboard needs this single read however
+many habits a user has. Today's state is not stored, since it would go
+stale at midnight; it follows from the aggregates' ``lastTracked`` and
+``streakEnd``. ``complete`` marks a summary built from every habit; one
+without it was started by writes made before the summary existed and is
+backfilled on the next dashboard read, as is one holding aggregates older
+than the current block.
+"""
+from datetime import date
+from typing import Any, Dict, Optional
+from app.models.aggregates import AGGREGATES_FIELD, empty_aggregates, needs_rebuild, summarize_aggregates
+
+SUMMARY_COLLECTION = 'users'
+HABITS_FIELD = 'habits'
+COMPLETE_FIELD = 'complete'
+# Habit fields copied into the summary; the version is left out, as full
+# saves bump it with a transform the summary could not follow
+SUMMARY_HABIT_FIELDS = ('name', 'startedDate', 'frequency', 'counter', 'last_updated', AGGREGATES_FIELD)
+
+
+def summary_ref_of(habit_ref):
+    """The summary document of the user owning habit_ref"""
+    return habit_ref.parent.parent
+
+
+def habit_summary_writes(habit_id: str, writes: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge writes for a habit's summary entry from the head's writes, or {}"""
+    entry = {field: writes[field] for field in SUMMARY_HABIT_FIELDS if field in writes}
+    return {HABITS_FIELD: {habit_id: entry}} if entry else {}
+
+
+def tier_writes(tier: str) -> Dict[str, Any]:
+    return {'subscription_tier': tier}
+
+
+def build_summary(profile: Optional[Dict[str, Any]], habits: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """A complete summary from the profile and every habit's head, by id"""
+    return {
+        'subscription_tier': (profile or {}).get('subscription_tier', 'free'),
+        HABITS_FIELD: {habit_id: {field: habit[field] for field in SUMMARY_HABIT_FIELDS if field in habit}
+                       for habit_id, habit in habits.items()},
+        COMPLETE_FIELD: True
+    }
+
+
+def is_current(summary: Optional[Dict[str, Any]]) -> bool:
+    """Whether a stored summary can be served without a backfill"""
+    return bool((summary or {}).get(COMPLETE_FIELD)) and not any(
+        needs_rebuild(habit.get(AGGREGATES_FIELD)) for habit in (summary.get(HABITS_FIELD) or {}).values()
+    )
+
+
+def today_state(aggregates: Dict[str, Any], today: Optional[date] = None) -> Optional[str]:
+    """'done', 'notDone' or None (untracked) for today"""
+    today = (today or date.today()).isoformat()
+    if aggregates.get('streakEnd') == today:
+        return 'done'
+    if aggregates.get('lastTracked') == today:
+        return 'notDone'
+    return None
+
+
+def dashboard_from_summary(user_id: str, summary: Dict[str, Any], today: Optional[date] = None) -> Dict[str, Any]:
+    """The dashboard payload: tier and each habit's state and stats, in id order"""
+    habits = []
+    for habit_id, habit in sorted((summary.get(HABITS_FIELD) or {}).items()):
+        aggregates = habit.get(AGGREGATES_FIELD) or empty_aggregates()
+        last_updated = habit.get('last_updated')
+        habits.append({
+            'id': habit_id,
+            'name': habit.get('name') or habit_id,
+            'startedDate': habit.get('startedDate'),
+            'frequency': habit.get('frequency') or 'Daily',
+            'counter': habit.get('counter', 0),
+            'today': today_state(aggregates, today),
+            'stats': summarize_aggregates(aggregates, habit.get('startedDate'), habit.get('frequency') or 'Daily',
+                                          today),
+            'last_updated': last_updated.isoformat() if hasattr(last_updated, 'isoformat') else last_updated
+        })
+    return {
+        'uid': user_id,
+        'subscription_tier': summary.get('subscription_tier', 'free'),
+        'habits': habits
+    }
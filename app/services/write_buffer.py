@@ -0,0 +1,209 @@
+import atexit
+import os
+import signal
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# Stripes of per-document write locks; a document's writes never overlap
+WRITE_LOCK_STRIPES = 64
+# A failing write is retried with the next flushes, then given up
+MAX_WRITE_ATTEMPTS = 3
+# How long SIGTERM waits for the flush; Cloud Run allows 10 seconds
+SIGTERM_FLUSH_TIMEOUT = 8.0
+
+
+class _Pending:
+    __slots__ = ('payload', 'write', 'since', 'attempts')
+
+    def __init__(self, payload, write, since, attempts=0):
+        self.payload = payload
+        self.write = write
+        self.since = since
+        self.attempts = attempts
+
+
+class WriteBuffer:
+    """Write-behind buffer that coalesces bursts of writes to a document
+
+    add() merges a payload into the document's pending write with
+    ``merge(older, newer)`` and returns at once. A pending write is made
+    ``interval`` seconds after its first payload arrived, so a burst of
+    saves costs one Firestore write; flush() makes it early, which readers
+    use to see their own writes, and flush_all() runs at exit and on
+    SIGTERM. At most ``max_pending`` documents wait at a time: adding one
+    more writes the oldest in the caller's thread.
+    """
+
+    _buffers = weakref.WeakSet()
+
+    def __init__(self, merge: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]],
+                 interval: float = 2.0, max_pending: int = 1024):
+        self.merge = merge
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_locks = [threading.RLock() for _ in range(WRITE_LOCK_STRIPES)]
+        self._timer = None
+        self.added = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.forced = 0
+        self.failed = 0
+        self.dropped = 0
+        WriteBuffer._buffers.add(self)
+
+    def add(self, key: str, payload: Dict[str, Any], write: Callable[[Dict[str, Any]], bool]) -> None:
+        """Queue payload for key; write(payload) makes it and returns success"""
+        oldest = None
+        with self._lock:
+            self.added += 1
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.coalesced += 1
+                pending.payload = self.merge(pending.payload, payload)
+                pending.write = write
+            else:
+                if len(self._pending) >= self.max_pending:
+                    oldest = next(iter(self._pending))
+                    self.forced += 1
+                self._pending[key] = _Pending(payload, write, time.monotonic())
+                self._schedule()
+        if oldest is not None:
+            self.flush(oldest)
+
+    def peek(self, key: str) -> Optional[Dict[str, Any]]:
+        """The payload waiting for key, or None"""
+        with self._lock:
+            pending = self._pending.get(key)
+            return dict(pending.payload) if pending is not None else None
+
+    def flush(self, key: str) -> bool:
+        """Make key's pending write now, after any write of it in progress"""
+        with self._write_locks[hash(key) % WRITE_LOCK_STRIPES]:
+            with self._lock:
+                pending = self._pending.pop(key, None)
+            if pending is None:
+                return True
+            try:
+                ok = pending.write(pending.payload)
+            except Exception as e:
+                print(f"Error writing buffered {key}: {e}")
+                ok = False
+            with self._lock:
+                self.writes += 1
+                if not ok:
+                    self.failed += 1
+                    self._requeue(key, pending)
+            return ok
+
+    def flush_all(self) -> None:
+        for key in self._keys():
+            self.flush(key)
+
+    def flush_prefix(self, prefix: str) -> None:
+        """Flush every pending write whose key starts with prefix"""
+        for key in self._keys():
+            if key.startswith(prefix):
+                self.flush(key)
+
+    def _keys(self) -> List[str]:
+        with self._lock:
+            return list(self._pending)
+
+    def _requeue(self, key, pending):
+        pending.attempts += 1
+        if pending.attempts >= MAX_WRITE_ATTEMPTS:
+            self.dropped += 1
+            print(f"Giving up buffered write of {key} after {pending.attempts} attempts")
+            return
+        newer = self._pending.pop(key, None)
+        if newer is not None:
+            pending.payload = self.merge(pending.payload, newer.payload)
+            pending.write = newer.write
+        pending.since = time.monotonic()
+        self._pending[key] = pending
+        self._schedule()
+
+    def _schedule(self):
+        # Called with the lock held
+        if self._timer is None and self._pending:
+            due = next(iter(self._pending.values())).since + self.interval
+            self._timer = threading.Timer(max(0.0, due - time.monotonic()), self._flush_due)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_due(self):
+        with self._lock:
+            self._timer = None
+            now = time.monotonic()
+            due = [key for key, pending in self._pending.items() if now - pending.since >= self.interval]
+        for key in due:
+            self.flush(key)
+        with self._lock:
+            self._schedule()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return coalescing counters for monitoring
+
+        coalesced counts payloads merged into an already pending write, each
+        one a Firestore write saved.
+        """
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'max_pending': self.max_pending,
+                'interval': self.interval,
+                'added': self.added,
+                'coalesced': self.coalesced,
+                'writes': self.writes,
+                'forced': self.forced,
+                'failed': self.failed,
+                'dropped': self.dropped
+            }
+
+
+@atexit.register
+def _flush_all_buffers():
+    for buffer in list(WriteBuffer._buffers):
+        try:
+            buffer.flush_all()
+        except Exception as e:
+            print(f"Error flushing write buffer: {e}")
+
+
+_sigterm_installed = False
+
+
+def flush_on_sigterm() -> bool:
+    """Flush every buffer when the process is asked to stop
+
+    Chains to the SIGTERM handler already installed (gunicorn's, say), or
+    to the default action. Only the main thread can install handlers;
+    returns whether this one was.
+    """
+    global _sigterm_installed
+    if _sigterm_installed:
+        return True
+    try:
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle(signum, frame):
+            # Flush on another thread: the one interrupted may hold a buffer lock
+            flusher = threading.Thread(target=_flush_all_buffers, name='write-buffer-flush')
+            flusher.start()
+            flusher.join(SIGTERM_FLUSH_TIMEOUT)
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, handle)
+    except ValueError:
+        return False
+    _sigterm_installed = True
+    return True
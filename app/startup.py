@@ -0,0 +1,108 @@
+"""Cold-start profiler for the WSGI entry point
+
+Usage:
+    python -m app.startup [--target run] [--top 20] [--budget-ms 1500]
+
+Imports the target in a fresh interpreter under ``-X importtime`` and prints
+the import-time breakdown per module, plus the total wall time of the import.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold-start budget for ``import run`` in milliseconds
+DEFAULT_BUDGET_MS = float(os.environ.get('COLD_START_BUDGET_MS', 1500))
+
+_TIMING_SNIPPET = (
+    "import time, sys\n"
+    "start = time.perf_counter()\n"
+    "import {target}\n"
+    "sys.stdout.write(str((time.perf_counter() - start) * 1000))\n"
+)
+
+
+def _run_import(target: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    """Import target in a fresh interpreter so nothing is already cached"""
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', _TIMING_SNIPPET.format(target=target)]
+    return subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+
+
+def measure_cold_import(target: str = 'run') -> float:
+    """Return the wall time in milliseconds of a cold import of target"""
+    result = _run_import(target)
+    return float(result.stdout.strip())
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, object]]:
+    """Parse ``-X importtime`` output into per-module self/cumulative times (ms)"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|', 1).split('|')]
+        modules.append({
+            'module': name,
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+    return modules
+
+
+def profile_startup(target: str = 'run') -> Dict[str, object]:
+    """Profile a cold import of target
+
+    Returns the total import time, the per-module breakdown and the self time
+    aggregated by top-level package.
+    """
+    result = _run_import(target, importtime=True)
+    modules = parse_importtime(result.stderr)
+
+    packages = {}
+    for entry in modules:
+        package = entry['module'].split('.')[0]
+        packages[package] = packages.get(package, 0) + entry['self_ms']
+
+    return {
+        'target': target,
+        'total_ms': float(result.stdout.strip()),
+        'modules': modules,
+        'packages': packages
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Profile the cold import of the app entry point')
+    parser.add_argument('--target', default='run', help='module to import (default: run)')
+    parser.add_argument('--top', type=int, default=20, help='number of modules to list')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='fail if the import takes longer than this')
+    args = parser.parse_args(argv)
+
+    report = profile_startup(args.target)
+
+    print(f"Cold import of '{report['target']}': {report['total_ms']:.1f} ms "
+          f"(budget {args.budget_ms:.0f} ms)")
+    print()
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    slowest = sorted(report['modules'], key=lambda m: m['cumulative_ms'], reverse=True)
+    for entry in slowest[:args.top]:
+        print(f"{entry['cumulative_ms']:>14.1f} {entry['self_ms']:>9.1f}  {entry['module']}")
+
+    print()
+    print(f"{'self ms':>14}  package")
+    packages = sorted(report['packages'].items(), key=lambda item: item[1], reverse=True)
+    for package, self_ms in packages[:args.top]:
+        print(f"{self_ms:>14.1f}  {package}")
+
+    return 0 if report['total_ms'] <= args.budget_ms else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
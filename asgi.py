@@ -0,0 +1,4 @@
+from app.asgi import create_asgi_app
+
+# ASGI entry point; run.py remains the WSGI one
+app = create_asgi_app()
@@ -19,6 +19,55 @@ let currentUser = null;
 let userProfile = null;
 let lastSyncTime = localStorage.getItem('lastSyncTime');
 
+// Delta sync state, kept per signed-in user: the last server version this
+// client has seen and the ops recorded locally since then
+let serverVersion = null;
+let pendingOps = [];
+let syncInFlight = false;
+// Whether the local copy holds the user's whole history: true once a full
+// document has been adopted or the older windows have been fetched
+let historyComplete = false;
+
+// The server takes at most this many ops per sync (MAX_OPS_PER_SYNC in
+// sync_protocol.py); longer queues go up in several requests
+const MAX_OPS_PER_SYNC = 200;
+
+// Days per request for older history (MAX_HISTORY_WINDOW_DAYS in
+// main_controller.py)
+const HISTORY_WINDOW_DAYS = 366;
+
+// Profile and habit the server embedded in the page for the signed-in user.
+// A device that has synced with the user before shows the habit as soon as
+// the page loads, and uses it once in place of the sign-in round trip
+let bootstrapData = readBootstrap();
+seedFromBootstrap(bootstrapData);
+
+function readBootstrap() {
+    const el = document.getElementById('bootstrap-data');
+    if (!el) return null;
+    try {
+        return JSON.parse(el.textContent);
+    } catch (e) {
+        console.warn('Failed to read bootstrap data:', e);
+        return null;
+    }
+}
+
+// Take the embedded habit, with the ops still queued on top, before auth
+// fires. It only holds the days of bootstrap.window, which replace those
+// days of the local copy. A device that never synced keeps its own data
+// for the first merge
+function seedFromBootstrap(bootstrap) {
+    if (!bootstrap || !bootstrap.habit) return;
+    const saved = readSyncState(bootstrap.uid);
+    if (saved.version === null) return;
+    
+    loadFromLocalStorage();
+    adoptServerData(bootstrap.habit, bootstrap.window);
+    saved.pendingOps.forEach(op => applyOp(habitData, op));
+    saveToLocalStorage();
+}
+
 // Authentication Functions
 function signInWithGoogle() {
     const provider = new firebase.auth.GoogleAuthProvider();
@@ -57,15 +106,64 @@ auth.onAuthStateChanged((user) => {
     
     if (user) {
         // User signed in
-        getUserProfile().then(() => {
-            syncWithFirestore();
-        });
+        loadSyncState();
+        const bootstrap = takeBootstrap(user);
+        if (bootstrap) {
+            applyBootstrap(bootstrap);
+        } else {
+            startSession();
+        }
     } else {
         // User signed out - fall back to localStorage
         loadFromLocalStorage();
     }
 });
 
+// Mirror the ID token into the __session cookie (the only cookie Firebase
+// Hosting forwards) so the server can personalise the next page load
+auth.onIdTokenChanged(async (user) => {
+    const secure = location.protocol === 'https:' ? '; Secure' : '';
+    if (user) {
+        const token = await user.getIdToken();
+        document.cookie = `__session=${token}; path=/; max-age=3600; SameSite=Strict${secure}`;
+    } else {
+        document.cookie = `__session=; path=/; max-age=0; SameSite=Strict${secure}`;
+    }
+});
+
+// Return the embedded bootstrap if it belongs to this user, the server
+// already has their habit and this device has synced with it before; a
+// device without a server version still has to send its data for the first
+// merge, which startSession does. The bootstrap is only ever used once
+function takeBootstrap(user) {
+    const bootstrap = bootstrapData;
+    bootstrapData = null;
+    if (!bootstrap || bootstrap.uid !== user.uid || !bootstrap.profile || !bootstrap.habit ||
+        serverVersion === null) {
+        return null;
+    }
+    return bootstrap;
+}
+
+// The habit itself was taken when the page loaded, see seedFromBootstrap
+function applyBootstrap(bootstrap) {
+    userProfile = bootstrap.profile;
+    updateAuthUI();
+    
+    serverVersion = bootstrap.version;
+    saveSyncState();
+    
+    // Nothing to fetch; only push changes made while offline
+    if (pendingOps.length) {
+        syncWithFirestore();
+    }
+    // A copy cut down to the bootstrap window by an older client gets the
+    // rest of its history back
+    if (!historyComplete && bootstrap.window) {
+        loadOlderHistory(bootstrap.window.from);
+    }
+}
+
 // UI Updates
 function updateAuthUI() {
     const authSection = document.getElementById('auth-section');
@@ -136,50 +234,309 @@ async function getUserProfile() {
     return null;
 }
 
-async function syncWithFirestore() {
+// Delta Sync
+function syncStateKey(uid = currentUser.uid) {
+    return `syncState:${uid}`;
+}
+
+// The server version this device last saw for a user (null if it never
+// completed a sync) and the ops queued since
+function readSyncState(uid) {
+    try {
+        const saved = JSON.parse(localStorage.getItem(syncStateKey(uid)) || 'null');
+        if (saved) {
+            return {version: saved.version, pendingOps: saved.pendingOps,
+                    historyComplete: saved.historyComplete === true};
+        }
+    } catch (e) {
+        console.warn('Failed to load sync state:', e);
+    }
+    return {version: null, pendingOps: [], historyComplete: false};
+}
+
+function loadSyncState() {
+    const saved = readSyncState(currentUser.uid);
+    serverVersion = saved.version;
+    pendingOps = saved.pendingOps;
+    historyComplete = saved.historyComplete;
+}
+
+function saveSyncState() {
+    if (!currentUser) return;
+    try {
+        localStorage.setItem(syncStateKey(), JSON.stringify({
+            version: serverVersion,
+            pendingOps: pendingOps,
+            historyComplete: historyComplete
+        }));
+    } catch (e) {
+        console.warn('Failed to save sync state:', e);
+    }
+}
+
+function getClientId() {
+    let clientId = localStorage.getItem('syncClientId');
+    if (!clientId) {
+        clientId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+        localStorage.setItem('syncClientId', clientId);
+    }
+    return clientId;
+}
+
+function isDateOp(op) {
+    return op.op === 'add_date' || op.op === 'remove_date';
+}
+
+// Queue a change for the next sync; a later counter, field or why change
+// replaces any queued one for the same target. A day keeps at most two
+// queued ops: an add decides the day alone, so it replaces the day's
+// earlier ops, and a remove that cannot change the queued outcome is dropped
+function recordOp(op) {
     if (!currentUser) return;
+    if (op.op === 'remove_date') {
+        const queued = pendingOps.filter(q => isDateOp(q) && q.date === op.date);
+        const add = queued.find(q => q.op === 'add_date');
+        if (add ? add.list !== op.list || queued.length > 1 : queued.some(q => q.list === op.list)) {
+            return;
+        }
+    }
+    pendingOps = pendingOps.filter(queued => !(
+        (op.op === 'add_date' && isDateOp(queued) && queued.date === op.date) ||
+        (op.op === 'set_counter' && queued.op === 'set_counter') ||
+        (op.op === 'set_field' && queued.op === 'set_field' && queued.field === op.field) ||
+        (op.op === 'set_why' && queued.op === 'set_why' && queued.date === op.date)
+    ));
+    pendingOps.push(op);
+    saveSyncState();
+}
+
+function removeFromList(list, value) {
+    const index = list.indexOf(value);
+    if (index > -1) {
+        list.splice(index, 1);
+    }
+}
+
+// Apply one op to habitData, mirroring the server: a day is either done or
+// not done, so adding it to one list removes it from the other
+function applyOp(data, op) {
+    switch (op.op) {
+        case 'add_date': {
+            const other = op.list === 'completedDates' ? 'notDoneDates' : 'completedDates';
+            removeFromList(data[other], op.date);
+            if (!data[op.list].includes(op.date)) {
+                data[op.list].push(op.date);
+            }
+            break;
+        }
+        case 'remove_date':
+            removeFromList(data[op.list], op.date);
+            break;
+        case 'set_why':
+            data.whyEntries[op.date] = op.text;
+            break;
+        case 'set_counter':
+            data.counter = op.value;
+            break;
+        case 'set_field':
+            data[op.field] = op.value;
+            break;
+    }
+}
+
+// Take the server's copy of the habit. With a window ({from, to}, inclusive
+// ISO dates) the copy only holds those days, and the local days outside it
+// are kept
+function adoptServerData(data, window) {
+    habitData.startedDate = data.startedDate || habitData.startedDate;
+    habitData.frequency = data.frequency || habitData.frequency;
+    habitData.counter = data.counter || 0;
+    if (window) {
+        mergeHistoryWindow(habitData, data, window.from, window.to);
+        return;
+    }
+    habitData.completedDates = data.completedDates || [];
+    habitData.notDoneDates = data.notDoneDates || [];
+    habitData.whyEntries = data.whyEntries || {};
+}
+
+// Replace the days from..to of data's history with those of a window
+function mergeHistoryWindow(data, history, from, to) {
+    const outside = day => day < from || day > to;
+    data.completedDates = data.completedDates.filter(outside).concat(history.completedDates || []);
+    data.notDoneDates = data.notDoneDates.filter(outside).concat(history.notDoneDates || []);
+    const whyEntries = {};
+    Object.keys(data.whyEntries).filter(outside).forEach(day => {
+        whyEntries[day] = data.whyEntries[day];
+    });
+    data.whyEntries = Object.assign(whyEntries, history.whyEntries || {});
+}
+
+function shiftDate(day, days) {
+    const date = new Date(day + 'T00:00:00Z');
+    date.setUTCDate(date.getUTCDate() + days);
+    return date.toISOString().split('T')[0];
+}
+
+// Fetch the history before a day from /api/habits/main/history, one window
+// at a time back to the start date, and merge it into the local copy
+async function loadOlderHistory(before) {
+    let to = shiftDate(before, -1);
+    try {
+        while (to >= habitData.startedDate) {
+            if (!currentUser) return;
+            const from = shiftDate(to, 1 - HISTORY_WINDOW_DAYS);
+            const response = await fetch(`/api/habits/main/history?from=${from}&to=${to}`, {
+                headers: {
+                    'Authorization': `Bearer ${await currentUser.getIdToken()}`
+                }
+            });
+            if (!response.ok) return;
+            mergeHistoryWindow(habitData, (await response.json()).history, from, to);
+            to = shiftDate(from, -1);
+        }
+    } catch (error) {
+        console.error('Error loading older history:', error);
+        return;
+    }
+    // Changes not yet synced still win over what was fetched
+    pendingOps.forEach(op => applyOp(habitData, op));
+    updateUIFromData();
+    saveToLocalStorage();
+    historyComplete = true;
+    saveSyncState();
+}
+
+// Claim the sync slot and build the request body, or return null if a sync
+// is already running
+function beginSync() {
+    if (!currentUser || syncInFlight) return null;
+    
+    syncInFlight = true;
+    showSyncStatus('Syncing...', 'syncing');
+    
+    // Only the ops since the last acknowledged version go up, at most
+    // MAX_OPS_PER_SYNC at a time; the full data is sent once, to be merged
+    // into the server copy on first sync
+    const sentOps = pendingOps.slice(0, MAX_OPS_PER_SYNC);
+    const request = {
+        baseVersion: serverVersion,
+        clientId: getClientId(),
+        ops: sentOps
+    };
+    if (serverVersion === null) {
+        request.habitData = habitData;
+    }
+    return {request, sentOps};
+}
+
+// Apply a sync response (null if the request failed) and release the slot
+function finishSync(sync, result) {
+    syncInFlight = false;
+    
+    if (!result) {
+        showSyncStatus('Sync failed', 'error');
+        return;
+    }
+    if (result.status !== 'success') {
+        showSyncStatus('Sync failed: ' + (result.message || result.error), 'error');
+        return;
+    }
+    
+    // Ops recorded while the request was in flight, or left out of it,
+    // stay queued
+    pendingOps = pendingOps.filter(op => !sync.sentOps.includes(op));
+    
+    if (result.action === 'full') {
+        // First sync or version gap: take the server document,
+        // which already includes our data and the ops we sent
+        adoptServerData(result.data);
+        pendingOps.forEach(op => applyOp(habitData, op));
+        historyComplete = true;
+    } else if (result.ops.length) {
+        // The server applied our ops after the ones we were
+        // missing, so replay ours on top to match its order
+        result.ops.forEach(op => applyOp(habitData, op));
+        sync.sentOps.concat(pendingOps).forEach(op => applyOp(habitData, op));
+    }
+    if (result.action === 'full' || result.ops.length) {
+        updateUIFromData();
+        saveToLocalStorage();
+    }
+    
+    serverVersion = result.version;
+    saveSyncState();
+    
+    lastSyncTime = new Date().toISOString();
+    localStorage.setItem('lastSyncTime', lastSyncTime);
+    showSyncStatus('Synced successfully', 'success');
+    
+    // Send the rest of a queue too long for one request
+    if (sync.sentOps.length === MAX_OPS_PER_SYNC && pendingOps.length) {
+        syncWithFirestore();
+    }
+}
+
+async function syncWithFirestore() {
+    const sync = beginSync();
+    if (!sync) return;
     
     try {
-        showSyncStatus('Syncing...', 'syncing');
-        
         const response = await fetch('/api/sync', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'Authorization': `Bearer ${await currentUser.getIdToken()}`
             },
-            body: JSON.stringify({
-                habitData: habitData,
-                lastSync: lastSyncTime
-            })
+            body: JSON.stringify(sync.request)
         });
         
-        if (response.ok) {
-            const result = await response.json();
-            
-            if (result.status === 'success') {
-                if (result.action === 'server_to_local') {
-                    // Server data is newer, update local
-                    habitData = result.data;
-                    updateUIFromData();
-                    saveToLocalStorage();
-                }
-                
-                lastSyncTime = new Date().toISOString();
-                localStorage.setItem('lastSyncTime', lastSyncTime);
-                showSyncStatus('Synced successfully', 'success');
-            } else {
-                showSyncStatus('Sync failed: ' + result.message, 'error');
-            }
-        } else {
-            showSyncStatus('Sync failed', 'error');
-        }
+        finishSync(sync, response.ok ? await response.json() : null);
     } catch (error) {
         console.error('Sync error:', error);
+        syncInFlight = false;
         showSyncStatus('Sync failed: ' + error.message, 'error');
     }
 }
 
+// On sign-in, load the profile and run the first sync in one round trip
+async function startSession() {
+    const sync = beginSync();
+    const operations = [{id: 'profile', op: 'profile'}];
+    if (sync) {
+        operations.push({id: 'sync', op: 'sync', body: sync.request});
+    }
+    
+    try {
+        const response = await fetch('/api/batch', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${await currentUser.getIdToken()}`
+            },
+            body: JSON.stringify({operations: operations})
+        });
+        const results = response.ok ? (await response.json()).results : [];
+        
+        for (const result of results) {
+            if (result.id === 'profile' && result.status === 200) {
+                userProfile = result.body.profile;
+                updateAuthUI();
+            }
+        }
+        if (sync) {
+            const syncResult = results.find(result => result.id === 'sync');
+            finishSync(sync, syncResult && syncResult.status === 200 ? syncResult.body : null);
+        }
+    } catch (error) {
+        console.error('Session start error:', error);
+        if (sync) {
+            syncInFlight = false;
+            showSyncStatus('Sync failed: ' + error.message, 'error');
+        }
+    }
+}
+
 // Auto-sync every 30 seconds if user is authenticated
 setInterval(() => {
     if (currentUser) {
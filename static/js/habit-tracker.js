@@ -149,6 +149,7 @@ function setupEventListeners() {
                 habitData.counter++;
                 document.getElementById('counter').value = habitData.counter;
             }
+            recordOp({op: 'add_date', list: 'completedDates', date: periodKey});
         } else {
             // Remove from completed dates
             const index = habitData.completedDates.indexOf(periodKey);
@@ -157,7 +158,9 @@ function setupEventListeners() {
                 habitData.counter = Math.max(0, habitData.counter - 1);
                 document.getElementById('counter').value = habitData.counter;
             }
+            recordOp({op: 'remove_date', list: 'completedDates', date: periodKey});
         }
+        recordOp({op: 'set_counter', value: habitData.counter});
         
         updatePercentage();
         saveHabitData();
@@ -186,6 +189,8 @@ function setupEventListeners() {
             if (!habitData.notDoneDates.includes(periodKey)) {
                 habitData.notDoneDates.push(periodKey);
             }
+            recordOp({op: 'add_date', list: 'notDoneDates', date: periodKey});
+            recordOp({op: 'set_counter', value: habitData.counter});
         } else {
             whyField.style.display = 'none';
             
@@ -194,6 +199,7 @@ function setupEventListeners() {
             if (index > -1) {
                 habitData.notDoneDates.splice(index, 1);
             }
+            recordOp({op: 'remove_date', list: 'notDoneDates', date: periodKey});
         }
         
         updatePercentage();
@@ -203,6 +209,7 @@ function setupEventListeners() {
     // Handle frequency change
     document.getElementById('frequency').addEventListener('change', function() {
         habitData.frequency = this.value;
+        recordOp({op: 'set_field', field: 'frequency', value: habitData.frequency});
         updatePercentage();
         saveHabitData();
     });
@@ -221,6 +228,8 @@ function setupEventListeners() {
             habitData.counter = totalPeriods;
             counterField.value = totalPeriods;
         }
+        recordOp({op: 'set_field', field: 'startedDate', value: habitData.startedDate});
+        recordOp({op: 'set_counter', value: habitData.counter});
         
         updatePercentage();
         saveHabitData();
@@ -241,6 +250,7 @@ function setupEventListeners() {
         } else {
             habitData.counter = newValue;
         }
+        recordOp({op: 'set_counter', value: habitData.counter});
         
         updatePercentage();
         saveHabitData();
@@ -250,6 +260,7 @@ function setupEventListeners() {
     document.getElementById('why-text').addEventListener('change', function() {
         const today = new Date().toISOString().split('T')[0];
         habitData.whyEntries[today] = this.value;
+        recordOp({op: 'set_why', date: today, text: this.value});
         saveHabitData();
     });
 
@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import subprocess
+
+
+STATIC_JS = os.path.join(os.path.dirname(__file__), '..', 'static', 'js')
+
+# Runs the page scripts against stubbed browser globals. `before` runs first,
+# in place of the page's inline script; `after` runs once the scripts have
+# loaded. Requests go to respond(url, body), which `before` defines, and are
+# logged in `requests`; Firebase auth callbacks are kept in `authCallbacks`.
+# Once pending promises settle, `result` is evaluated and printed as JSON.
+HARNESS = r'''
+const vm = require('vm');
+const fs = require('fs');
+const [before, after, result, ...files] = process.argv.slice(1);
+
+const stub = new Proxy(function () {}, {
+    get: (target, key) => key === Symbol.toPrimitive ? () => '' : key === 'then' ? undefined : stub,
+    apply: () => stub
+});
+const element = () => ({value: '', checked: false, textContent: '', style: {}, setAttribute: () => {},
+                        addEventListener: () => {}});
+const elements = {};
+const auth = () => ({
+    onAuthStateChanged: callback => context.authCallbacks.push(callback),
+    onIdTokenChanged: () => {}
+});
+auth.GoogleAuthProvider = function () {};
+const storage = new Map();
+const context = vm.createContext({
+    console: {log: console.log, warn: () => {}, error: () => {}},
+    JSON, Math, Date, Promise, encodeURIComponent,
+    firebase: {initializeApp: () => stub, auth: auth, firestore: () => stub},
+    document: {
+        getElementById: id => elements[id] || (elements[id] = element()),
+        addEventListener: () => {},
+        cookie: ''
+    },
+    window: {},
+    location: {protocol: 'http:'},
+    setTimeout: () => 0,
+    clearTimeout: () => {},
+    setInterval: () => 0,
+    localStorage: {
+        getItem: key => storage.has(key) ? storage.get(key) : null,
+        setItem: (key, value) => storage.set(key, String(value)),
+        removeItem: key => storage.delete(key)
+    },
+    fetch: async (url, options) => {
+        const body = options && options.body ? JSON.parse(options.body) : null;
+        context.requests.push({url: url, body: body});
+        return context.respond(url, body);
+    },
+    elements: elements,
+    storage: storage,
+    requests: [],
+    authCallbacks: []
+});
+
+vm.runInContext(before, context);
+for (const file of files) {
+    vm.runInContext(fs.readFileSync(file, 'utf8'), context);
+}
+vm.runInContext(after, context);
+
+(async () => {
+    // Let chained requests run to completion
+    for (let i = 0; i < 100; i++) {
+        await new Promise(resolve => setImmediate(resolve));
+    }
+    console.log(JSON.stringify(vm.runInContext(result, context)));
+})();
+'''
+
+
+def has_node():
+    return shutil.which('node') is not None
+
+
+def run_scripts(before, after, result, files=('habit-tracker.js', 'app.js')):
+    """Run the page scripts under node and return the decoded result"""
+    paths = [os.path.join(STATIC_JS, name) for name in files]
+    output = subprocess.run(['node', '-e', HARNESS, before, after, result] + paths,
+                            capture_output=True, text=True, timeout=30, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
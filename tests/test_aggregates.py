@@ -0,0 +1,257 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest.mock import patch, MagicMock
+from app.models.aggregates import (
+    aggregates_drift, build_aggregates, summarize_aggregates, update_aggregates
+)
+from app.models.analytics import compute_analytics
+from app.models.habit_tracker import HabitTracker
+from app.models.history import HistoryBitmap, DONE, NOT_DONE, UNTRACKED
+from app.models.journal import JournalStore
+from app.services.document_cache import DocumentCache
+from app.services.firebase_service import FirebaseService
+from app.services.sync_protocol import apply_ops
+
+
+TODAY = date(2025, 6, 18)  # a Wednesday
+
+
+def _history(done_offsets=(), not_done_offsets=()):
+    """Build a history from day offsets relative to TODAY (0 = today, 1 = yesterday)"""
+    return HistoryBitmap.from_lists([TODAY - timedelta(days=d) for d in done_offsets],
+                                    [TODAY - timedelta(days=d) for d in not_done_offsets])
+
+
+class TestAggregates(unittest.TestCase):
+    """Tests for the incrementally maintained aggregates block"""
+
+    def test_summary_agrees_with_the_analytics(self):
+        history = _history([0, 1, 2, 5, 6, 7, 8, 20], [3, 4])
+        summary = summarize_aggregates(build_aggregates(history), str(TODAY - timedelta(days=20)), today=TODAY)
+        analytics = compute_analytics(history, str(TODAY - timedelta(days=20)), today=TODAY)
+        for field in ('current_streak', 'longest_streak', 'total_done', 'total_tracked', 'success_rate', 'periods'):
+            self.assertEqual(summary[field], analytics[field], field)
+
+        weekly = summarize_aggregates(build_aggregates(history), str(TODAY - timedelta(days=20)), 'Weekly', TODAY)
+        self.assertEqual(weekly['periods'],
+                         compute_analytics(history, str(TODAY - timedelta(days=20)), 'Weekly', TODAY)['periods'])
+
+    def test_weekly_streaks_agree_with_the_analytics(self):
+        rng = random.Random(3)
+        history = HistoryBitmap()
+        aggregates = build_aggregates(history)
+        for _ in range(500):
+            day = TODAY - timedelta(days=rng.randint(0, 120))
+            state = rng.choice((DONE, DONE, NOT_DONE, UNTRACKED))
+            previous = history.set(day, state)
+            aggregates = (update_aggregates(aggregates, history, day, previous, state)
+                          or build_aggregates(history))
+            self.assertEqual(aggregates_drift(aggregates, history), [])
+
+            summary = summarize_aggregates(aggregates, '2025-01-01', 'Weekly', TODAY)
+            analytics = compute_analytics(history, '2025-01-01', 'Weekly', TODAY)
+            for field in ('current_streak', 'longest_streak', 'periods'):
+                self.assertEqual(summary[field], analytics[field], field)
+
+    def test_eight_weeks_in_a_row_are_an_eight_week_streak(self):
+        sundays = [TODAY - timedelta(days=3, weeks=w) for w in range(8)]
+        summary = summarize_aggregates(build_aggregates(HistoryBitmap.from_lists(sundays)), str(sundays[-1]),
+                                       'Weekly', TODAY)
+        self.assertEqual((summary['current_streak'], summary['longest_streak']), (8, 8))
+
+    def test_blocks_without_week_runs_are_rebuilt(self):
+        aggregates = build_aggregates(_history([1, 2]))
+        del aggregates['weekStreakEnd']
+        history = _history([0, 1, 2])
+        self.assertIsNone(update_aggregates(aggregates, history, TODAY, UNTRACKED, DONE))
+
+    def test_current_streak_survives_an_open_today_only(self):
+        aggregates = build_aggregates(_history([1, 2]))
+        self.assertEqual(summarize_aggregates(aggregates, today=TODAY)['current_streak'], 2)
+        aggregates = build_aggregates(_history([1, 2], [0]))
+        self.assertEqual(summarize_aggregates(aggregates, today=TODAY)['current_streak'], 0)
+
+    def test_daily_tracking_never_needs_a_rebuild(self):
+        history = HistoryBitmap()
+        aggregates = build_aggregates(history)
+        for offset in range(60, -1, -1):
+            day = TODAY - timedelta(days=offset)
+            changes = [(day, NOT_DONE if offset % 9 == 0 else DONE)]
+            if offset % 5 == 0:
+                # Ticked by mistake and undone
+                changes.append((day, UNTRACKED))
+            for change_day, state in changes:
+                previous = history.set(change_day, state)
+                aggregates = update_aggregates(aggregates, history, change_day, previous, state)
+                self.assertIsNotNone(aggregates)
+        self.assertEqual(aggregates_drift(aggregates, history), [])
+
+    def test_incremental_updates_match_a_rebuild(self):
+        rng = random.Random(7)
+        history = HistoryBitmap()
+        aggregates = build_aggregates(history)
+        for _ in range(2000):
+            day = TODAY - timedelta(days=rng.randint(0, 40))
+            state = rng.choice((DONE, DONE, NOT_DONE, UNTRACKED))
+            previous = history.set(day, state)
+            aggregates = (update_aggregates(aggregates, history, day, previous, state)
+                          or build_aggregates(history))
+            self.assertEqual(aggregates_drift(aggregates, history), [])
+
+    def test_drift_is_detected(self):
+        aggregates = build_aggregates(_history([0, 1]))
+        aggregates['longestStreak'] = 5
+        self.assertEqual(aggregates_drift(aggregates, _history([0, 1])), ['longestStreak'])
+        self.assertIn('done', aggregates_drift(None, _history([0, 1])))
+
+    def test_ops_carry_the_aggregates_or_drop_them(self):
+        doc = {'history': _history([2, 3]).to_dict(), 'aggregates': build_aggregates(_history([2, 3]))}
+        day = str(TODAY - timedelta(days=1))
+
+        result, updates = apply_ops(doc, [{'op': 'add_date', 'list': 'completedDates', 'date': day}])
+        self.assertEqual(updates['aggregates']['longestStreak'], 3)
+        self.assertEqual(result['aggregates'], updates['aggregates'])
+
+        # Splitting the longest run needs the other runs before it
+        doc = {'history': _history([1, 5, 6, 7]).to_dict(), 'aggregates': build_aggregates(_history([1, 5, 6, 7]))}
+        result, updates = apply_ops(doc, [{'op': 'remove_date', 'list': 'completedDates',
+                                           'date': str(TODAY - timedelta(days=6))}])
+        self.assertNotIn('aggregates', updates)
+        self.assertNotIn('aggregates', result)
+
+
+class TestTrackerAggregates(unittest.TestCase):
+    """Tests for the aggregates of a local HabitTracker"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'habit_data.json')
+
+    def tearDown(self):
+        JournalStore.for_path(self.path).close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_toggles_keep_the_aggregates_current(self):
+        tracker = HabitTracker(self.path)
+        tracker.toggle_today()
+        self.assertEqual(tracker.get_aggregates()['done'], 1)
+        self.assertEqual(tracker.get_summary()['current_streak'], 1)
+        self.assertEqual(tracker.get_success_percentage(), 100)
+
+        JournalStore.for_path(self.path).sync()
+        self.assertEqual(HabitTracker(self.path).get_aggregates()['done'], 1)
+
+    def test_compaction_repairs_drift(self):
+        tracker = HabitTracker(self.path)
+        tracker.toggle_today()
+        tracker.data['aggregates']['done'] = 7
+        tracker._save_data()
+        self.assertEqual(tracker.get_aggregates()['done'], 1)
+
+
+class TestStoredAggregates(unittest.TestCase):
+    """Tests for the aggregates kept on a Firestore habit head"""
+
+    def setUp(self):
+        self.head = {'counter': 3, 'version': 7, 'shards': {'2024': {'done': 1, 'notDone': 0},
+                                                           '2025': {'done': 1, 'notDone': 0}}}
+        self.shards = {year: {'history': HistoryBitmap.from_lists([f'{year}-03-01']).to_dict(), 'whyEntries': {}}
+                       for year in ('2024', '2025')}
+        self.head_snapshot = MagicMock(exists=True, update_time='t1')
+        self.head_snapshot.to_dict.side_effect = lambda: dict(self.head)
+        self.habit_ref = MagicMock(path='users/user-1/habits/main')
+        self.habit_ref.get.return_value = self.head_snapshot
+        self.habit_ref.collection.side_effect = self._collection
+
+        self.service = FirebaseService.__new__(FirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = DocumentCache()
+        self.service.flights = None
+        self.service.db = MagicMock()
+        self.service.db.collection.return_value.document.return_value \
+            .collection.return_value.document.return_value = self.habit_ref
+        self.service.db.get_all.side_effect = lambda refs, timeout=None: [self._snapshot(ref) for ref in refs]
+
+    def _collection(self, name):
+        collection = MagicMock()
+        collection.document.side_effect = \
+            lambda doc_id: MagicMock(path=f'users/user-1/habits/main/{name}/{doc_id}', id=doc_id)
+        return collection
+
+    def _snapshot(self, ref):
+        snapshot = MagicMock(exists=True, reference=ref)
+        snapshot.to_dict.return_value = self.shards[ref.id]
+        return snapshot
+
+    def test_ops_sync_without_aggregates_rebuilds_from_every_year(self):
+        transaction = MagicMock()
+        transaction.get_all.side_effect = lambda refs, timeout=None: [self._snapshot(ref) for ref in refs]
+        self.service.db.transaction.return_value = transaction
+        firestore = MagicMock()
+        firestore.transactional = lambda fn: fn
+
+        with patch('app.services.firebase_service._firestore', return_value=firestore):
+            self.service.sync_habit_ops('user-1', 7, [
+                {'op': 'add_date', 'list': 'completedDates', 'date': '2025-03-02'}
+            ])
+
+        reads = [[ref.id for ref in call[0][0]] for call in transaction.get_all.call_args_list]
+        self.assertEqual(reads, [['2025'], ['2024']])
+        head_writes = [call[0][1] for call in transaction.set.call_args_list if call[0][0] is self.habit_ref][0]
+        self.assertEqual(head_writes['aggregates']['done'], 3)
+        self.assertEqual(head_writes['aggregates']['streakStart'], '2025-03-01')
+
+    def test_save_ignores_client_aggregates(self):
+        with patch('app.services.firebase_service._firestore', return_value=MagicMock()):
+            self.service.save_habit_data('user-1', {'completedDates': ['2025-03-01', '2025-03-02'],
+                                                    'aggregates': {'done': 1000}})
+        # The saved list replaces every stored completion
+        head_writes = [call[0][1] for call in self.service.db.batch.return_value.set.call_args_list
+                       if call[0][0] is self.habit_ref][0]
+        self.assertEqual(head_writes['aggregates']['done'], 2)
+
+    def test_verifier_repairs_drift_if_the_habit_is_unchanged(self):
+        self.head['aggregates'] = dict(build_aggregates(HistoryBitmap.from_lists(['2024-03-01', '2025-03-01'])),
+                                       done=9)
+        self.assertEqual(self.service.verify_habit_aggregates('user-1'), ['done'])
+
+        batch = self.service.db.batch.return_value
+        ref, fields = batch.update.call_args[0]
+        self.assertIs(ref, self.habit_ref)
+        self.assertEqual(fields['aggregates']['done'], 2)
+        self.service.db.write_option.assert_called_once_with(last_update_time='t1')
+        # The dashboard summary gets the repaired figures in the same batch
+        summary = batch.set.call_args[0][1]
+        self.assertEqual(summary['habits'][self.habit_ref.id]['aggregates']['done'], 2)
+        batch.commit.assert_called_once_with(timeout=5)
+
+        self.head['aggregates']['done'] = 2
+        self.service.document_cache.invalidate(self.habit_ref.path)
+        self.assertEqual(self.service.verify_habit_aggregates('user-1'), [])
+
+    def test_analytics_reads_only_check_a_sample_of_current_blocks(self):
+        self.head['aggregates'] = dict(build_aggregates(HistoryBitmap.from_lists(['2024-03-01', '2025-03-01'])),
+                                       done=9)
+        with patch('app.services.firebase_service.random.random', return_value=0.5):
+            self.assertIsNotNone(self.service.get_habit_analytics('user-1'))
+        self.service.db.batch.assert_not_called()
+
+        self.service.document_cache.invalidate(self.habit_ref.path)
+        with patch('app.services.firebase_service.random.random', return_value=0.0):
+            self.service.get_habit_analytics('user-1')
+        fields = self.service.db.batch.return_value.update.call_args[0][1]
+        self.assertEqual(fields['aggregates']['done'], 2)
+
+    def test_analytics_reads_rebuild_a_stale_block(self):
+        with patch('app.services.firebase_service.random.random', return_value=0.5):
+            self.service.get_habit_analytics('user-1')
+        fields = self.service.db.batch.return_value.update.call_args[0][1]
+        self.assertEqual(fields['aggregates']['done'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import unittest
+import random
+import time
+from datetime import date, timedelta
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+from app.models import analytics
+from app.models.analytics import compute_analytics
+from app.models.history import HistoryBitmap, DONE, NOT_DONE
+
+
+TODAY = date(2025, 6, 18)  # a Wednesday
+
+
+def _history(done_offsets=(), not_done_offsets=()):
+    """Build a history from day offsets relative to TODAY (0 = today, 1 = yesterday)"""
+    return HistoryBitmap.from_lists([TODAY - timedelta(days=d) for d in done_offsets],
+                                    [TODAY - timedelta(days=d) for d in not_done_offsets])
+
+
+class TestAnalytics(unittest.TestCase):
+    """Behavioral tests for the history analytics engine"""
+
+    def setUp(self):
+        analytics.clear_cache()
+
+    def test_empty_history(self):
+        result = compute_analytics(HistoryBitmap(), today=TODAY)
+        self.assertEqual(result['current_streak'], 0)
+        self.assertEqual(result['longest_streak'], 0)
+        self.assertIsNone(result['rolling']['7d']['rate'])
+
+    def test_current_streak_includes_today(self):
+        result = compute_analytics(_history([0, 1, 2, 4]), today=TODAY)
+        self.assertEqual(result['current_streak'], 3)
+
+    def test_current_streak_survives_untracked_today(self):
+        """Test that an open today does not break yesterday's streak"""
+        result = compute_analytics(_history([1, 2]), today=TODAY)
+        self.assertEqual(result['current_streak'], 2)
+
+    def test_not_done_today_breaks_streak(self):
+        result = compute_analytics(_history([1, 2], [0]), today=TODAY)
+        self.assertEqual(result['current_streak'], 0)
+
+    def test_longest_streak(self):
+        result = compute_analytics(_history([0, 10, 11, 12, 13, 20, 21]), today=TODAY)
+        self.assertEqual(result['longest_streak'], 4)
+
+    def test_rolling_windows(self):
+        result = compute_analytics(_history([0, 1, 2, 10, 40], [3, 50]), today=TODAY)
+        self.assertEqual(result['rolling']['7d'], {'done': 3, 'tracked': 4, 'rate': 75})
+        self.assertEqual(result['rolling']['30d'], {'done': 4, 'tracked': 5, 'rate': 80})
+        self.assertEqual(result['rolling']['90d'], {'done': 5, 'tracked': 7, 'rate': 71})
+
+    def test_future_days_are_ignored(self):
+        history = _history([0])
+        history.set(TODAY + timedelta(days=3), DONE)
+        result = compute_analytics(history, today=TODAY)
+        self.assertEqual(result['total_done'], 1)
+
+    def test_weekday_histogram(self):
+        # TODAY is a Wednesday; offsets 0 and 7 are Wednesdays, 1 is a Tuesday
+        result = compute_analytics(_history([0, 1, 7]), today=TODAY)
+        self.assertEqual(result['weekday_histogram']['Wednesday'], 2)
+        self.assertEqual(result['weekday_histogram']['Tuesday'], 1)
+        self.assertEqual(sum(result['weekday_histogram'].values()), 3)
+
+    def test_daily_periods(self):
+        start = str(TODAY - timedelta(days=9))
+        result = compute_analytics(_history([0, 1, 12]), start, 'Daily', today=TODAY)
+        self.assertEqual(result['periods'], {'frequency': 'Daily', 'total': 10, 'completed': 2, 'rate': 20})
+
+    def test_weekly_periods(self):
+        """Test that weeks run Sunday to Saturday and count once when any day is done"""
+        start = '2025-06-01'  # a Sunday, so the 18th is in week 3
+        history = HistoryBitmap.from_lists(['2025-06-02', '2025-06-03', '2025-06-16'])
+        result = compute_analytics(history, start, 'Weekly', today=TODAY)
+        self.assertEqual(result['periods'], {'frequency': 'Weekly', 'total': 3, 'completed': 2, 'rate': 67})
+
+    def test_weekly_streaks_count_weeks(self):
+        """Test that a Weekly habit's streaks are runs of weeks with a done day"""
+        sundays = [date(2025, 6, 15) - timedelta(weeks=w) for w in range(8)]
+        result = compute_analytics(HistoryBitmap.from_lists(sundays), '2025-04-20', 'Weekly', today=TODAY)
+        self.assertEqual((result['current_streak'], result['longest_streak']), (8, 8))
+
+        # This week is still open; last week keeps the streak alive until it is tracked
+        result = compute_analytics(HistoryBitmap.from_lists(sundays[1:]), '2025-04-20', 'Weekly', today=TODAY)
+        self.assertEqual((result['current_streak'], result['longest_streak']), (7, 7))
+        result = compute_analytics(HistoryBitmap.from_lists(sundays[1:4] + sundays[5:], [sundays[0]]),
+                                   '2025-04-20', 'Weekly', today=TODAY)
+        self.assertEqual((result['current_streak'], result['longest_streak']), (0, 3))
+
+    def test_matches_reference_on_random_history(self):
+        """Test the bit-string engine against a straightforward date walk"""
+        rng = random.Random(42)
+        days = [TODAY - timedelta(days=i) for i in range(400)]
+        states = {day: rng.choice([DONE, DONE, NOT_DONE, 0]) for day in days}
+        history = HistoryBitmap()
+        for day, state in states.items():
+            if state:
+                history.set(day, state)
+        result = compute_analytics(history, today=TODAY)
+
+        longest = run = 0
+        for day in sorted(days):
+            run = run + 1 if states[day] == DONE else 0
+            longest = max(longest, run)
+        window = [d for d in days if (TODAY - d).days < 30]
+        done_30 = sum(1 for d in window if states[d] == DONE)
+        tracked_30 = sum(1 for d in window if states[d])
+
+        self.assertEqual(result['longest_streak'], longest)
+        self.assertEqual(result['rolling']['30d']['done'], done_30)
+        self.assertEqual(result['rolling']['30d']['tracked'], tracked_30)
+        self.assertEqual(result['total_done'], history.done_count)
+
+    def test_results_are_memoised_per_version(self):
+        history = _history([0, 1])
+        compute_analytics(history, today=TODAY)
+        compute_analytics(history, today=TODAY)
+        self.assertEqual(analytics._compute.cache_info().hits, 1)
+
+        history.set(TODAY - timedelta(days=2), DONE)
+        self.assertEqual(compute_analytics(history, today=TODAY)['current_streak'], 3)
+
+
+class TestAnalyticsBenchmark(unittest.TestCase):
+    """Benchmark: multi-year histories must be analysed in well under a millisecond"""
+
+    def test_five_year_history_under_one_millisecond(self):
+        rng = random.Random(7)
+        history = HistoryBitmap()
+        for i in range(5 * 365):
+            roll = rng.random()
+            if roll < 0.7:
+                history.set(TODAY - timedelta(days=i), DONE)
+            elif roll < 0.9:
+                history.set(TODAY - timedelta(days=i), NOT_DONE)
+        start = str(TODAY - timedelta(days=5 * 365))
+
+        timings = []
+        for frequency in ('Daily', 'Weekly') * 25:
+            analytics.clear_cache()
+            began = time.perf_counter()
+            compute_analytics(history, start, frequency, today=TODAY)
+            timings.append(time.perf_counter() - began)
+        timings.sort()
+        median_ms = timings[len(timings) // 2] * 1000
+
+        calls = 1000
+        began = time.perf_counter()
+        for _ in range(calls):
+            compute_analytics(history, start, 'Daily', today=TODAY)
+        memoised_ms = (time.perf_counter() - began) * 1000 / calls
+
+        print(f"\nanalytics: 5-year history cold median {median_ms:.3f} ms, "
+              f"memoised {memoised_ms:.4f} ms/call")
+        self.assertLess(median_ms, 1.0)
+        self.assertLess(memoised_ms, 0.05)
+
+
+class TestPremiumAnalyticsEndpoint(unittest.TestCase):
+    """Test that /api/premium-feature returns real analytics"""
+
+    def test_premium_feature_returns_analytics(self):
+        app = create_app()
+        client = app.test_client()
+        auth.token_cache.clear()
+
+        history = HistoryBitmap.from_lists([str(date.today())])
+        service = MagicMock()
+        service.verify_token.return_value = {'uid': 'user-1', 'exp': time.time() + 3600}
+        service.get_user_profile.return_value = {'subscription_tier': 'premium'}
+        service.get_habit_analytics.return_value = compute_analytics(history, str(date.today()))
+
+        with patch('app.services.registry.FirebaseService', return_value=service):
+            response = client.get('/api/premium-feature', headers={'Authorization': 'Bearer token'})
+        auth.token_cache.clear()
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['analytics']['current_streak'], 1)
+        self.assertIn('7d', data['analytics']['rolling'])
+
+
+if __name__ == '__main__':
+    unittest.main()
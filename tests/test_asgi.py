@@ -0,0 +1,200 @@
+import unittest
+import asyncio
+import json
+import time
+from unittest.mock import patch, AsyncMock, MagicMock
+from app import create_app
+from app.asgi import create_asgi_app
+from app.middleware import auth
+from app.models.aggregates import build_aggregates
+from app.models.history import HistoryBitmap
+from app.services.async_firebase_service import AsyncFirebaseService
+from app.services.document_cache import DocumentCache
+
+
+def _call(app, scope, body=b''):
+    """Run one ASGI request; returns (status, payload)"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = sent[0]['status']
+    payload = json.loads(b''.join(m.get('body', b'') for m in sent[1:]) or b'null')
+    return status, payload, dict(sent[0]['headers'])
+
+
+def _scope(method, path, headers=None):
+    return {
+        'type': 'http', 'method': method, 'path': path,
+        'headers': [(name.encode(), value.encode()) for name, value in (headers or {}).items()]
+    }
+
+
+class RecordingFallback:
+    """ASGI app standing in for the WSGI app, recording what reaches it"""
+
+    def __init__(self):
+        self.requests = []
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        self.requests.append((scope['path'], message.get('body', b'')))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'{"served": "flask"}'})
+
+
+class TestAsgiApp(unittest.TestCase):
+    """Tests for the ASGI entry point"""
+
+    def setUp(self):
+        auth.token_cache.clear()
+        self.fallback = RecordingFallback()
+        self.app = create_asgi_app(create_app(), fallback=self.fallback)
+        self.service = MagicMock()
+        self.service.verify_token = AsyncMock(return_value={'uid': 'user-1', 'exp': time.time() + 3600})
+        self.service.sync_habit_ops = AsyncMock(
+            return_value={'status': 'success', 'action': 'delta', 'version': 3, 'ops': []})
+        self.app._service = self.service
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _sync(self, body, headers=None):
+        headers = {'authorization': 'Bearer token', **(headers or {})}
+        return _call(self.app, _scope('POST', '/api/sync', headers), json.dumps(body).encode())
+
+    def test_delta_sync_is_served_on_the_event_loop(self):
+        status, payload, _ = self._sync({'baseVersion': 2, 'clientId': 'c1', 'ops': [
+            {'op': 'add_date', 'list': 'completedDates', 'date': '2025-01-02'}
+        ]})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(payload['version'], 3)
+        self.assertEqual(self.fallback.requests, [])
+        args, kwargs = self.service.sync_habit_ops.call_args
+        self.assertEqual(args[:2], ('user-1', 2))
+        self.assertEqual(kwargs['client_id'], 'c1')
+
+    def test_token_is_verified_once(self):
+        self._sync({'baseVersion': 2, 'ops': []})
+        self._sync({'baseVersion': 2, 'ops': []})
+        self.assertEqual(self.service.verify_token.await_count, 1)
+
+    def test_rejections_match_the_flask_route(self):
+        status, payload, _ = _call(self.app, _scope('POST', '/api/sync'), b'{"baseVersion": 2}')
+        self.assertEqual((status, payload['error']), (401, 'Missing or invalid authorization header'))
+
+        status, _, _ = self._sync({'baseVersion': 2, 'ops': [{'op': 'drop_table'}]})
+        self.assertEqual(status, 400)
+
+        self.service.verify_token.return_value = None
+        auth.token_cache.clear()
+        status, _, _ = self._sync({'baseVersion': 2, 'ops': []})
+        self.assertEqual(status, 401)
+        self.service.sync_habit_ops.assert_not_awaited()
+
+    def test_full_sync_is_replayed_to_flask(self):
+        body = {'habitData': {'counter': 1}, 'lastSync': None}
+        _, payload, _ = self._sync(body)
+
+        self.assertEqual(payload, {'served': 'flask'})
+        self.assertEqual(self.fallback.requests, [('/api/sync', json.dumps(body).encode())])
+
+    def test_other_requests_go_to_flask(self):
+        _call(self.app, _scope('GET', '/api/profile'))
+        self.assertEqual([path for path, _ in self.fallback.requests], ['/api/profile'])
+
+    def test_allowed_origin_gets_cors_headers(self):
+        _, _, headers = self._sync({'baseVersion': 2, 'ops': []}, {'origin': 'http://localhost:5001'})
+        self.assertEqual(headers[b'access-control-allow-origin'], b'http://localhost:5001')
+
+        _, _, headers = self._sync({'baseVersion': 2, 'ops': []}, {'origin': 'https://evil.example'})
+        self.assertNotIn(b'access-control-allow-origin', headers)
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class TestAsyncFirebaseService(unittest.TestCase):
+    """Tests for delta sync on the asyncio Firestore client"""
+
+    def setUp(self):
+        self.head = {'counter': 3, 'version': 7, 'shards': {'2024': {'done': 1, 'notDone': 0},
+                                                           '2025': {'done': 1, 'notDone': 0}}}
+        self.shards = {year: {'history': HistoryBitmap.from_lists([f'{year}-01-01']).to_dict(), 'whyEntries': {}}
+                       for year in ('2024', '2025')}
+        self.head['aggregates'] = build_aggregates(HistoryBitmap.from_lists(['2024-01-01', '2025-01-01']))
+        head_snapshot = MagicMock(exists=True)
+        head_snapshot.to_dict.side_effect = lambda: dict(self.head)
+        self.habit_ref = MagicMock(path='users/user-1/habits/main')
+        self.habit_ref.get = AsyncMock(return_value=head_snapshot)
+        self.habit_ref.collection.side_effect = self._collection
+        self.transaction = MagicMock()
+
+        self.service = AsyncFirebaseService.__new__(AsyncFirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = DocumentCache()
+        self.service.db = MagicMock()
+        self.service.db.collection.return_value.document.return_value \
+            .collection.return_value.document.return_value = self.habit_ref
+        self.service.db.transaction.return_value = self.transaction
+        self.service.db.get_all.side_effect = self._get_all
+
+    def _collection(self, name):
+        collection = MagicMock()
+        collection.document.side_effect = \
+            lambda doc_id: MagicMock(path=f'users/user-1/habits/main/{name}/{doc_id}', id=doc_id)
+        return collection
+
+    async def _get_all(self, refs, transaction=None, timeout=None):
+        for ref in refs:
+            snapshot = MagicMock(exists=True, reference=ref)
+            snapshot.to_dict.return_value = self.shards[ref.id]
+            yield snapshot
+
+    def test_ops_sync_touches_only_the_current_shard(self):
+        firestore = MagicMock()
+        firestore.async_transactional = lambda fn: fn
+        self.service.document_cache.put(self.habit_ref.path, {'stale': True}, 't1')
+
+        with patch('app.services.async_firebase_service._async_firestore', return_value=firestore):
+            result = asyncio.run(self.service.sync_habit_ops('user-1', 7, [
+                {'op': 'add_date', 'list': 'completedDates', 'date': '2025-03-02'}
+            ]))
+
+        self.assertEqual(result, {'status': 'success', 'action': 'delta', 'version': 8, 'ops': []})
+        self.assertEqual([ref.id for ref in self.service.db.get_all.call_args[0][0]], ['2025'])
+        shard_writes = [call[0][0] for call in self.transaction.set.call_args_list if 'history/' in call[0][0].path]
+        self.assertEqual([ref.id for ref in shard_writes], ['2025'])
+        head_writes = [call for call in self.transaction.set.call_args_list if call[0][0] is self.habit_ref][0]
+        self.assertEqual(head_writes[0][1]['shards'], {'2025': {'done': 2, 'notDone': 0}})
+        self.assertIsNone(self.service.document_cache.get(self.habit_ref.path))
+
+    def test_errors_come_back_as_an_error_response(self):
+        self.habit_ref.get.side_effect = RuntimeError('deadline exceeded')
+        firestore = MagicMock()
+        firestore.async_transactional = lambda fn: fn
+
+        with patch('app.services.async_firebase_service._async_firestore', return_value=firestore):
+            result = asyncio.run(self.service.sync_habit_ops('user-1', 7, []))
+        self.assertEqual(result, {'status': 'error', 'message': 'deadline exceeded'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import json
+import threading
+import time
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+
+
+class TestBatchApi(unittest.TestCase):
+    """Tests for /api/batch"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+
+        self.service = MagicMock()
+        self.service.verify_token.return_value = {'uid': 'user-1', 'exp': time.time() + 3600}
+        self.service.get_user_profile.return_value = {'subscription_tier': 'free'}
+        self.service.get_user_habits.return_value = [{'id': 'main'}]
+        self.service.sync_habit_ops.return_value = {'status': 'success', 'action': 'delta', 'version': 3, 'ops': []}
+        self.service.save_habit_data.return_value = True
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _post(self, body):
+        with patch('app.services.registry.FirebaseService', return_value=self.service):
+            return self.client.post('/api/batch', data=json.dumps(body), content_type='application/json',
+                                    headers={'Authorization': 'Bearer token'})
+
+    def test_results_come_back_in_request_order(self):
+        response = self._post({'operations': [
+            {'id': 'profile', 'op': 'profile'},
+            {'id': 'sync', 'op': 'sync', 'body': {'baseVersion': 2, 'ops': []}},
+            {'id': 'nope', 'op': 'delete_everything'}
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual([r['id'] for r in results], ['profile', 'sync', 'nope'])
+        self.assertEqual([r['status'] for r in results], [200, 200, 400])
+        self.assertEqual(results[0]['body']['profile']['subscription_tier'], 'free')
+        self.assertEqual(results[1]['body']['version'], 3)
+
+    def test_token_is_verified_once(self):
+        self._post({'operations': [{'op': 'profile'}, {'op': 'habits'}]})
+        self.assertEqual(self.service.verify_token.call_count, 1)
+
+    def test_independent_reads_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=2)
+
+        def after_both_started(result):
+            # Deadlocks (and times out) unless both reads are in flight at once
+            def read(user_id, *page):
+                barrier.wait()
+                return result
+            return read
+
+        self.service.get_user_profile.side_effect = after_both_started({'subscription_tier': 'free'})
+        self.service.get_user_habits.side_effect = after_both_started([])
+
+        response = self._post({'operations': [{'op': 'profile'}, {'op': 'habits'}]})
+        self.assertEqual([r['status'] for r in response.get_json()['results']], [200, 200])
+
+    def test_writes_to_the_same_document_keep_their_order(self):
+        calls = []
+        self.service.save_habit_data.side_effect = lambda user_id, data: calls.append('save') or True
+        self.service.get_user_habits.side_effect = lambda user_id, *page: calls.append('habits') or []
+
+        self._post({'operations': [
+            {'op': 'save', 'body': {'counter': 1}},
+            {'op': 'habits'}
+        ]})
+        self.assertEqual(calls, ['save', 'habits'])
+
+    def test_failed_operation_does_not_fail_the_batch(self):
+        self.service.get_user_habits.side_effect = RuntimeError('deadline exceeded')
+        response = self._post({'operations': [{'op': 'profile'}, {'op': 'habits'}]})
+        self.assertEqual([r['status'] for r in response.get_json()['results']], [200, 500])
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self._post({'operations': []}).status_code, 400)
+        self.assertEqual(self._post({'operations': [{'op': 'profile'}] * 11}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
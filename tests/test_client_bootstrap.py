@@ -0,0 +1,102 @@
+import unittest
+import json
+from tests.node_harness import has_node, run_scripts
+
+
+LOCAL = {'startedDate': '2024-06-01', 'frequency': 'Daily', 'counter': 2,
+         'completedDates': ['2024-12-31', '2025-01-02', '2025-01-04'], 'notDoneDates': [],
+         'whyEntries': {'2024-12-30': 'ill', '2025-01-04': 'sent'}}
+
+BOOTSTRAP = {
+    'uid': 'user-1',
+    'profile': {'subscription_tier': 'free'},
+    'habit': {'startedDate': '2024-06-01', 'frequency': 'Daily', 'counter': 5,
+              'completedDates': ['2025-01-05'], 'notDoneDates': [], 'whyEntries': {}, 'version': 9},
+    'version': 9,
+    'window': {'from': '2025-01-03', 'to': '2025-04-02'}
+}
+
+# What /api/habits/main/history holds before the window
+OLDER = {'completedDates': ['2024-07-01'], 'notDoneDates': ['2024-12-30'], 'whyEntries': {'2024-12-30': 'flu'}}
+
+RESULT = r'''({
+    requests: requests,
+    habitData: habitData,
+    serverVersion: serverVersion
+})'''
+
+
+@unittest.skipUnless(has_node(), 'node is needed to run app.js')
+class TestClientBootstrap(unittest.TestCase):
+    """Tests for how the page's embedded bootstrap is used on sign-in"""
+
+    def _sign_in(self, sync_state=None, signed_in=True):
+        before = f'''
+            var habitData = {json.dumps(LOCAL)};
+            elements['bootstrap-data'] = {{textContent: {json.dumps(json.dumps(BOOTSTRAP))}}};
+            storage.set('habitData', {json.dumps(json.dumps(LOCAL))});
+            if ({json.dumps(sync_state)}) {{
+                storage.set('syncState:user-1', {json.dumps(json.dumps(sync_state))});
+            }}
+            var respond = async (url, body) => url.startsWith('/api/habits/main/history') ?
+                {{ok: true, json: async () => ({{history: {json.dumps(OLDER)}}})}} :
+                ({{ok: true, json: async () => ({{results: [
+                {{id: 'profile', status: 200, body: {{profile: {{subscription_tier: 'free'}}}}}},
+                {{id: 'sync', status: 200, body: {{status: 'success', action: 'full', version: 10,
+                  data: Object.assign({{}}, body.operations[1].body.habitData, {{counter: 6}})}}}}
+            ]}})}});
+        '''
+        after = "authCallbacks.forEach(callback => callback({uid: 'user-1', getIdToken: async () => 'token'}))"
+        return run_scripts(before, after if signed_in else '', RESULT)
+
+    def test_a_device_that_never_synced_merges_its_data_first(self):
+        result = self._sign_in()
+
+        # The bootstrap is skipped, so the local days go up for the first merge
+        self.assertEqual([request['url'] for request in result['requests']], ['/api/batch'])
+        sync = result['requests'][0]['body']['operations'][1]['body']
+        self.assertIsNone(sync['baseVersion'])
+        self.assertEqual(sync['habitData']['completedDates'], LOCAL['completedDates'])
+        self.assertEqual(result['serverVersion'], 10)
+
+    def test_a_synced_device_skips_the_round_trip(self):
+        result = self._sign_in({'version': 8, 'pendingOps': [], 'historyComplete': True})
+
+        self.assertEqual(result['requests'], [])
+        self.assertEqual(result['serverVersion'], 9)
+        self.assertEqual(result['habitData']['counter'], 5)
+
+
+    def test_the_page_shows_the_bootstrap_before_auth_fires(self):
+        queued = {'op': 'add_date', 'list': 'notDoneDates', 'date': '2025-01-06'}
+        result = self._sign_in({'version': 8, 'pendingOps': [queued]}, signed_in=False)
+
+        self.assertEqual(result['habitData']['counter'], 5)
+        self.assertEqual(result['habitData']['notDoneDates'], ['2025-01-06'])
+        self.assertEqual(result['requests'], [])
+
+        # Only the window's days are replaced; older local days are kept
+        self.assertEqual(result['habitData']['completedDates'], ['2024-12-31', '2025-01-02', '2025-01-05'])
+        self.assertEqual(result['habitData']['whyEntries'], {'2024-12-30': 'ill'})
+
+    def test_a_cut_down_copy_fetches_the_older_history(self):
+        result = self._sign_in({'version': 8, 'pendingOps': []})
+
+        # One window reaches back past the start date
+        self.assertEqual([request['url'] for request in result['requests']],
+                         ['/api/habits/main/history?from=2024-01-03&to=2025-01-02'])
+        habit = result['habitData']
+        self.assertEqual(sorted(habit['completedDates']), ['2024-07-01', '2025-01-05'])
+        self.assertEqual(habit['notDoneDates'], ['2024-12-30'])
+        self.assertEqual(habit['whyEntries'], {'2024-12-30': 'flu'})
+
+        result = self._sign_in({'version': 8, 'pendingOps': [], 'historyComplete': True})
+        self.assertEqual(result['requests'], [])
+
+    def test_a_device_that_never_synced_keeps_its_data_on_load(self):
+        result = self._sign_in(signed_in=False)
+        self.assertEqual(result['habitData'], LOCAL)
+
+
+if __name__ == '__main__':
+    unittest.main()
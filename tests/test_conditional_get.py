@@ -0,0 +1,108 @@
+import unittest
+import time
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+from app.services.firebase_service import FirebaseService
+
+
+class TestConditionalGet(unittest.TestCase):
+    """Tests for ETag / If-None-Match handling on /api/habits and /api/profile"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+
+        self.service = MagicMock()
+        self.service.verify_token.return_value = {'uid': 'user-1', 'exp': time.time() + 3600}
+        self.service.get_habits_etag.return_value = 'v1'
+        self.service.get_user_habits.return_value = [{'id': 'main', 'counter': 3}]
+        self.service.get_profile_etag.return_value = 'p1'
+        self.service.get_user_profile.return_value = {'subscription_tier': 'free'}
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _get(self, url, etag=None):
+        headers = {'Authorization': 'Bearer token'}
+        if etag:
+            headers['If-None-Match'] = f'"{etag}"'
+        with patch('app.services.registry.FirebaseService', return_value=self.service):
+            return self.client.get(url, headers=headers)
+
+    def test_habits_carry_a_strong_etag(self):
+        response = self._get('/api/habits')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['ETag'], '"v1"')
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertEqual(response.get_json()['habits'][0]['counter'], 3)
+
+    def test_matching_etag_returns_304_without_reading(self):
+        response = self._get('/api/habits', etag='v1')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.service.get_user_habits.assert_not_called()
+
+    def test_unchanged_documents_are_served_from_cache(self):
+        # The listing is streamed, so it is cached once the body has been read
+        first = self._get('/api/habits').data
+        second = self._get('/api/habits').data
+        self.assertEqual(first, second)
+        self.assertEqual(self.service.get_user_habits.call_count, 1)
+
+        # A new validator means the documents changed
+        self.service.get_habits_etag.return_value = 'v2'
+        self.service.get_user_habits.return_value = [{'id': 'main', 'counter': 4}]
+        third = self._get('/api/habits', etag='v1')
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.get_json()['habits'][0]['counter'], 4)
+
+    def test_profile_conditional_get(self):
+        self.assertEqual(self._get('/api/profile').headers['ETag'], '"p1"')
+        self.assertEqual(self._get('/api/profile', etag='p1').status_code, 304)
+
+    def test_new_profile_has_no_etag_yet(self):
+        self.service.get_profile_etag.return_value = None
+        response = self._get('/api/profile')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_missing_profile(self):
+        self.service.get_profile_etag.return_value = None
+        self.service.get_user_profile.return_value = None
+        self.assertEqual(self._get('/api/profile').status_code, 404)
+
+    def test_a_write_during_the_load_leaves_the_body_untagged(self):
+        # The profile is rewritten between the validator read and the body read
+        self.service.get_profile_etag.side_effect = ['p1', 'p2', 'p2', 'p2']
+        first = self._get('/api/profile')
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('ETag', first.headers)
+
+        # Nothing was cached under p1, and the next load is tagged as usual
+        second = self._get('/api/profile')
+        self.assertEqual(second.headers['ETag'], '"p2"')
+        self.assertEqual(self.service.get_user_profile.call_count, 2)
+
+    def test_etag_follows_update_time(self):
+        snapshot = MagicMock(id='main', update_time='2025-01-01T00:00:00.000000001Z')
+        service = FirebaseService.__new__(FirebaseService)
+        service.timeout = 5
+        service.document_cache = None
+        service.flights = None
+        service.db = MagicMock()
+        query = service.db.collection.return_value.document.return_value.collection.return_value.order_by.return_value.select
+        query.return_value.stream.return_value = [snapshot]
+
+        first = service.get_habits_etag('user-1')
+        query.assert_called_with(['__name__'])
+        self.assertEqual(first, service.get_habits_etag('user-1'))
+
+        snapshot.update_time = '2025-01-01T00:00:00.000000002Z'
+        self.assertNotEqual(first, service.get_habits_etag('user-1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
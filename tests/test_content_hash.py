@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from app.services.document_cache import DocumentCache
+from app.services.firebase_service import FirebaseService
+from app.services.habit_document import content_hash, decode_habit_document, encode_habit_document
+from app.services.sync_protocol import apply_ops, validate_ops
+
+
+LOCAL = {
+    'startedDate': '2025-01-01',
+    'frequency': 'Daily',
+    'counter': 2,
+    'completedDates': ['2025-01-01', '2025-01-02'],
+    'notDoneDates': ['2025-01-03'],
+    'whyEntries': {'2025-01-03': 'tired'}
+}
+
+
+class TestContentHash(unittest.TestCase):
+    """Tests for the canonical habit content hash"""
+
+    def test_hash_ignores_shape_and_order(self):
+        stored = encode_habit_document(dict(LOCAL, version=4, last_updated='t1'))
+        reordered = dict(LOCAL, completedDates=['2025-01-02', '2025-01-01'])
+        self.assertEqual(content_hash(LOCAL), content_hash(stored))
+        self.assertEqual(content_hash(LOCAL), content_hash(reordered))
+
+    def test_hash_sees_every_change(self):
+        changes = [{'counter': 3}, {'frequency': 'Weekly'}, {'whyEntries': {'2025-01-03': 'rain'}},
+                   {'completedDates': ['2025-01-01', '2025-01-02', '2025-01-03'], 'notDoneDates': []}]
+        hashes = {content_hash(dict(LOCAL, **change)) for change in changes}
+        self.assertEqual(len(hashes | {content_hash(LOCAL)}), len(changes) + 1)
+
+    def test_ops_keep_the_hash_current(self):
+        doc = encode_habit_document(LOCAL)
+        doc['contentHash'] = content_hash(doc)
+        doc, updates = apply_ops(doc, validate_ops([
+            {'op': 'add_date', 'list': 'completedDates', 'date': '2025-01-04'},
+            {'op': 'add_date', 'list': 'completedDates', 'date': '2025-01-03'},
+            {'op': 'remove_date', 'list': 'completedDates', 'date': '2025-01-01'},
+            {'op': 'set_why', 'date': '2025-01-03', 'text': 'better'},
+            {'op': 'set_why', 'date': '2025-01-03', 'text': 'much better'},
+            {'op': 'set_counter', 'value': 5},
+            {'op': 'set_field', 'field': 'frequency', 'value': 'Weekly'}
+        ]))
+        self.assertEqual(updates['contentHash'], content_hash(doc))
+        self.assertEqual(doc['contentHash'], content_hash(decode_habit_document(doc)))
+
+
+class TestUnchangedSync(unittest.TestCase):
+    """Tests for syncs answered from the stored content hash"""
+
+    def setUp(self):
+        self.head = encode_habit_document(dict(LOCAL, version=4))
+        self.head['contentHash'] = content_hash(self.head)
+        snapshot = MagicMock(exists=True, update_time='t1')
+        snapshot.to_dict.side_effect = lambda: dict(self.head)
+        self.habit_ref = MagicMock(path='users/user-1/habits/main')
+        self.habit_ref.get.return_value = snapshot
+
+        self.service = FirebaseService.__new__(FirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = DocumentCache()
+        self.service.flights = None
+        self.service.db = MagicMock()
+        self.service.db.collection.return_value.document.return_value \
+            .collection.return_value.document.return_value = self.habit_ref
+        self.service.document_cache.put(self.habit_ref.path, self.head, 't1')
+
+    def test_idle_full_sync_reads_and_writes_nothing(self):
+        result = self.service.sync_habit_data('user-1', dict(LOCAL))
+
+        self.assertEqual(result, {'status': 'success', 'action': 'unchanged', 'version': 4})
+        self.habit_ref.get.assert_not_called()
+        self.service.db.batch.assert_not_called()
+
+    def test_a_changed_sync_stores_the_new_hash(self):
+        local = dict(LOCAL, counter=3)
+        with patch('app.services.firebase_service._firestore', return_value=MagicMock()):
+            result = self.service.sync_habit_data('user-1', local)
+
+        self.assertEqual(result['action'], 'merged')
+        writes = self.service.db.batch.return_value.update.call_args[0][1]
+        self.assertEqual(writes['contentHash'], content_hash(local))
+
+    def test_idle_delta_sync_skips_the_transaction(self):
+        result = self.service.sync_habit_ops('user-1', 4, [])
+
+        self.assertEqual(result, {'status': 'success', 'action': 'delta', 'version': 4, 'ops': []})
+        self.habit_ref.get.assert_not_called()
+        self.service.db.transaction.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
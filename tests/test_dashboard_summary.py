@@ -0,0 +1,210 @@
+import unittest
+import json
+import time
+from datetime import date
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+from app.models.aggregates import build_aggregates, empty_aggregates
+from app.models.history import HistoryBitmap
+from app.services.document_cache import DocumentCache
+from app.services.firebase_service import FirebaseService
+from app.services.user_summary import dashboard_from_summary
+
+
+TODAY = date(2025, 6, 18)
+
+
+def _ref(path):
+    ref = MagicMock(path=path, id=path.rsplit('/', 1)[-1])
+    ref.collection.side_effect = lambda name: _collection(f'{path}/{name}')
+    return ref
+
+
+def _collection(path):
+    collection = MagicMock()
+    collection.document.side_effect = lambda doc_id: _ref(f'{path}/{doc_id}')
+    return collection
+
+
+class TestDashboardPayload(unittest.TestCase):
+    """Tests for the dashboard built from a summary document"""
+
+    def test_habits_carry_todays_state_and_stats(self):
+        summary = {'subscription_tier': 'premium', 'habits': {
+            'run': {'startedDate': '2025-06-16', 'aggregates':
+                    build_aggregates(HistoryBitmap.from_lists(['2025-06-16', '2025-06-17'], ['2025-06-18']))},
+            'main': {'name': 'Read', 'startedDate': '2025-06-17', 'counter': 4, 'aggregates':
+                     build_aggregates(HistoryBitmap.from_lists(['2025-06-17', '2025-06-18']))},
+            'new': {}
+        }}
+        dashboard = dashboard_from_summary('user-1', summary, TODAY)
+
+        self.assertEqual(dashboard['subscription_tier'], 'premium')
+        self.assertEqual([habit['id'] for habit in dashboard['habits']], ['main', 'new', 'run'])
+        self.assertEqual([habit['name'] for habit in dashboard['habits']], ['Read', 'new', 'run'])
+        self.assertEqual([habit['today'] for habit in dashboard['habits']], ['done', None, 'notDone'])
+        main = dashboard['habits'][0]
+        self.assertEqual((main['stats']['current_streak'], main['stats']['periods']['rate']), (2, 100))
+        self.assertEqual(dashboard['habits'][2]['stats']['current_streak'], 0)
+
+
+class TestSummaryWrites(unittest.TestCase):
+    """Tests for the summary document written alongside habit writes"""
+
+    def setUp(self):
+        self.service = FirebaseService.__new__(FirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = DocumentCache()
+        self.service.flights = None
+        self.service.db = MagicMock()
+        self.service.db.collection.side_effect = _collection
+        self.summary = _ref('users/user-1')
+        self.firestore = MagicMock()
+        self.firestore.transactional = lambda fn: fn
+
+    def _writes(self, writer, path):
+        return [call for call in writer.set.call_args_list if call[0][0].path == path]
+
+    def test_save_updates_the_summary_in_the_same_batch(self):
+        self.service.document_cache.put('users/user-1', {'stale': True}, 't1')
+        # Habit refs know their user document, as Firestore's do
+        with patch('app.services.firebase_service.summary_ref_of', return_value=self.summary), \
+                patch('app.services.firebase_service._firestore', return_value=self.firestore):
+            self.assertTrue(self.service.save_habit_data('user-1', {'counter': 4, 'frequency': 'Weekly'}))
+
+        batch = self.service.db.batch.return_value
+        (call,) = self._writes(batch, 'users/user-1')
+        entry = call[0][1]['habits']['main']
+        self.assertEqual(set(entry), {'counter', 'frequency', 'last_updated'})
+        self.assertEqual(call[1], {'merge': True})
+        batch.commit.assert_called_once_with(timeout=5)
+        self.assertIsNone(self.service.document_cache.get('users/user-1'))
+
+    def test_delta_sync_updates_the_summary_in_the_transaction(self):
+        head = {'counter': 3, 'version': 7}
+        snapshot = MagicMock(exists=True)
+        snapshot.to_dict.side_effect = lambda: dict(head)
+        transaction = MagicMock()
+        self.service.db.transaction.return_value = transaction
+
+        with patch('app.services.firebase_service.summary_ref_of', return_value=self.summary), \
+                patch('app.services.firebase_service._firestore', return_value=self.firestore), \
+                patch.object(FirebaseService, 'habit_ref') as habit_ref:
+            habit_ref.return_value = _ref('users/user-1/habits/main')
+            habit_ref.return_value.get.return_value = snapshot
+            self.service.sync_habit_ops('user-1', 7, [{'op': 'set_counter', 'value': 9}])
+
+        (call,) = self._writes(transaction, 'users/user-1')
+        self.assertEqual(call[0][1]['habits']['main']['counter'], 9)
+        self.assertEqual(call[1], {'merge': True})
+
+    def test_subscription_changes_update_the_tier(self):
+        with patch('app.services.firebase_service._firestore', return_value=self.firestore):
+            self.assertTrue(self.service.update_subscription('user-1', {'tier': 'premium'}))
+
+        batch = self.service.db.batch.return_value
+        self.assertEqual(batch.update.call_args[0][0].path, 'profiles/user-1')
+        (call,) = self._writes(batch, 'users/user-1')
+        self.assertEqual(call[0][1], {'subscription_tier': 'premium'})
+
+    def test_dashboard_is_one_read(self):
+        snapshot = MagicMock(exists=True, update_time='t1')
+        snapshot.to_dict.return_value = {'subscription_tier': 'free', 'complete': True,
+                                         'habits': {'main': {'counter': 2, 'aggregates': empty_aggregates()}}}
+        summary = _ref('users/user-1')
+        summary.get.return_value = snapshot
+        self.service.db.collection.side_effect = None
+        self.service.db.collection.return_value.document.return_value = summary
+
+        dashboard = self.service.get_dashboard('user-1', TODAY)
+
+        self.assertEqual(dashboard['habits'][0]['counter'], 2)
+        summary.get.assert_called_once_with(timeout=5)
+        self.service.db.transaction.assert_not_called()
+
+    def test_a_missing_summary_is_backfilled_from_the_habits(self):
+        empty = MagicMock(exists=False)
+        profile = MagicMock(exists=True)
+        profile.to_dict.return_value = {'subscription_tier': 'premium', 'stripe_customer_id': 'cus_1'}
+        habit = MagicMock(id='main')
+        habit.to_dict.return_value = {'counter': 5, 'startedDate': '2025-06-01'}
+        summary_ref, profile_ref = _ref('users/user-1'), _ref('profiles/user-1')
+        summary_ref.get.return_value = empty
+        profile_ref.get.return_value = profile
+        transaction = MagicMock()
+        self.service.db.transaction.return_value = transaction
+
+        with patch('app.services.firebase_service._firestore', return_value=self.firestore), \
+                patch.object(FirebaseService, 'summary_ref', return_value=summary_ref), \
+                patch.object(FirebaseService, 'profile_ref', return_value=profile_ref), \
+                patch.object(FirebaseService, '_habits_query') as habits_query:
+            habits_query.return_value.select.return_value.get.return_value = [habit]
+            dashboard = self.service.get_dashboard('user-1', TODAY)
+
+        self.assertEqual(dashboard['subscription_tier'], 'premium')
+        self.assertEqual([(h['id'], h['counter']) for h in dashboard['habits']], [('main', 5)])
+        stored = transaction.set.call_args[0][1]
+        self.assertTrue(stored['complete'])
+        self.assertEqual(stored['habits'], {'main': {'counter': 5, 'startedDate': '2025-06-01'}})
+        self.assertNotIn('stripe_customer_id', stored)
+
+    def test_backfill_builds_aggregates_the_heads_lack(self):
+        # Written before aggregates existed: the history is still in the head
+        head = {'counter': 2, 'completedDates': ['2025-06-16', '2025-06-17'], 'notDoneDates': []}
+        habit = MagicMock(id='main')
+        habit.to_dict.return_value = {'counter': 2}
+        summary_ref = _ref('users/user-1')
+        summary_ref.get.return_value = MagicMock(exists=False)
+        transaction = MagicMock()
+        transaction.get_all.side_effect = lambda refs, timeout=None: [
+            MagicMock(exists=True, reference=ref, to_dict=MagicMock(return_value=dict(head))) for ref in refs
+        ]
+        self.service.db.transaction.return_value = transaction
+
+        with patch('app.services.firebase_service._firestore', return_value=self.firestore), \
+                patch.object(FirebaseService, 'summary_ref', return_value=summary_ref), \
+                patch.object(FirebaseService, '_habits_query') as habits_query:
+            habits_query.return_value.select.return_value.get.return_value = [habit]
+            dashboard = self.service.get_dashboard('user-1', TODAY)
+
+        self.assertEqual(dashboard['habits'][0]['stats']['current_streak'], 2)
+        (head_write,) = self._writes(transaction, 'users/user-1/habits/main')
+        self.assertEqual(head_write[0][1]['aggregates']['done'], 2)
+        self.assertEqual(head_write[1], {'merge': True})
+        (summary_write,) = self._writes(transaction, 'users/user-1')
+        self.assertEqual(summary_write[0][1]['habits']['main']['aggregates']['done'], 2)
+
+
+class TestDashboardRoute(unittest.TestCase):
+    """Tests for GET /api/dashboard"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+        self.service = MagicMock()
+        self.service.verify_token.return_value = {'uid': 'user-1', 'exp': time.time() + 3600}
+        self.service.get_dashboard_etag.return_value = 'dash-1'
+        self.service.get_dashboard.return_value = {'uid': 'user-1', 'subscription_tier': 'free', 'habits': []}
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _get(self, headers=None):
+        with patch('app.services.registry.FirebaseService', return_value=self.service):
+            return self.client.get('/api/dashboard', headers={'Authorization': 'Bearer token', **(headers or {})})
+
+    def test_dashboard_is_served_and_revalidated(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['dashboard']['subscription_tier'], 'free')
+
+        response = self._get({'If-None-Match': '"dash-1"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.service.get_dashboard.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
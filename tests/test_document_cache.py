@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from app.services.document_cache import DocumentCache
+from app.services.firebase_service import FirebaseService
+
+
+class TestDocumentCache(unittest.TestCase):
+    """Tests for the TTL + LRU document cache"""
+
+    def test_entries_are_fresh_until_ttl(self):
+        cache = DocumentCache(ttl=30)
+        with patch('app.services.document_cache.time.monotonic', return_value=100):
+            cache.put('profiles/u1', {'tier': 'free'}, 't1')
+        with patch('app.services.document_cache.time.monotonic', return_value=120):
+            self.assertTrue(cache.get('profiles/u1').fresh)
+        with patch('app.services.document_cache.time.monotonic', return_value=131):
+            self.assertFalse(cache.get('profiles/u1').fresh)
+
+    def test_revalidate_renews_only_unchanged_documents(self):
+        cache = DocumentCache(ttl=0)
+        cache.put('profiles/u1', {'tier': 'free'}, 't1')
+        self.assertTrue(cache.revalidate('profiles/u1', 't1'))
+        self.assertFalse(cache.revalidate('profiles/u1', 't2'))
+        self.assertIsNone(cache.get('profiles/u1'))
+
+    def test_returns_private_copies(self):
+        cache = DocumentCache()
+        cache.put('profiles/u1', {'flags': {'beta': True}}, 't1')
+        cache.get('profiles/u1').data['flags']['beta'] = False
+        self.assertTrue(cache.get('profiles/u1').data['flags']['beta'])
+
+    def test_lru_eviction(self):
+        cache = DocumentCache(max_entries=2)
+        cache.put('a', {}, 't')
+        cache.put('b', {}, 't')
+        cache.get('a')
+        cache.put('c', {}, 't')
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class TestReadThrough(unittest.TestCase):
+    """Tests for FirebaseService reads and writes through the document cache"""
+
+    def setUp(self):
+        self.cache = DocumentCache(ttl=30)
+        self.snapshot = MagicMock(exists=True, update_time='t1')
+        self.snapshot.to_dict.return_value = {'subscription_tier': 'premium'}
+        self.profile_ref = MagicMock(path='profiles/user-1')
+        self.profile_ref.get.return_value = self.snapshot
+
+        self.service = FirebaseService.__new__(FirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = self.cache
+        self.service.flights = None
+        self.service.db = MagicMock()
+        self.service.db.collection.return_value.document.return_value = self.profile_ref
+
+    def test_repeated_profile_reads_hit_memory(self):
+        for _ in range(10):
+            self.assertEqual(self.service.get_user_profile('user-1')['subscription_tier'], 'premium')
+        self.assertEqual(self.profile_ref.get.call_count, 1)
+        self.assertEqual(self.cache.stats()['hits'], 9)
+
+    def test_stale_entry_is_revalidated_without_a_full_read(self):
+        self.service.get_user_profile('user-1')
+        self.cache.ttl = 0
+
+        self.assertEqual(self.service.get_user_profile('user-1')['subscription_tier'], 'premium')
+        # Second call was a field-less read of update_time only
+        self.profile_ref.get.assert_called_with(field_paths=[], timeout=5)
+        self.assertEqual(self.cache.stats()['revalidations'], 1)
+
+    def test_changed_document_is_read_again(self):
+        self.service.get_user_profile('user-1')
+        self.cache.ttl = 0
+        self.snapshot.update_time = 't2'
+        self.snapshot.to_dict.return_value = {'subscription_tier': 'free'}
+
+        self.assertEqual(self.service.get_user_profile('user-1')['subscription_tier'], 'free')
+        self.profile_ref.get.assert_called_with(timeout=5)
+
+    def test_update_subscription_invalidates(self):
+        self.service.get_user_profile('user-1')
+        self.service.update_subscription('user-1', {'tier': 'free'})
+        self.assertIsNone(self.cache.get('profiles/user-1'))
+
+    def test_profile_etag_uses_cached_update_time(self):
+        self.service.get_user_profile('user-1')
+        self.assertIsNotNone(self.service.get_profile_etag('user-1'))
+        self.assertEqual(self.profile_ref.get.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
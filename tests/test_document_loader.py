@@ -0,0 +1,105 @@
+import unittest
+import time
+from datetime import date
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+from app.services.document_cache import DocumentCache
+from app.services.document_loader import DocumentLoader
+from app.services.firebase_service import FirebaseService
+from app.services.habit_document import encode_habit_document
+
+
+def _snapshot(path, data):
+    snapshot = MagicMock(exists=data is not None, update_time='t1')
+    snapshot.reference.path = path
+    snapshot.to_dict.return_value = data
+    return snapshot
+
+
+class TestDocumentLoader(unittest.TestCase):
+    """Tests for per-request deduplication and batching"""
+
+    def setUp(self):
+        self.service = MagicMock()
+        self.service.read_documents.side_effect = lambda refs: {ref.path: ({'path': ref.path}, 't1') for ref in refs}
+        self.loader = DocumentLoader(self.service)
+
+    def test_identical_reads_are_deduplicated(self):
+        ref = MagicMock(path='profiles/u1')
+        self.loader.load(ref)
+        self.loader.load(ref)
+        self.assertEqual(self.service.read_documents.call_count, 1)
+
+    def test_primed_reads_share_one_batch(self):
+        profile, habit = MagicMock(path='profiles/u1'), MagicMock(path='users/u1/habits/main')
+        self.loader.prime(habit)
+        self.assertEqual(self.loader.load(profile)[0], {'path': 'profiles/u1'})
+        self.assertEqual(self.loader.load(habit)[0], {'path': 'users/u1/habits/main'})
+
+        self.service.read_documents.assert_called_once_with([habit, profile])
+        self.assertEqual(self.loader.batches, 1)
+
+
+class TestBatchedReads(unittest.TestCase):
+    """Tests for FirebaseService.read_documents and the premium endpoint"""
+
+    def setUp(self):
+        self.service = FirebaseService.__new__(FirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = DocumentCache()
+        self.service.flights = None
+        self.service.db = MagicMock()
+        self.service.db.get_all.side_effect = lambda refs, timeout=None: [
+            _snapshot(ref.path, self.documents.get(ref.path)) for ref in refs
+        ]
+        self.documents = {
+            'profiles/user-1': {'subscription_tier': 'premium'},
+            'users/user-1/habits/main': encode_habit_document({'completedDates': [str(date.today())]})
+        }
+
+    def test_misses_are_read_with_one_get_all(self):
+        refs = [MagicMock(path=path) for path in self.documents]
+        results = self.service.read_documents(refs)
+
+        self.assertEqual(self.service.db.get_all.call_count, 1)
+        self.assertEqual(results['profiles/user-1'][0]['subscription_tier'], 'premium')
+
+        # Both are now cached, so a second batch needs no RPC at all
+        self.service.read_documents(refs)
+        self.assertEqual(self.service.db.get_all.call_count, 1)
+
+    def test_bootstrap_reads_profile_and_habit_in_one_rpc(self):
+        refs = {path: MagicMock(path=path) for path in self.documents}
+        self.service.profile_ref = lambda user_id: refs[f'profiles/{user_id}']
+        self.service.habit_ref = lambda user_id, habit_id='main': refs[f'users/{user_id}/habits/{habit_id}']
+
+        bootstrap = self.service.get_bootstrap('user-1')
+
+        self.assertEqual(self.service.db.get_all.call_count, 1)
+        self.assertEqual(bootstrap['profile']['subscription_tier'], 'premium')
+        self.assertEqual(bootstrap['habit']['completedDates'], [str(date.today())])
+        self.assertEqual(bootstrap['version'], 0)
+        self.assertEqual(bootstrap['window']['to'], str(date.today()))
+
+    def test_premium_request_reads_profile_and_habit_in_one_rpc(self):
+        refs = {path: MagicMock(path=path) for path in self.documents}
+        self.service.profile_ref = lambda user_id: refs[f'profiles/{user_id}']
+        self.service.habit_ref = lambda user_id, habit_id='main': refs[f'users/{user_id}/habits/{habit_id}']
+        self.service.verify_token = MagicMock(return_value={'uid': 'user-1', 'exp': time.time() + 3600})
+
+        app = create_app()
+        auth.token_cache.clear()
+        with patch('app.services.registry.FirebaseService', return_value=self.service):
+            response = app.test_client().get('/api/premium-feature', headers={'Authorization': 'Bearer token'})
+        auth.token_cache.clear()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['analytics']['current_streak'], 1)
+        self.assertEqual(self.service.db.get_all.call_count, 1)
+        for ref in refs.values():
+            ref.get.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
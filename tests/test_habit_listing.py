@@ -0,0 +1,137 @@
+import unittest
+import time
+from datetime import date
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.controllers.main_controller import HABITS_FIRST_BATCH
+from app.middleware import auth
+from app.models.history import RECENT_HISTORY_DAYS
+from app.services.firebase_service import FirebaseService
+from app.services.habit_document import HABIT_SUMMARY_FIELDS
+
+
+class TestHabitListing(unittest.TestCase):
+    """Tests for paginated habit summaries and per-habit history"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+
+        self.service = MagicMock()
+        self.service.verify_token.return_value = {'uid': 'user-1', 'exp': time.time() + 3600}
+        self.service.get_habits_etag.return_value = None
+        self.service.get_user_habits.side_effect = lambda user_id, limit, cursor: iter(
+            [{'id': f'habit-{i}', 'counter': i} for i in range(limit)][:3]
+        )
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _get(self, url):
+        with patch('app.services.registry.FirebaseService', return_value=self.service):
+            return self.client.get(url, headers={'Authorization': 'Bearer token'})
+
+    def test_page_with_more_habits_has_a_cursor(self):
+        body = self._get('/api/habits?limit=2').get_json()
+        self.assertEqual([habit['id'] for habit in body['habits']], ['habit-0', 'habit-1'])
+        self.assertEqual(body['next_cursor'], 'habit-1')
+        # One habit past the page is read to know whether there is more
+        self.service.get_user_habits.assert_called_once_with('user-1', 3, None)
+
+    def test_last_page_has_no_cursor(self):
+        body = self._get('/api/habits?limit=5&cursor=habit-1').get_json()
+        self.assertEqual(len(body['habits']), 3)
+        self.assertIsNone(body['next_cursor'])
+        self.service.get_user_habits.assert_called_once_with('user-1', 6, 'habit-1')
+
+    def test_empty_listing_is_valid_json(self):
+        self.service.get_user_habits.side_effect = lambda user_id, limit, cursor: iter([])
+        self.assertEqual(self._get('/api/habits').get_json(),
+                         {'status': 'success', 'habits': [], 'next_cursor': None})
+
+    def test_a_query_that_fails_early_is_a_500(self):
+        def habits(user_id, limit, cursor):
+            yield {'id': 'habit-0', 'counter': 0}
+            raise RuntimeError('deadline exceeded')
+        self.service.get_user_habits.side_effect = habits
+        response = self._get('/api/habits')
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('deadline exceeded', response.get_json()['error'])
+
+    def test_a_listing_cut_short_ends_with_an_error(self):
+        def habits(user_id, limit, cursor):
+            for i in range(HABITS_FIRST_BATCH + 5):
+                yield {'id': f'habit-{i}', 'counter': i}
+            raise RuntimeError('stream reset')
+        self.service.get_user_habits.side_effect = habits
+        self.service.get_habits_etag.return_value = 'v1'
+
+        for _ in range(2):
+            response = self._get('/api/habits')
+            self.assertEqual(response.status_code, 200)
+            body = response.get_json()
+            self.assertEqual((body['status'], body['error']), ('error', 'stream reset'))
+            self.assertEqual(len(body['habits']), HABITS_FIRST_BATCH + 5)
+        # A failed body is never cached
+        self.assertEqual(self.service.get_user_habits.call_count, 2)
+
+    def test_invalid_page_size(self):
+        self.assertEqual(self._get('/api/habits?limit=0').status_code, 400)
+        self.assertEqual(self._get('/api/habits?limit=many').status_code, 400)
+
+    def test_habit_history_is_loaded_on_demand(self):
+        self.service.get_habit_etag.return_value = 'h1'
+        self.service.get_user_habit.return_value = {'id': 'main', 'completedDates': ['2025-01-01']}
+        response = self._get('/api/habits/main')
+        self.assertEqual(response.get_json()['habit']['completedDates'], ['2025-01-01'])
+        self.assertEqual(response.headers['ETag'], '"h1"')
+
+        self.service.get_habit_etag.return_value = None
+        self.service.get_user_habit.return_value = None
+        self.assertEqual(self._get('/api/habits/other').status_code, 404)
+
+    def test_history_window(self):
+        self.service.get_habit_etag.return_value = 'h1'
+        self.service.get_habit_history.return_value = {'from': '2025-01-01', 'to': '2025-01-31',
+                                                       'completedDates': ['2025-01-02']}
+        response = self._get('/api/habits/main/history?from=2025-01-01&to=2025-01-31')
+
+        self.assertEqual(response.get_json()['history']['completedDates'], ['2025-01-02'])
+        self.service.get_habit_history.assert_called_once_with('user-1', 'main', date(2025, 1, 1), date(2025, 1, 31))
+        # The validator covers the window as well as the document
+        self.assertEqual(response.headers['ETag'], '"h1.20250101.20250131"')
+
+    def test_default_history_window_is_recent(self):
+        self.service.get_habit_etag.return_value = None
+        self.service.get_habit_history.return_value = {}
+        self._get('/api/habits/main/history')
+        _, _, start, end = self.service.get_habit_history.call_args[0]
+        self.assertEqual(end, date.today())
+        self.assertEqual((end - start).days, RECENT_HISTORY_DAYS - 1)
+
+    def test_invalid_history_window(self):
+        self.assertEqual(self._get('/api/habits/main/history?from=yesterday').status_code, 400)
+        self.assertEqual(self._get('/api/habits/main/history?from=2025-02-01&to=2025-01-01').status_code, 400)
+        self.assertEqual(self._get('/api/habits/main/history?from=2020-01-01&to=2025-01-01').status_code, 400)
+        self.service.get_habit_history.assert_not_called()
+
+    def test_query_is_projected_and_paged(self):
+        service = FirebaseService.__new__(FirebaseService)
+        service.timeout = 5
+        service.db = MagicMock()
+        habits = service.db.collection.return_value.document.return_value.collection.return_value
+        query = habits.order_by.return_value.start_after.return_value.limit.return_value
+        snapshot = MagicMock(id='walk')
+        snapshot.to_dict.return_value = {'counter': 2}
+        query.select.return_value.stream.return_value = [snapshot]
+
+        self.assertEqual(list(service.get_user_habits('user-1', 11, 'run')), [{'counter': 2, 'id': 'walk'}])
+        habits.order_by.assert_called_once_with('__name__')
+        habits.order_by.return_value.start_after.assert_called_once_with({'__name__': 'run'})
+        query.select.assert_called_once_with(list(HABIT_SUMMARY_FIELDS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+import json
+import time
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+from app.models.aggregates import build_aggregates
+from app.models.history import HistoryBitmap
+from app.services.firebase_service import FirebaseService
+from app.services.sync_protocol import SyncProtocolError, mutation_ops
+
+
+class TestMutationOps(unittest.TestCase):
+    """Tests for translating PATCH mutations into ops"""
+
+    def test_mutations_become_ops(self):
+        self.assertEqual(mutation_ops([
+            {'action': 'done', 'date': '2025-03-02'},
+            {'action': 'not_done', 'date': '2025-03-03'},
+            {'action': 'clear', 'date': '2025-03-04'},
+            {'action': 'why', 'date': '2025-03-02', 'text': 'rain'},
+            {'action': 'counter', 'value': 4}
+        ]), [
+            {'op': 'add_date', 'list': 'completedDates', 'date': '2025-03-02'},
+            {'op': 'add_date', 'list': 'notDoneDates', 'date': '2025-03-03'},
+            {'op': 'remove_date', 'list': 'completedDates', 'date': '2025-03-04'},
+            {'op': 'remove_date', 'list': 'notDoneDates', 'date': '2025-03-04'},
+            {'op': 'set_why', 'date': '2025-03-02', 'text': 'rain'},
+            {'op': 'set_counter', 'value': 4}
+        ])
+
+    def test_bad_mutations_are_rejected(self):
+        for mutations in (None, [], [{'action': 'explode'}], [{'action': 'done', 'date': 'soon'}],
+                          [{'action': 'counter', 'value': -1}], ['done']):
+            with self.assertRaises(SyncProtocolError, msg=mutations):
+                mutation_ops(mutations)
+
+
+class TestPatchHabit(unittest.TestCase):
+    """Tests for FirebaseService.patch_habit"""
+
+    def setUp(self):
+        history = HistoryBitmap.from_lists(['2024-03-01', '2025-03-01'])
+        self.head = {'counter': 3, 'version': 7, 'aggregates': build_aggregates(history),
+                     'shards': {'2024': {'done': 1, 'notDone': 0}, '2025': {'done': 1, 'notDone': 0}}}
+        self.shards = {year: {'history': HistoryBitmap.from_lists([f'{year}-03-01']).to_dict(), 'whyEntries': {}}
+                       for year in ('2024', '2025')}
+        self.head_snapshot = MagicMock(exists=True)
+        self.head_snapshot.to_dict.side_effect = lambda: dict(self.head)
+        self.habit_ref = MagicMock(path='users/user-1/habits/run', id='run')
+        self.habit_ref.get.return_value = self.head_snapshot
+        self.habit_ref.collection.side_effect = self._collection
+        self.transaction = MagicMock()
+        self.transaction.get_all.side_effect = lambda refs, timeout=None: [self._snapshot(ref) for ref in refs]
+
+        self.service = FirebaseService.__new__(FirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = None
+        self.service.flights = None
+        self.service.db = MagicMock()
+        self.service.db.collection.return_value.document.return_value \
+            .collection.return_value.document.return_value = self.habit_ref
+        self.service.db.transaction.return_value = self.transaction
+        self.firestore = MagicMock()
+        self.firestore.transactional = lambda fn: fn
+
+    def _collection(self, name):
+        collection = MagicMock()
+        collection.document.side_effect = \
+            lambda doc_id: MagicMock(path=f'users/user-1/habits/run/{name}/{doc_id}', id=doc_id)
+        return collection
+
+    def _snapshot(self, ref):
+        snapshot = MagicMock(exists=True, reference=ref)
+        snapshot.to_dict.return_value = self.shards[ref.id]
+        return snapshot
+
+    def _patch(self, mutations):
+        with patch('app.services.firebase_service._firestore', return_value=self.firestore):
+            return self.service.patch_habit('user-1', 'run', mutation_ops(mutations), client_id='c1')
+
+    def test_a_click_reads_and_writes_one_year(self):
+        result = self._patch([{'action': 'done', 'date': '2025-03-02'}])
+
+        self.assertEqual(result, {'status': 'success', 'version': 8})
+        self.service.db.collection.return_value.document.return_value \
+            .collection.return_value.document.assert_called_with('run')
+        # No ops query: nothing is sent back
+        self.habit_ref.collection.return_value.where.assert_not_called()
+        self.assertEqual([[ref.id for ref in call[0][0]] for call in self.transaction.get_all.call_args_list],
+                         [['2025']])
+        # The user summary is written too, through a ref this mock cannot name
+        refs = [call[0][0].path for call in self.transaction.set.call_args_list
+                if isinstance(call[0][0].path, str)]
+        self.assertEqual(sorted(refs), ['users/user-1/habits/run', 'users/user-1/habits/run/history/2025',
+                                        'users/user-1/habits/run/ops/000000000008'])
+        head_writes = [call[0][1] for call in self.transaction.set.call_args_list if call[0][0] is self.habit_ref][0]
+        self.assertEqual(head_writes['aggregates']['streakEnd'], '2025-03-02')
+        self.assertEqual(head_writes['shards'], {'2025': {'done': 2, 'notDone': 0}})
+
+    def test_a_missing_habit_is_not_created(self):
+        self.head_snapshot.exists = False
+        self.assertIsNone(self._patch([{'action': 'counter', 'value': 1}]))
+        self.transaction.set.assert_not_called()
+
+
+class TestPatchRoute(unittest.TestCase):
+    """Tests for PATCH /api/habits/<id>"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+        self.service = MagicMock()
+        self.service.verify_token.return_value = {'uid': 'user-1', 'exp': time.time() + 3600}
+        self.service.patch_habit.return_value = {'status': 'success', 'version': 8}
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _patch(self, body):
+        with patch('app.services.registry.FirebaseService', return_value=self.service):
+            return self.client.patch('/api/habits/run', data=json.dumps(body), content_type='application/json',
+                                     headers={'Authorization': 'Bearer token'})
+
+    def test_patch(self):
+        response = self._patch({'mutations': [{'action': 'done', 'date': '2025-03-02'}], 'clientId': 'c1'})
+        self.assertEqual((response.status_code, response.get_json()['version']), (200, 8))
+        args, kwargs = self.service.patch_habit.call_args
+        self.assertEqual(args[:2], ('user-1', 'run'))
+        self.assertEqual(kwargs, {'client_id': 'c1'})
+
+    def test_rejections(self):
+        self.assertEqual(self._patch({'mutations': [{'action': 'explode'}]}).status_code, 400)
+        self.service.patch_habit.assert_not_called()
+        self.service.patch_habit.return_value = None
+        self.assertEqual(self._patch({'mutations': [{'action': 'counter', 'value': 2}]}).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+from datetime import date
+from unittest.mock import patch, MagicMock
+from app.models.aggregates import build_aggregates
+from app.models.history import HistoryBitmap
+from app.services.document_cache import DocumentCache
+from app.services.firebase_service import FirebaseService
+from app.services.habit_document import decode_habit_document, encode_habit_document
+from app.services.habit_shards import assemble_document, changed_shards, split_document
+
+
+def _shard(completed, why=None):
+    return {'history': HistoryBitmap.from_lists(completed).to_dict(), 'whyEntries': why or {}}
+
+
+class TestHabitShards(unittest.TestCase):
+    """Tests for splitting habit history into per-year shards"""
+
+    DOC = encode_habit_document({
+        'counter': 3,
+        'completedDates': ['2024-12-31', '2025-01-01'],
+        'notDoneDates': ['2025-01-02'],
+        'whyEntries': {'2025-01-02': 'rain', 'not-a-date': 'dropped'}
+    })
+
+    def test_split_and_assemble_round_trip(self):
+        shards = split_document(self.DOC)
+        self.assertEqual(sorted(shards), ['2024', '2025'])
+        self.assertEqual(shards['2024']['whyEntries'], {})
+
+        head = {'counter': 3, 'shards': {'2024': {}, '2025': {}}}
+        doc = decode_habit_document(assemble_document(head, shards))
+        self.assertEqual(doc['completedDates'], ['2024-12-31', '2025-01-01'])
+        self.assertEqual(doc['notDoneDates'], ['2025-01-02'])
+        self.assertEqual(doc['whyEntries'], {'2025-01-02': 'rain'})
+        self.assertNotIn('shards', doc)
+
+    def test_legacy_head_is_read_unchanged(self):
+        self.assertIs(assemble_document(self.DOC, {}), self.DOC)
+
+    def test_only_changed_years_are_written(self):
+        stored = split_document(self.DOC)
+        doc = dict(self.DOC, whyEntries={'2025-01-02': 'snow'})
+        self.assertEqual(list(changed_shards(stored, doc)), ['2025'])
+        self.assertEqual(changed_shards(stored, self.DOC), {})
+
+    def test_emptied_year_is_deleted(self):
+        stored = split_document(self.DOC)
+        doc = encode_habit_document({'completedDates': ['2025-01-01'], 'notDoneDates': ['2025-01-02'],
+                                     'whyEntries': {'2025-01-02': 'rain'}})
+        self.assertEqual(changed_shards(stored, doc), {'2024': None})
+        # A document assembled from 2025 alone says nothing about 2024
+        self.assertEqual(changed_shards(stored, doc, years={'2025'}), {})
+
+
+class TestShardedReads(unittest.TestCase):
+    """Tests for reading a sharded habit through FirebaseService"""
+
+    def setUp(self):
+        self.head = {'counter': 3, 'version': 7, 'shards': {'2024': {'done': 1, 'notDone': 0},
+                                                           '2025': {'done': 1, 'notDone': 0}}}
+        self.shards = {'2024': _shard(['2024-12-31']), '2025': _shard(['2025-01-01'])}
+        self.head['aggregates'] = build_aggregates(HistoryBitmap.from_lists(['2024-12-31', '2025-01-01']))
+        self.head_snapshot = MagicMock(exists=True, update_time='t1')
+        self.head_snapshot.to_dict.side_effect = lambda: dict(self.head)
+        self.habit_ref = MagicMock(path='users/user-1/habits/main')
+        self.habit_ref.get.return_value = self.head_snapshot
+        self.habit_ref.collection.side_effect = self._collection
+
+        self.service = FirebaseService.__new__(FirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = DocumentCache(ttl=30)
+        self.service.flights = None
+        self.service.db = MagicMock()
+        self.service.db.collection.return_value.document.return_value \
+            .collection.return_value.document.return_value = self.habit_ref
+        self.service.db.get_all.side_effect = lambda refs, timeout=None: [self._snapshot(ref) for ref in refs]
+
+    def _collection(self, name):
+        collection = MagicMock()
+        collection.document.side_effect = \
+            lambda doc_id: MagicMock(path=f'users/user-1/habits/main/{name}/{doc_id}', id=doc_id)
+        return collection
+
+    def _snapshot(self, ref):
+        snapshot = MagicMock(exists=True, reference=ref)
+        snapshot.to_dict.return_value = self.shards[ref.id]
+        return snapshot
+
+    def test_range_read_fetches_only_its_shards(self):
+        doc = decode_habit_document(self.service.get_habit_document('user-1', years={'2025'}))
+        self.assertEqual(doc['completedDates'], ['2025-01-01'])
+        self.assertEqual([ref.id for ref in self.service.db.get_all.call_args[0][0]], ['2025'])
+
+    def test_history_window_reads_only_its_years(self):
+        history = self.service.get_habit_history('user-1', 'main', date(2024, 12, 1), date(2024, 12, 31))
+        self.assertEqual(history['completedDates'], ['2024-12-31'])
+        self.assertEqual([ref.id for ref in self.service.db.get_all.call_args[0][0]], ['2024'])
+
+    def test_shards_are_cached_until_the_head_changes(self):
+        self.service.get_habit_document('user-1')
+        self.service.get_habit_document('user-1')
+        self.assertEqual(self.service.db.get_all.call_count, 1)
+
+        # Any write moves the head's update_time, which retires cached shards
+        self.service.document_cache.ttl = 0
+        self.head_snapshot.update_time = 't2'
+        self.service.get_habit_document('user-1')
+        self.assertEqual(self.service.db.get_all.call_count, 2)
+
+    def test_ops_sync_touches_only_the_current_shard(self):
+        transaction = MagicMock()
+        transaction.get_all.side_effect = lambda refs, timeout=None: [self._snapshot(ref) for ref in refs]
+        self.service.db.transaction.return_value = transaction
+        firestore = MagicMock()
+        firestore.transactional = lambda fn: fn
+
+        with patch('app.services.firebase_service._firestore', return_value=firestore):
+            result = self.service.sync_habit_ops('user-1', 7, [
+                {'op': 'add_date', 'list': 'completedDates', 'date': '2025-03-02'}
+            ])
+
+        self.assertEqual(result['action'], 'delta')
+        self.assertEqual([ref.id for ref in transaction.get_all.call_args[0][0]], ['2025'])
+        shard_writes = [call[0] for call in transaction.set.call_args_list if 'history/' in call[0][0].path]
+        self.assertEqual([ref.id for ref, _ in shard_writes], ['2025'])
+        head_writes = [call for call in transaction.set.call_args_list if call[0][0] is self.habit_ref][0]
+        self.assertEqual(head_writes[0][1]['shards'], {'2025': {'done': 2, 'notDone': 0}})
+        self.assertNotIn('history', head_writes[0][1])
+        self.assertEqual(head_writes[0][1]['aggregates']['done'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from app.models.history import HistoryBitmap, DONE, NOT_DONE, UNTRACKED, latest_date
+from app.models.habit_tracker import HabitTracker
+from app.services.habit_document import decode_habit_document, encode_habit_document, history_window
+
+
+class TestHistoryBitmap(unittest.TestCase):
+    """Tests for the two-bit-per-day history encoding"""
+
+    def test_set_and_get_states(self):
+        history = HistoryBitmap()
+        history.set('2025-01-10', DONE)
+        history.set('2025-01-12', NOT_DONE)
+
+        self.assertEqual(history.get('2025-01-10'), DONE)
+        self.assertEqual(history.get('2025-01-11'), UNTRACKED)
+        self.assertEqual(history.get('2025-01-12'), NOT_DONE)
+        self.assertEqual(history.get('2024-01-01'), UNTRACKED)
+
+    def test_states_are_mutually_exclusive(self):
+        """Test that a day is either done or not done, never both"""
+        history = HistoryBitmap()
+        history.set('2025-01-10', NOT_DONE)
+        history.set('2025-01-10', DONE)
+
+        self.assertEqual(history.dates(DONE), ['2025-01-10'])
+        self.assertEqual(history.dates(NOT_DONE), [])
+        self.assertEqual((history.done_count, history.not_done_count), (1, 0))
+
+    def test_extends_backwards_before_base(self):
+        history = HistoryBitmap()
+        history.set('2025-03-01', DONE)
+        history.set('2025-02-01', DONE)
+        history.set('2025-02-27', NOT_DONE)
+
+        self.assertEqual(history.dates(DONE), ['2025-02-01', '2025-03-01'])
+        self.assertEqual(history.dates(NOT_DONE), ['2025-02-27'])
+
+    def test_round_trip_encoding(self):
+        history = HistoryBitmap.from_lists(['2024-12-31', '2025-01-02'], ['2025-01-01'])
+        decoded = HistoryBitmap.from_dict(json.loads(json.dumps(history.to_dict())))
+
+        self.assertEqual(decoded.dates(DONE), ['2024-12-31', '2025-01-02'])
+        self.assertEqual(decoded.dates(NOT_DONE), ['2025-01-01'])
+        self.assertEqual(decoded.success_percentage(), 67)
+
+    def test_counts_survive_decoding(self):
+        """Test that popcount-derived totals match the tracked days"""
+        start = date(2022, 1, 1)
+        completed = [str(start + timedelta(days=i)) for i in range(0, 900, 2)]
+        not_done = [str(start + timedelta(days=i)) for i in range(1, 900, 6)]
+        history = HistoryBitmap.from_dict(HistoryBitmap.from_lists(completed, not_done).to_dict())
+
+        self.assertEqual(history.done_count, len(completed))
+        self.assertEqual(history.not_done_count, len(not_done))
+
+    def test_multi_year_history_stays_small(self):
+        """Test that three years of daily history encodes in a few hundred bytes"""
+        start = date(2022, 1, 1)
+        completed = [str(start + timedelta(days=i)) for i in range(3 * 365) if i % 3]
+        not_done = [str(start + timedelta(days=i)) for i in range(3 * 365) if not i % 3]
+        encoded = json.dumps(HistoryBitmap.from_lists(completed, not_done).to_dict())
+
+        self.assertLess(len(encoded), 450)
+        self.assertLess(len(encoded) * 20, len(json.dumps([completed, not_done])))
+
+    def test_clearing_all_days_encodes_empty(self):
+        history = HistoryBitmap()
+        history.set('2025-01-10', DONE)
+        history.set('2025-01-10', UNTRACKED)
+
+        self.assertEqual(history.to_dict()['bits'], '')
+        self.assertEqual(HistoryBitmap.from_dict(history.to_dict()).dates(DONE), [])
+
+    def test_dates_in_a_window(self):
+        history = HistoryBitmap.from_lists(['2024-12-30', '2025-01-01', '2025-01-05', '2025-02-01'])
+        self.assertEqual(history.dates(DONE, '2025-01-01', '2025-01-31'), ['2025-01-01', '2025-01-05'])
+        self.assertEqual(history.dates(DONE, start='2025-01-02'), ['2025-01-05', '2025-02-01'])
+        self.assertEqual(history.dates(DONE, end='2024-12-31'), ['2024-12-30'])
+        self.assertEqual(history.dates(DONE, '2026-01-01', '2026-12-31'), [])
+        self.assertEqual(history.dates(DONE, '2020-01-01', '2020-12-31'), [])
+
+    def test_days_outside_the_window_are_rejected(self):
+        history = HistoryBitmap()
+        for day in ('0001-01-01', '1999-12-31', latest_date() + timedelta(days=1), '9999-12-31'):
+            with self.assertRaises(ValueError):
+                history.set(day, DONE)
+        history.set(latest_date(), DONE)
+        self.assertEqual(history.done_count, 1)
+
+        history = HistoryBitmap.from_lists(['0001-01-01', '2025-01-01', '9999-12-31'], ['1999-12-31'])
+        self.assertEqual(history.to_dict()['base'], '2025-01-01')
+        self.assertEqual((history.done_count, history.not_done_count), (1, 0))
+
+    def test_unknown_encoding_version_is_rejected(self):
+        with self.assertRaises(ValueError):
+            HistoryBitmap.from_dict({'v': 99, 'base': '2025-01-01', 'bits': 'AQ=='})
+
+
+class TestHabitTrackerHistory(unittest.TestCase):
+    """Tests that HabitTracker reads legacy files and writes the bitmap"""
+
+    def setUp(self):
+        fd, self.data_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+
+    def tearDown(self):
+        for path in (self.data_file, self.data_file + '.journal'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_legacy_file_is_upgraded(self):
+        today = str(date.today())
+        with open(self.data_file, 'w') as f:
+            json.dump({'completed_dates': [today], 'not_done_dates': ['2025-01-01'],
+                       'why_entries': {}, 'start_date': '2025-01-01',
+                       'frequency': 'Daily', 'counter': 1}, f)
+
+        tracker = HabitTracker(self.data_file)
+        self.assertTrue(tracker.is_done_today())
+        self.assertEqual(tracker.get_not_done_dates(), ['2025-01-01'])
+        self.assertEqual(tracker.get_success_percentage(), 50)
+
+        tracker.toggle_today()
+        self.assertFalse(HabitTracker(self.data_file).is_done_today())
+
+        tracker._save_data()
+        with open(self.data_file) as f:
+            saved = json.load(f)
+        self.assertNotIn('completed_dates', saved)
+        self.assertIn('history', saved)
+
+
+class TestHabitDocumentCodec(unittest.TestCase):
+    """Tests for the Firestore habit document encoding"""
+
+    def test_encode_replaces_date_lists(self):
+        encoded = encode_habit_document({'counter': 2, 'completedDates': ['2025-01-02'],
+                                         'notDoneDates': ['2025-01-01']})
+        self.assertNotIn('completedDates', encoded)
+        self.assertEqual(encoded['history']['v'], 1)
+        self.assertEqual(encoded['counter'], 2)
+
+    def test_decode_restores_client_shape(self):
+        doc = encode_habit_document({'completedDates': ['2025-01-02'], 'notDoneDates': ['2025-01-01']})
+        decoded = decode_habit_document(doc)
+        self.assertEqual(decoded['completedDates'], ['2025-01-02'])
+        self.assertEqual(decoded['notDoneDates'], ['2025-01-01'])
+        self.assertNotIn('history', decoded)
+
+    def test_history_window(self):
+        doc = encode_habit_document({'completedDates': ['2025-01-02', '2025-03-01'], 'notDoneDates': ['2025-01-01'],
+                                     'whyEntries': {'2025-01-01': 'sick', '2024-06-01': 'travel'}})
+        window = history_window(doc, date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(window['completedDates'], ['2025-01-02'])
+        self.assertEqual(window['notDoneDates'], ['2025-01-01'])
+        self.assertEqual(window['whyEntries'], {'2025-01-01': 'sick'})
+
+    def test_legacy_document_passes_through(self):
+        legacy = {'completedDates': ['2025-01-02'], 'notDoneDates': []}
+        self.assertEqual(decode_habit_document(legacy), legacy)
+
+
+if __name__ == '__main__':
+    unittest.main()
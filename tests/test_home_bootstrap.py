@@ -0,0 +1,103 @@
+import unittest
+import json
+import time
+from datetime import date
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+
+
+class TestHomeBootstrap(unittest.TestCase):
+    """Tests for the bootstrap payload embedded in the signed-in home page"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+
+        # Keep signed-in page renders off the per-user data directory
+        services = self.app.extensions['services']
+        services.user_trackers = MagicMock()
+        services.user_trackers.view.side_effect = lambda user_id: services.tracker_cache.view()
+
+        self.service = MagicMock()
+        self.service.verify_token.return_value = {
+            'uid': 'user-1', 'email': 'user-1@example.com', 'exp': time.time() + 3600
+        }
+        self.service.get_bootstrap.return_value = {
+            'uid': 'user-1',
+            'profile': {'subscription_tier': 'premium'},
+            'habit': {'counter': 4, 'completedDates': ['2025-01-02'], 'version': 7},
+            'version': 7
+        }
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _get(self, headers=None, cookie=None):
+        with patch('app.services.registry.FirebaseService', return_value=self.service):
+            if cookie:
+                self.client.set_cookie('__session', cookie)
+            return self.client.get('/', headers=headers or {})
+
+    def _bootstrap(self, response):
+        html = response.get_data(as_text=True)
+        start = html.index('<script id="bootstrap-data" type="application/json">')
+        start = html.index('>', start) + 1
+        return json.loads(html[start:html.index('</script>', start)])
+
+    def test_signed_in_page_embeds_bootstrap(self):
+        response = self._get(headers={'Authorization': 'Bearer token'})
+
+        self.assertEqual(response.status_code, 200)
+        bootstrap = self._bootstrap(response)
+        self.assertEqual(bootstrap['uid'], 'user-1')
+        self.assertEqual(bootstrap['habit']['counter'], 4)
+        self.service.get_bootstrap.assert_called_once_with('user-1')
+
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+        self.assertIn('Cookie', response.headers['Vary'])
+        self.assertIsNotNone(response.headers.get('ETag'))
+
+    def test_signed_in_page_renders_the_bootstrap_habit(self):
+        today = str(date.today())
+        self.service.get_bootstrap.return_value['habit'].update(
+            completedDates=['2025-01-02', today], whyEntries={today: 'easy'}
+        )
+        html = self._get(cookie='token').get_data(as_text=True)
+
+        self.assertIn('id="counter" name="counter" value="4"', html)
+        self.assertIn('name="done" checked', html)
+        self.assertIn(f'completedDates: ["{today}"]', html)
+        self.app.extensions['services'].user_trackers.view.assert_not_called()
+
+    def test_signed_in_page_without_a_habit_uses_the_local_tracker(self):
+        self.service.get_bootstrap.return_value['habit'] = None
+        self._get(cookie='token')
+        self.app.extensions['services'].user_trackers.view.assert_called_once_with('user-1')
+
+    def test_session_cookie_signs_in_page_navigation(self):
+        response = self._get(cookie='token')
+        self.assertEqual(self._bootstrap(response)['profile']['subscription_tier'], 'premium')
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self._get(cookie='token').headers['ETag']
+        response = self._get(headers={'If-None-Match': etag}, cookie='token')
+        self.assertEqual(response.status_code, 304)
+
+    def test_failed_bootstrap_still_renders_page(self):
+        self.service.get_bootstrap.side_effect = RuntimeError('deadline exceeded')
+        response = self._get(cookie='token')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('bootstrap-data', response.get_data(as_text=True))
+
+    def test_anonymous_page_has_no_bootstrap(self):
+        response = self._get()
+        self.assertNotIn('bootstrap-data', response.get_data(as_text=True))
+        self.assertNotIn('private', response.headers.get('Cache-Control', ''))
+        self.service.get_bootstrap.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date
+from app.models.habit_tracker import HabitTracker
+from app.models.journal import JournalStore
+
+
+class TestJournalStore(unittest.TestCase):
+    """Tests for the snapshot + append-only journal store"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'habit_data.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_records_are_replayed_after_snapshot(self):
+        store = JournalStore(self.path)
+        store.append({'op': 'set', 'key': 'counter', 'value': 1})
+        store.compact({'counter': 1})
+        store.append({'op': 'set', 'key': 'counter', 'value': 2})
+        store.close()
+
+        snapshot, records = JournalStore(self.path).read()
+        self.assertEqual(snapshot['counter'], 1)
+        self.assertEqual([r['value'] for r in records], [2])
+
+    def test_compaction_truncates_journal(self):
+        store = JournalStore(self.path)
+        for i in range(5):
+            store.append({'op': 'set', 'key': 'counter', 'value': i})
+        store.compact({'counter': 4})
+
+        self.assertEqual(os.path.getsize(store.journal_path), 0)
+        self.assertEqual(store.records_since_compaction, 0)
+        self.assertFalse([name for name in os.listdir(self.tmpdir) if name.endswith('.tmp')])
+
+    def test_torn_record_is_ignored(self):
+        """Test that a record cut off by a crash is dropped, not fatal"""
+        store = JournalStore(self.path)
+        store.append({'op': 'set', 'key': 'counter', 'value': 1})
+        store.close()
+        with open(store.journal_path, 'ab') as f:
+            f.write(b'{"op":"set","key":"coun')
+
+        recovered = JournalStore(self.path)
+        _, records = recovered.read()
+        self.assertEqual(len(records), 1)
+
+        recovered.append({'op': 'set', 'key': 'counter', 'value': 2})
+        recovered.close()
+        _, records = JournalStore(self.path).read()
+        self.assertEqual([r['value'] for r in records], [1, 2])
+
+    def test_records_already_in_snapshot_are_skipped(self):
+        """Test recovery from a crash between snapshot rename and truncation"""
+        store = JournalStore(self.path)
+        store.append({'op': 'set', 'key': 'counter', 'value': 1})
+        with open(self.path, 'w') as f:
+            json.dump({'counter': 1, 'journal_seq': 1}, f)
+        store.close()
+
+        _, records = JournalStore(self.path).read()
+        self.assertEqual(records, [])
+
+
+class TestJournaledHabitTracker(unittest.TestCase):
+    """Tests for HabitTracker persistence through the journal"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'habit_data.json')
+
+    def tearDown(self):
+        JournalStore.for_path(self.path).close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_toggle_appends_constant_size_record(self):
+        """Test that a toggle writes one small record regardless of history size"""
+        tracker = HabitTracker(self.path)
+        for day in range(1, 29):
+            tracker.history.set(date(2020, 2, day), 1)
+        tracker._save_data()
+
+        journal_path = self.path + '.journal'
+        before = os.path.getsize(journal_path)
+        tracker.toggle_today()
+        self.assertLess(os.path.getsize(journal_path) - before, 100)
+
+    def test_toggle_survives_reload(self):
+        HabitTracker(self.path).toggle_today()
+        JournalStore.for_path(self.path).sync()
+        self.assertTrue(HabitTracker(self.path).is_done_today())
+
+    def test_journal_is_compacted_periodically(self):
+        store = JournalStore.for_path(self.path)
+        tracker = HabitTracker(self.path)
+        for _ in range(store.compact_every):
+            tracker.toggle_today()
+
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(os.path.getsize(store.journal_path), 0)
+        self.assertFalse(HabitTracker(self.path).is_done_today())
+
+    def test_concurrent_toggles_are_not_lost(self):
+        """Test that toggles from trackers on many threads are all applied"""
+        trackers = [HabitTracker(self.path) for _ in range(8)]
+
+        def worker(tracker):
+            for _ in range(25):
+                tracker.toggle_today()
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in trackers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 200 toggles in total, so today ends up untoggled
+        self.assertEqual(JournalStore.for_path(self.path).seq, 200)
+        self.assertFalse(HabitTracker(self.path).is_done_today())
+
+
+if __name__ == '__main__':
+    unittest.main()
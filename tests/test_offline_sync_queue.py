@@ -0,0 +1,63 @@
+import unittest
+from tests.node_harness import has_node, run_scripts
+
+
+# A fake /api/sync that enforces MAX_OPS_PER_SYNC
+BEFORE = r'''
+    var habitData = {startedDate: '2025-01-01', frequency: 'Daily', counter: 0,
+                     completedDates: [], notDoneDates: [], whyEntries: {}};
+    var respond = async (url, body) => {
+        if (body.ops.length > 200) {
+            return {ok: false, json: async () => ({error: 'Too many ops'})};
+        }
+        return {ok: true, json: async () => ({
+            status: 'success', action: 'delta', version: body.baseVersion + body.ops.length, ops: []
+        })};
+    };
+'''
+
+# Toggles days while offline, then syncs
+AFTER = r'''
+    currentUser = {uid: 'user-1', getIdToken: async () => 'token'};
+    serverVersion = 0;
+    var days = [];
+    for (let i = 0; i < 250; i++) {
+        days.push(new Date(Date.UTC(2025, 0, 1 + i)).toISOString().slice(0, 10));
+    }
+    // Each day is ticked, unticked and ticked again, the counter following
+    for (const day of days) {
+        for (const op of ['add_date', 'remove_date', 'add_date']) {
+            recordOp({op: op, list: 'completedDates', date: day});
+            recordOp({op: 'set_counter', value: 1});
+        }
+    }
+    recordOp({op: 'remove_date', list: 'notDoneDates', date: days[0]});
+    var queued = pendingOps.length;
+    syncWithFirestore();
+'''
+
+RESULT = r'''({
+    queued: queued,
+    requests: requests.map(request => request.body.ops.length),
+    pending: pendingOps.length,
+    version: serverVersion,
+    saved: JSON.parse(storage.get(syncStateKey())).pendingOps.length
+})'''
+
+
+@unittest.skipUnless(has_node(), 'node is needed to run app.js')
+class TestOfflineSyncQueue(unittest.TestCase):
+    """Tests for the client's queue of ops recorded offline"""
+
+    def test_a_long_offline_queue_collapses_and_syncs_in_batches(self):
+        result = run_scripts(BEFORE, AFTER, RESULT, files=('app.js',))
+
+        # One add per day plus the counter; the no-op remove is dropped
+        self.assertEqual(result['queued'], 251)
+        self.assertEqual(result['requests'], [200, 51])
+        self.assertEqual((result['pending'], result['saved']), (0, 0))
+        self.assertEqual(result['version'], 251)
+
+
+if __name__ == '__main__':
+    unittest.main()
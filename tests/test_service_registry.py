@@ -0,0 +1,82 @@
+import unittest
+import time
+from unittest.mock import patch, MagicMock
+from flask import g
+from app import create_app
+from app.middleware import auth
+from app.services.registry import get_firebase_service, get_services
+
+
+class TestServiceRegistry(unittest.TestCase):
+    """Tests for the app-scoped FirebaseService registry"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _service(self):
+        service = MagicMock()
+        service.verify_token.return_value = {
+            'uid': 'user-1', 'email': 'user-1@example.com', 'exp': time.time() + 3600
+        }
+        service.get_user_profile.return_value = {'subscription_tier': 'premium'}
+        service.get_habit_analytics.return_value = None
+        service.get_profile_etag.return_value = None
+        return service
+
+    def test_create_app_does_not_connect(self):
+        """Test that the service is created lazily, not in create_app()"""
+        with patch('app.services.registry.FirebaseService') as service_class:
+            create_app()
+        service_class.assert_not_called()
+
+    def test_service_is_created_once_per_process(self):
+        """Test that many requests share one FirebaseService"""
+        service = self._service()
+        with patch('app.services.registry.FirebaseService', return_value=service) as service_class:
+            headers = {'Authorization': 'Bearer token'}
+            for _ in range(3):
+                self.client.get('/api/profile', headers=headers)
+                self.client.get('/api/premium-feature', headers=headers)
+
+        self.assertEqual(service_class.call_count, 1)
+
+    def test_service_is_reachable_from_g(self):
+        """Test that the request-scoped accessor caches the service on g"""
+        service = self._service()
+        with patch('app.services.registry.FirebaseService', return_value=service):
+            with self.app.test_request_context('/'):
+                self.assertIs(get_firebase_service(), service)
+                self.assertIs(g.firebase_service, service)
+
+    def test_channel_options_are_configurable(self):
+        """Test that gRPC channel options and deadlines come from app config"""
+        self.app.config['FIRESTORE_KEEPALIVE_TIME_MS'] = 12345
+        self.app.config['FIRESTORE_CALL_TIMEOUT'] = 2.5
+
+        with patch('app.services.registry.FirebaseService') as service_class:
+            with self.app.app_context():
+                get_services().firebase_service()
+
+        kwargs = service_class.call_args.kwargs
+        self.assertEqual(kwargs['channel_options']['grpc.keepalive_time_ms'], 12345)
+        self.assertEqual(kwargs['timeout'], 2.5)
+
+    def test_service_is_recreated_after_fork(self):
+        """Test that a new process id gets its own client"""
+        with patch('app.services.registry.FirebaseService') as service_class:
+            registry = self.app.extensions['services']
+            registry.firebase_service()
+            with patch('app.services.registry.os.getpid', return_value=-1):
+                registry.firebase_service()
+
+        self.assertEqual(service_class.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import threading
+import time
+from unittest.mock import MagicMock
+from app.services.firebase_service import FirebaseService
+from app.services.singleflight import SingleFlight
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Tests for coalescing concurrent identical calls"""
+
+    def _run_concurrently(self, flights, key, fn, callers=8):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flights.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_callers_share_one_execution(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(2)
+            return {'tier': 'premium'}
+
+        threads, results, _ = self._run_concurrently(flights, 'profiles/u1', fetch)
+        _wait_for(lambda: flights.shared == 7)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertEqual(sorted(shared for _, shared in results), [False] + [True] * 7)
+        self.assertTrue(all(result is results[0][0] for result, _ in results))
+        self.assertEqual(flights.key_stats('profiles/u1'), {'executions': 1, 'shared': 7})
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_exception_is_shared(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def fetch():
+            release.wait(2)
+            raise TimeoutError('deadline exceeded')
+
+        threads, results, errors = self._run_concurrently(flights, 'k', fetch, callers=4)
+        _wait_for(lambda: flights.shared == 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+        self.assertEqual(flights.stats()['errors'], 1)
+
+    def test_sequential_calls_are_not_coalesced(self):
+        flights = SingleFlight()
+        flights.do('k', lambda: 1)
+        flights.do('k', lambda: 2)
+        self.assertEqual(flights.key_stats('k'), {'executions': 2, 'shared': 0})
+
+    def test_firestore_reads_are_coalesced(self):
+        release = threading.Event()
+        snapshot = MagicMock(exists=True, update_time='t1')
+        snapshot.to_dict.return_value = {'counter': 1}
+        ref = MagicMock(path='users/u1/habits/main')
+        ref.get.side_effect = lambda **kwargs: release.wait(2) and snapshot
+
+        service = FirebaseService.__new__(FirebaseService)
+        service.timeout = 5
+        service.document_cache = None
+        service.flights = SingleFlight()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service._read_document(ref)[0]))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        _wait_for(lambda: service.flights.shared == 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(ref.get.call_count, 1)
+        self.assertEqual(results, [{'counter': 1}] * 4)
+        # Every caller, the leader too, gets a private copy of the shared document
+        self.assertEqual(len({id(result) for result in results}), 4)
+        self.assertNotIn(id(snapshot.to_dict.return_value), {id(result) for result in results})
+
+
+if __name__ == '__main__':
+    unittest.main()
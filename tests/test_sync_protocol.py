@@ -0,0 +1,230 @@
+import unittest
+import json
+import time
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+from app.services.habit_document import decode_habit_document, encode_habit_document
+from app.services.firebase_service import FirebaseService
+from app.services.sync_protocol import (
+    MAX_OPS_PER_SYNC, OPS_RETENTION, SyncProtocolError, apply_ops, can_send_delta, changed_fields,
+    is_complete, merge_habit_documents, validate_ops
+)
+
+
+class TestSyncOps(unittest.TestCase):
+    """Tests for validating and applying delta sync operations"""
+
+    def _doc(self, **fields):
+        return encode_habit_document(dict({
+            'startedDate': '2025-01-01',
+            'frequency': 'Daily',
+            'counter': 2,
+            'completedDates': ['2025-01-01', '2025-01-02'],
+            'notDoneDates': ['2025-01-03'],
+            'whyEntries': {'2025-01-03': 'tired'}
+        }, **fields))
+
+    def test_validate_normalises_ops(self):
+        ops = validate_ops([
+            {'op': 'add_date', 'list': 'completedDates', 'date': '2025-01-04', 'extra': 1},
+            {'op': 'set_counter', 'value': 3}
+        ])
+        self.assertEqual(ops[0], {'op': 'add_date', 'list': 'completedDates', 'date': '2025-01-04'})
+        self.assertEqual(validate_ops(None), [])
+
+    def test_validate_rejects_bad_ops(self):
+        bad = [
+            'not a list',
+            [{'op': 'drop_table'}],
+            [{'op': 'add_date', 'list': 'whyEntries', 'date': '2025-01-04'}],
+            [{'op': 'remove_date', 'list': 'completedDates', 'date': 'yesterday'}],
+            [{'op': 'add_date', 'list': 'completedDates', 'date': '0001-01-01'}],
+            [{'op': 'add_date', 'list': 'notDoneDates', 'date': '9999-12-31'}],
+            [{'op': 'set_why', 'date': '1999-12-31', 'text': 'too early'}],
+            [{'op': 'set_counter', 'value': -1}],
+            [{'op': 'set_counter', 'value': True}],
+            [{'op': 'set_field', 'field': 'version', 'value': '9'}],
+            [{'op': 'set_counter', 'value': 1}] * (MAX_OPS_PER_SYNC + 1)
+        ]
+        for ops in bad:
+            with self.assertRaises(SyncProtocolError):
+                validate_ops(ops)
+
+    def test_apply_ops(self):
+        doc, updates = apply_ops(self._doc(), [
+            {'op': 'add_date', 'list': 'completedDates', 'date': '2025-01-03'},
+            {'op': 'remove_date', 'list': 'completedDates', 'date': '2025-01-01'},
+            {'op': 'set_why', 'date': '2025-01-02', 'text': 'busy'},
+            {'op': 'set_counter', 'value': 5},
+            {'op': 'set_field', 'field': 'frequency', 'value': 'Weekly'}
+        ])
+        decoded = decode_habit_document(doc)
+
+        # Adding a day to one list moves it out of the other
+        self.assertEqual(decoded['completedDates'], ['2025-01-02', '2025-01-03'])
+        self.assertEqual(decoded['notDoneDates'], [])
+        self.assertEqual(decoded['whyEntries'], {'2025-01-03': 'tired', '2025-01-02': 'busy'})
+        self.assertEqual(decoded['counter'], 5)
+        self.assertEqual(decoded['frequency'], 'Weekly')
+
+        # Only changed fields are written, and why entries only per day
+        self.assertEqual(set(updates), {'history', 'whyEntries', 'counter', 'frequency'})
+        self.assertEqual(updates['whyEntries'], {'2025-01-02': 'busy'})
+
+    def test_remove_date_only_touches_its_list(self):
+        doc, _ = apply_ops(self._doc(), [{'op': 'remove_date', 'list': 'completedDates', 'date': '2025-01-03'}])
+        self.assertEqual(decode_habit_document(doc)['notDoneDates'], ['2025-01-03'])
+
+    def test_apply_ops_to_legacy_document(self):
+        legacy = {'completedDates': ['2025-01-01'], 'notDoneDates': [], 'counter': 1}
+        doc, _ = apply_ops(legacy, [{'op': 'add_date', 'list': 'completedDates', 'date': '2025-01-02'}])
+        self.assertEqual(decode_habit_document(doc)['completedDates'], ['2025-01-01', '2025-01-02'])
+
+    def test_delta_window(self):
+        self.assertTrue(can_send_delta(5, 5))
+        self.assertTrue(can_send_delta(0, OPS_RETENTION))
+        self.assertFalse(can_send_delta(None, 5))
+        self.assertFalse(can_send_delta(6, 5))
+        self.assertFalse(can_send_delta(0, OPS_RETENTION + 1))
+
+    def test_gap_detection(self):
+        records = [{'version': 4}, {'version': 5}]
+        self.assertTrue(is_complete(records, 3, 5))
+        # Version 4 was a full save with no op behind it
+        self.assertFalse(is_complete([{'version': 5}], 3, 5))
+
+
+class TestMergeSync(unittest.TestCase):
+    """Tests for the full-document merge used by sync_habit_data"""
+
+    SERVER = encode_habit_document({
+        'version': 4,
+        'counter': 2,
+        'completedDates': ['2025-01-01', '2025-01-02'],
+        'notDoneDates': [],
+        'whyEntries': {'2025-01-02': 'server'}
+    })
+    LOCAL = {
+        'counter': 3,
+        'completedDates': ['2025-01-01', '2025-01-03'],
+        'notDoneDates': ['2025-01-02'],
+        'whyEntries': {'2025-01-03': 'local'}
+    }
+
+    def test_merge_is_a_union_where_the_client_wins_conflicts(self):
+        merged = decode_habit_document(merge_habit_documents(self.SERVER, self.LOCAL))
+        self.assertEqual(merged['completedDates'], ['2025-01-01', '2025-01-03'])
+        self.assertEqual(merged['notDoneDates'], ['2025-01-02'])
+        self.assertEqual(merged['whyEntries'], {'2025-01-02': 'server', '2025-01-03': 'local'})
+        self.assertEqual(merged['counter'], 3)
+
+    def test_merge_drops_client_days_outside_the_window(self):
+        local = dict(self.LOCAL, history={'v': 1, 'base': '0001-01-01', 'bits': 'AQ=='})
+        merged = decode_habit_document(merge_habit_documents(self.SERVER, local))
+        self.assertEqual(merged['completedDates'], ['2025-01-01', '2025-01-02'])
+
+    def test_unchanged_merge_has_nothing_to_write(self):
+        merged = merge_habit_documents(self.SERVER, decode_habit_document(self.SERVER))
+        self.assertEqual(changed_fields(self.SERVER, merged), {})
+
+    def _service(self, commit_side_effect=None):
+        snapshot = MagicMock(exists=True, update_time='t1')
+        snapshot.to_dict.side_effect = lambda: dict(self.SERVER)
+        habit_ref = MagicMock()
+        habit_ref.get.return_value = snapshot
+
+        service = FirebaseService.__new__(FirebaseService)
+        service.timeout = 5
+        service.document_cache = None
+        service.flights = None
+        service.db = MagicMock()
+        service.db.collection.return_value.document.return_value \
+            .collection.return_value.document.return_value = habit_ref
+        service.db.batch.return_value.commit.side_effect = commit_side_effect
+        return service, habit_ref
+
+    def test_sync_is_one_conditional_write(self):
+        service, habit_ref = self._service()
+        result = service.sync_habit_data('user-1', self.LOCAL)
+
+        self.assertEqual(result['action'], 'merged')
+        self.assertEqual(result['version'], 5)
+        self.assertEqual(result['data']['completedDates'], ['2025-01-01', '2025-01-03'])
+        self.assertEqual(habit_ref.get.call_count, 1)
+        service.db.write_option.assert_called_once_with(last_update_time='t1')
+        batch = service.db.batch.return_value
+        writes = batch.update.call_args[0][1]
+        self.assertEqual(writes['version'], 5)
+        self.assertNotIn('startedDate', writes)
+
+        # The single-document history moves into its year's shard
+        self.assertEqual(writes['shards'], {'2025': {'done': 2, 'notDone': 1}})
+        shard_ref, shard = batch.set.call_args_list[0][0]
+        self.assertIs(shard_ref, habit_ref.collection.return_value.document.return_value)
+        habit_ref.collection.return_value.document.assert_called_with('2025')
+        self.assertEqual(shard['whyEntries'], {'2025-01-02': 'server', '2025-01-03': 'local'})
+
+    def test_sync_retries_after_a_concurrent_write(self):
+        from google.api_core.exceptions import FailedPrecondition
+        service, habit_ref = self._service([FailedPrecondition('stale'), None])
+        result = service.sync_habit_data('user-1', self.LOCAL)
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(habit_ref.get.call_count, 2)
+        self.assertEqual(service.db.batch.return_value.commit.call_count, 2)
+
+    def test_sync_without_changes_does_not_write(self):
+        service, habit_ref = self._service()
+        result = service.sync_habit_data('user-1', decode_habit_document(self.SERVER))
+
+        self.assertEqual(result['version'], 4)
+        service.db.batch.return_value.commit.assert_not_called()
+
+
+class TestSyncEndpoint(unittest.TestCase):
+    """Tests for /api/sync request dispatch"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+
+        self.service = MagicMock()
+        self.service.verify_token.return_value = {'uid': 'user-1', 'exp': time.time() + 3600}
+        self.service.sync_habit_ops.return_value = {
+            'status': 'success', 'action': 'delta', 'version': 8, 'ops': []
+        }
+        self.service.sync_habit_data.return_value = {'status': 'success', 'action': 'local_to_server'}
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def _post(self, body):
+        with patch('app.services.registry.FirebaseService', return_value=self.service):
+            return self.client.post('/api/sync', data=json.dumps(body), content_type='application/json',
+                                    headers={'Authorization': 'Bearer token'})
+
+    def test_delta_request(self):
+        op = {'op': 'set_counter', 'value': 3}
+        response = self._post({'baseVersion': 7, 'clientId': 'c1', 'ops': [op]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['version'], 8)
+        self.service.sync_habit_ops.assert_called_once_with('user-1', 7, [op], client_id='c1', habit_data=None)
+        self.service.sync_habit_data.assert_not_called()
+
+    def test_invalid_ops_are_rejected(self):
+        response = self._post({'baseVersion': 7, 'ops': [{'op': 'set_counter', 'value': 'lots'}]})
+        self.assertEqual(response.status_code, 400)
+        self.service.sync_habit_ops.assert_not_called()
+
+    def test_legacy_full_sync_still_works(self):
+        response = self._post({'habitData': {'counter': 1}, 'lastSync': None})
+        self.assertEqual(response.status_code, 200)
+        self.service.sync_habit_data.assert_called_once_with('user-1', {'counter': 1}, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
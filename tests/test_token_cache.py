@@ -0,0 +1,123 @@
+import unittest
+import time
+import threading
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+from app.middleware.token_cache import TokenCache
+
+
+class TestTokenCache(unittest.TestCase):
+    """Behavioral tests for the verified-token cache"""
+
+    def _token(self, uid='user-1', ttl=3600):
+        return {'uid': uid, 'email': f'{uid}@example.com', 'exp': time.time() + ttl}
+
+    def test_miss_then_hit(self):
+        """Test that a stored token is served from the cache"""
+        cache = TokenCache(max_size=4)
+        self.assertIsNone(cache.get('token-a'))
+        cache.put('token-a', self._token())
+        self.assertEqual(cache.get('token-a')['uid'], 'user-1')
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_raw_token_is_not_stored(self):
+        """Test that entries are keyed by a hash of the token"""
+        cache = TokenCache()
+        cache.put('secret-token', self._token())
+        self.assertNotIn('secret-token', cache._entries)
+
+    def test_entries_expire_at_exp_claim(self):
+        """Test that tokens are not served past their exp claim"""
+        cache = TokenCache(expiry_margin=0)
+        cache.put('token-a', self._token(ttl=0.05))
+        self.assertIsNotNone(cache.get('token-a'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('token-a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_expired_or_unbounded_tokens_are_not_cached(self):
+        """Test that tokens without a future exp claim are never cached"""
+        cache = TokenCache()
+        cache.put('expired', self._token(ttl=-10))
+        cache.put('no-exp', {'uid': 'user-1'})
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_lru_eviction_under_size_cap(self):
+        """Test that the least recently used token is evicted first"""
+        cache = TokenCache(max_size=2)
+        cache.put('a', self._token('a'))
+        cache.put('b', self._token('b'))
+        cache.get('a')
+        cache.put('c', self._token('c'))
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_concurrent_access(self):
+        """Test that concurrent puts and gets keep the size bound"""
+        cache = TokenCache(max_size=50)
+
+        def worker(n):
+            for i in range(200):
+                key = f'{n}-{i}'
+                cache.put(key, self._token(key))
+                cache.get(key)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        self.assertLessEqual(stats['size'], 50)
+        self.assertEqual(stats['hits'] + stats['misses'], 8 * 200)
+
+
+class TestRequireAuthTokenCache(unittest.TestCase):
+    """Test that require_auth only verifies a repeated token once"""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+
+    def tearDown(self):
+        auth.token_cache.clear()
+
+    def test_repeated_token_skips_signature_check(self):
+        decoded = {'uid': 'user-1', 'email': 'user-1@example.com', 'exp': time.time() + 3600}
+        service = MagicMock()
+        service.verify_token.return_value = decoded
+        service.get_user_profile.return_value = {'subscription_tier': 'free'}
+
+        with patch('app.services.registry.FirebaseService', return_value=service):
+            headers = {'Authorization': 'Bearer repeated-token'}
+            for _ in range(3):
+                response = self.client.get('/api/profile', headers=headers)
+                self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(service.verify_token.call_count, 1)
+
+    def test_invalid_token_is_not_cached(self):
+        service = MagicMock()
+        service.verify_token.return_value = None
+
+        with patch('app.services.registry.FirebaseService', return_value=service):
+            headers = {'Authorization': 'Bearer bad-token'}
+            for _ in range(2):
+                response = self.client.get('/api/profile', headers=headers)
+                self.assertEqual(response.status_code, 401)
+
+        self.assertEqual(service.verify_token.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+from app import create_app
+from app.models.history import HistoryBitmap, RECENT_HISTORY_DAYS
+from app.models.journal import JournalStore
+from app.models import tracker_cache
+from app.models.tracker_cache import TrackerCache, TrackerView
+
+
+class TestTrackerCache(unittest.TestCase):
+    """Tests for the stat-validated HabitTracker cache"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'habit_data.json')
+        with open(self.path, 'w') as f:
+            json.dump({'history': {'v': 1, 'base': None, 'bits': ''}, 'why_entries': {},
+                       'start_date': '2025-01-01', 'frequency': 'Daily', 'counter': 3}, f)
+        self.cache = TrackerCache()
+
+    def tearDown(self):
+        JournalStore.for_path(self.path).close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_unchanged_file_is_not_reparsed(self):
+        first = self.cache.get(self.path)
+        with patch('app.models.journal.json.load') as json_load:
+            for _ in range(5):
+                self.assertIs(self.cache.get(self.path), first)
+                self.cache.view(self.path)
+        json_load.assert_not_called()
+        self.assertEqual(self.cache.stats()['reloads'], 1)
+
+    def test_concurrent_readers_share_one_view(self):
+        view = self.cache.view(self.path)
+        self.assertIsInstance(view, TrackerView)
+        self.assertIs(self.cache.view(self.path), view)
+        self.assertEqual(view.counter, 3)
+        self.assertIsInstance(view.completed_dates, tuple)
+
+    def test_external_change_triggers_reload(self):
+        self.assertEqual(self.cache.view(self.path).counter, 3)
+        time.sleep(0.01)
+        with open(self.path, 'w') as f:
+            json.dump({'history': {'v': 1, 'base': None, 'bits': ''}, 'why_entries': {},
+                       'start_date': '2025-01-01', 'frequency': 'Weekly', 'counter': 42}, f)
+
+        self.assertEqual(self.cache.view(self.path).counter, 42)
+        self.assertEqual(self.cache.stats()['reloads'], 2)
+
+    def test_view_holds_only_recent_history(self):
+        today = date.today()
+        old = today - timedelta(days=RECENT_HISTORY_DAYS)
+        with open(self.path, 'w') as f:
+            json.dump({'history': HistoryBitmap.from_lists([str(old), str(today)]).to_dict(),
+                       'why_entries': {str(old): 'old', str(today): 'new'},
+                       'start_date': '2020-01-01', 'frequency': 'Daily', 'counter': 2}, f)
+
+        view = self.cache.view(self.path)
+        self.assertEqual(view.completed_dates, (str(today),))
+        self.assertEqual(view.why_entries, {str(today): 'new'})
+
+    def test_write_updates_cache_in_place(self):
+        tracker = self.cache.get(self.path)
+        self.assertFalse(self.cache.view(self.path).habit_done)
+
+        tracker.toggle_today()
+        self.cache.note_write(self.path)
+
+        self.assertIs(self.cache.get(self.path), tracker)
+        self.assertTrue(self.cache.view(self.path).habit_done)
+        self.assertEqual(self.cache.stats()['reloads'], 1)
+
+    def test_a_slow_load_does_not_block_other_files(self):
+        other = os.path.join(self.tmpdir, 'other.json')
+        shutil.copy(self.path, other)
+        self.cache.get(self.path)
+        loading, release = threading.Event(), threading.Event()
+        real_tracker = tracker_cache.HabitTracker
+
+        def slow_tracker(data_file):
+            loading.set()
+            release.wait(5)
+            return real_tracker(data_file)
+
+        with patch('app.models.tracker_cache.HabitTracker', side_effect=slow_tracker):
+            loader = threading.Thread(target=self.cache.get, args=(other,))
+            loader.start()
+            try:
+                self.assertTrue(loading.wait(5))
+                # A hit on another file is served while the load is in progress
+                self.assertEqual(self.cache.view(self.path).counter, 3)
+                self.assertEqual(self.cache.stats()['reloads'], 1)
+            finally:
+                release.set()
+                loader.join(5)
+        self.assertEqual(self.cache.stats()['reloads'], 2)
+        JournalStore.for_path(other).close()
+
+
+class TestHomeUsesTrackerCache(unittest.TestCase):
+    """Test that the landing page is served from the shared tracker view"""
+
+    def test_home_does_not_parse_data_file_per_request(self):
+        app = create_app()
+        client = app.test_client()
+        client.get('/')
+
+        with patch('app.models.journal.json.load') as json_load:
+            for _ in range(3):
+                self.assertEqual(client.get('/').status_code, 200)
+        json_load.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch, MagicMock
+from app import create_app
+from app.middleware import auth
+from app.models.tracker_store import ShardedTrackerStore
+
+
+class TestShardedTrackerStore(unittest.TestCase):
+    """Tests for the per-user sharded local store"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = ShardedTrackerStore(self.root, max_open=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_users_get_fanned_out_paths(self):
+        path_a = self.store.path_for('alice')
+        path_b = self.store.path_for('bob')
+
+        self.assertNotEqual(path_a, path_b)
+        self.assertEqual(path_a, self.store.path_for('alice'))
+        relative = os.path.relpath(path_a, self.root).split(os.sep)
+        self.assertEqual(len(relative), 3)
+        self.assertTrue(relative[2].startswith(relative[0] + relative[1]))
+        self.assertNotIn('alice', path_a)
+
+    def test_users_do_not_share_state_or_locks(self):
+        alice = self.store.get('alice')
+        bob = self.store.get('bob')
+        alice.toggle_today()
+
+        self.assertIsNot(alice.store.lock, bob.store.lock)
+        self.assertTrue(self.store.get('alice').is_done_today())
+        self.assertFalse(self.store.get('bob').is_done_today())
+
+    def test_lookup_reuses_open_tracker(self):
+        tracker = self.store.get('alice')
+        self.assertIs(self.store.get('alice'), tracker)
+
+    def test_eviction_flushes_dirty_state(self):
+        """Test that the LRU bound holds and evicted users are compacted to disk"""
+        self.store.get('alice').toggle_today()
+        self.store.note_write('alice')
+        self.store.get('bob')
+        self.store.get('carol')
+
+        stats = self.store.trackers.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['evictions'], 1)
+
+        path = self.store.path_for('alice')
+        self.assertEqual(os.path.getsize(path + '.journal'), 0)
+        with open(path) as f:
+            self.assertTrue(json.load(f)['history']['bits'])
+        self.assertTrue(self.store.get('alice').is_done_today())
+
+
+class TestHomeUsesUserTracker(unittest.TestCase):
+    """Test that authenticated users render from their own local tracker"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.app.extensions['services'].user_trackers = ShardedTrackerStore(self.root)
+        self.client = self.app.test_client()
+        auth.token_cache.clear()
+
+    def tearDown(self):
+        auth.token_cache.clear()
+        shutil.rmtree(self.root)
+
+    def test_toggle_and_home_are_per_user(self):
+        service = MagicMock()
+        service.verify_token.side_effect = lambda token: {
+            'uid': token, 'email': f'{token}@example.com', 'exp': time.time() + 3600
+        }
+        service.get_bootstrap.return_value = None
+
+        with patch('app.services.registry.FirebaseService', return_value=service):
+            self.client.post('/toggle-habit', headers={'Authorization': 'Bearer alice'})
+            alice_page = self.client.get('/', headers={'Authorization': 'Bearer alice'})
+            bob_page = self.client.get('/', headers={'Authorization': 'Bearer bob'})
+
+        user_trackers = self.app.extensions['services'].user_trackers
+        self.assertTrue(user_trackers.get('alice').is_done_today())
+        self.assertFalse(user_trackers.get('bob').is_done_today())
+        self.assertIn('id="done-checkbox" name="done" checked', alice_page.data.decode('utf-8'))
+        self.assertNotIn('id="done-checkbox" name="done" checked', bob_page.data.decode('utf-8'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import signal
+import time
+from unittest.mock import patch, MagicMock
+from app.services import write_buffer
+from app.services.document_cache import DocumentCache
+from app.services.firebase_service import FirebaseService
+from app.services.sync_protocol import merge_habit_saves
+from app.services.write_buffer import WriteBuffer, flush_on_sigterm
+
+
+class TestWriteBuffer(unittest.TestCase):
+    """Tests for the write-behind buffer"""
+
+    def setUp(self):
+        self.written = []
+        self.buffer = WriteBuffer(merge_habit_saves, interval=60)
+
+    def _write(self, payload):
+        self.written.append(payload)
+        return True
+
+    def test_a_burst_becomes_one_write(self):
+        self.buffer.add('users/u/habits/main', {'counter': 1, 'whyEntries': {'2025-01-01': 'a'}}, self._write)
+        self.buffer.add('users/u/habits/main', {'counter': 2, 'whyEntries': {'2025-01-02': 'b'}}, self._write)
+        self.buffer.add('users/u/habits/main', {'counter': 3}, self._write)
+        self.assertEqual(self.written, [])
+        self.assertEqual(self.buffer.peek('users/u/habits/main')['counter'], 3)
+
+        self.buffer.flush_prefix('users/u/')
+        self.assertEqual(self.written, [{'counter': 3, 'whyEntries': {'2025-01-01': 'a', '2025-01-02': 'b'}}])
+        stats = self.buffer.stats()
+        self.assertEqual((stats['added'], stats['coalesced'], stats['writes'], stats['pending']), (3, 2, 1, 0))
+
+    def test_pending_writes_go_out_after_the_interval(self):
+        self.buffer.interval = 0.05
+        self.buffer.add('users/u/habits/main', {'counter': 1}, self._write)
+        self.buffer.add('users/u/habits/main', {'counter': 2}, self._write)
+        deadline = time.monotonic() + 2
+        while not self.written and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.written, [{'counter': 2}])
+
+    def test_memory_is_bounded(self):
+        self.buffer.max_pending = 2
+        for user in ('a', 'b', 'c'):
+            self.buffer.add(f'users/{user}/habits/main', {'counter': 1, 'user': user}, self._write)
+        # The oldest went out to make room
+        self.assertEqual([payload['user'] for payload in self.written], ['a'])
+        self.assertEqual((self.buffer.stats()['pending'], self.buffer.stats()['forced']), (2, 1))
+
+    def test_failed_writes_are_retried_then_dropped(self):
+        self.buffer.add('users/u/habits/main', {'counter': 1}, lambda payload: False)
+        self.assertFalse(self.buffer.flush('users/u/habits/main'))
+        self.assertEqual(self.buffer.peek('users/u/habits/main'), {'counter': 1})
+
+        self.buffer.flush_all()
+        self.buffer.flush_all()
+        self.assertIsNone(self.buffer.peek('users/u/habits/main'))
+        self.assertEqual((self.buffer.stats()['failed'], self.buffer.stats()['dropped']), (3, 1))
+
+    def test_sigterm_flushes_then_chains(self):
+        calls = []
+
+        def previous(signum, frame):
+            calls.append(signum)
+
+        original = signal.signal(signal.SIGTERM, previous)
+        try:
+            with patch.object(write_buffer, '_sigterm_installed', False):
+                self.assertTrue(flush_on_sigterm())
+                self.buffer.add('users/u/habits/main', {'counter': 1}, self._write)
+                signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+        finally:
+            signal.signal(signal.SIGTERM, original)
+        self.assertEqual(self.written, [{'counter': 1}])
+        self.assertEqual(calls, [signal.SIGTERM])
+
+
+class TestBufferedService(unittest.TestCase):
+    """Tests for FirebaseService with a write buffer"""
+
+    def setUp(self):
+        self.habit_ref = MagicMock(path='users/user-1/habits/main', id='main')
+        self.snapshot = MagicMock(exists=True, update_time='t1')
+        self.snapshot.to_dict.return_value = {'counter': 1, 'completedDates': ['2025-01-01'], 'notDoneDates': []}
+        self.habit_ref.get.return_value = self.snapshot
+
+        self.service = FirebaseService.__new__(FirebaseService)
+        self.service.timeout = 5
+        self.service.document_cache = DocumentCache()
+        self.service.flights = None
+        self.service.write_buffer = WriteBuffer(merge_habit_saves, interval=60)
+        self.service.db = MagicMock()
+        self.service.db.collection.return_value.document.return_value \
+            .collection.return_value.document.return_value = self.habit_ref
+        self.service.db.collection.return_value.document.return_value.path = 'users/user-1'
+
+    def tearDown(self):
+        # Nothing is left for the exit-time flush
+        with patch('app.services.firebase_service._firestore', return_value=MagicMock()):
+            self.service.write_buffer.flush_all()
+
+    def test_saves_wait_and_reads_see_them(self):
+        self.assertTrue(self.service.save_habit_data('user-1', {'counter': 5}))
+        self.assertTrue(self.service.save_habit_data('user-1', {'completedDates': ['2025-01-01', '2025-01-02']}))
+        self.service.db.batch.assert_not_called()
+
+        # Served from the buffer, without writing it yet
+        self.assertIsNone(self.service.get_habit_etag('user-1', 'main'))
+        habit = self.service.get_user_habit('user-1', 'main')
+        self.assertEqual((habit['counter'], habit['completedDates']), (5, ['2025-01-01', '2025-01-02']))
+        self.assertEqual(habit['aggregates']['done'], 2)
+        self.service.db.batch.assert_not_called()
+
+    def test_reads_leave_the_buffered_save_pending(self):
+        self.service.save_habit_data('user-1', {'counter': 5})
+        self.service.get_habit_document('user-1')
+        self.service.get_dashboard_etag('user-1')
+        self.service.db.batch.assert_not_called()
+        self.assertEqual(self.service.write_buffer.stats()['pending'], 1)
+
+    def test_writes_make_the_buffered_save_first(self):
+        firestore = MagicMock()
+        firestore.transactional = lambda fn: fn
+        with patch('app.services.firebase_service._firestore', return_value=firestore):
+            self.service.save_habit_data('user-1', {'counter': 5})
+            self.service.save_habit_data('user-1', {'counter': 6})
+            self.service.patch_habit('user-1', 'main', [{'op': 'set_counter', 'value': 7}])
+
+        batch = self.service.db.batch.return_value
+        batch.commit.assert_called_once_with(timeout=5)
+        head_writes = [call[0][1] for call in batch.set.call_args_list if call[0][0] is self.habit_ref][0]
+        self.assertEqual(head_writes['counter'], 6)
+        self.assertEqual(self.service.write_buffer.stats()['coalesced'], 1)
+
+if __name__ == '__main__':
+    unittest.main()